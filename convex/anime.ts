@@ -1,5 +1,6 @@
 import { v } from "convex/values";
-import { mutation, query } from "./_generated/server";
+import { mutation, query, MutationCtx } from "./_generated/server";
+import { Doc, Id } from "./_generated/dataModel";
 
 function getCurrentSeason(): { season: string; year: number } {
   const now = new Date();
@@ -171,14 +172,31 @@ export const getTopRatedCurrentSeason = query({
 
 // Migration helpers - for database deduplication
 
+// `after` (inclusive) and `before` (exclusive) restrict the scan to a
+// _creationTime range so an export can be split into partitions that are
+// paginated independently and in parallel.
 export const getAllAnime = query({
   args: {
     cursor: v.optional(v.union(v.string(), v.null())),
     limit: v.optional(v.number()),
+    after: v.optional(v.number()),
+    before: v.optional(v.number()),
   },
-  handler: async (ctx, { cursor, limit }) => {
+  handler: async (ctx, { cursor, limit, after, before }) => {
     const results = await ctx.db
       .query("anime")
+      .withIndex("by_creation_time", (q) => {
+        if (after !== undefined && before !== undefined) {
+          return q.gte("_creationTime", after).lt("_creationTime", before);
+        }
+        if (after !== undefined) {
+          return q.gte("_creationTime", after);
+        }
+        if (before !== undefined) {
+          return q.lt("_creationTime", before);
+        }
+        return q;
+      })
       .paginate({
         cursor: cursor ?? null,
         numItems: limit ?? 500,
@@ -191,6 +209,19 @@ export const getAllAnime = query({
   },
 });
 
+// Oldest and newest _creationTime in the table, used to plan partitions
+export const getAnimeCreationTimeBounds = query({
+  args: {},
+  handler: async (ctx) => {
+    const first = await ctx.db.query("anime").order("asc").first();
+    const last = await ctx.db.query("anime").order("desc").first();
+    return {
+      min: first?._creationTime ?? null,
+      max: last?._creationTime ?? null,
+    };
+  },
+});
+
 export const clearAllAnime = mutation({
   args: {
     batch: v.optional(v.number()),
@@ -203,6 +234,12 @@ export const clearAllAnime = mutation({
       await ctx.db.delete(item._id);
     }
     
+    // Stored import results would replay against the rows deleted above
+    const userAnimeImports = await ctx.db.query("userAnimeImports").take(batchSize);
+    for (const item of userAnimeImports) {
+      await ctx.db.delete(item._id);
+    }
+    
     const listComments = await ctx.db.query("animeListComments").take(batchSize);
     for (const item of listComments) {
       await ctx.db.delete(item._id);
@@ -234,6 +271,7 @@ export const clearAllAnime = mutation({
     }
     
     const hasMore = userAnime.length === batchSize || 
+                   userAnimeImports.length === batchSize || 
                    listComments.length === batchSize || 
                    commentVotes.length === batchSize || 
                    listItems.length === batchSize || 
@@ -243,6 +281,7 @@ export const clearAllAnime = mutation({
     
     return {
       userAnimeCleared: userAnime.length,
+      userAnimeImportsCleared: userAnimeImports.length,
       listCommentsCleared: listComments.length,
       commentVotesCleared: commentVotes.length,
       listItemsCleared: listItems.length,
@@ -316,13 +355,17 @@ export const bulkInsert = mutation({
     let imported = 0;
     let failed = 0;
     const errors: string[] = [];
+    // Positions in `animes` that were not inserted, so a client can retry
+    // exactly those rows
+    const failedIndices: number[] = [];
 
-    for (const anime of args.animes) {
+    for (const [index, anime] of args.animes.entries()) {
       try {
         await ctx.db.insert("anime", anime);
         imported++;
       } catch (error) {
         failed++;
+        failedIndices.push(index);
         if (errors.length < 10) {
           errors.push(`${anime.title}: ${error instanceof Error ? error.message : String(error)}`);
         }
@@ -332,8 +375,262 @@ export const bulkInsert = mutation({
     return {
       imported,
       failed,
+      failedIndices,
+      total: args.animes.length,
+      errors,
+    };
+  },
+});
+
+// Delta sync: sync keys and content hashes of every row (paginated)
+export const getSyncHashes = query({
+  args: {
+    cursor: v.optional(v.union(v.string(), v.null())),
+    limit: v.optional(v.number()),
+  },
+  handler: async (ctx, { cursor, limit }) => {
+    const results = await ctx.db
+      .query("anime")
+      .paginate({
+        cursor: cursor ?? null,
+        numItems: limit ?? 2000,
+      });
+    return {
+      page: results.page.map((anime) => ({
+        _id: anime._id,
+        syncKey: anime.syncKey ?? null,
+        contentHash: anime.contentHash ?? null,
+        malId: anime.malId ?? null,
+        title: anime.title,
+        // Only needed to find the MAL id of rows that predate sync keys
+        sources: anime.syncKey || anime.malId ? [] : anime.sources,
+      })),
+      continueCursor: results.continueCursor,
+      isDone: results.isDone,
+    };
+  },
+});
+
+// Delta sync: replace rows in place (keeping their _id, so userAnime and
+// list references survive) or insert new ones. A row is matched by `id`
+// when given, otherwise by syncKey.
+export const upsertBatch = mutation({
+  args: {
+    animes: v.array(v.object({
+      id: v.optional(v.id("anime")),
+      syncKey: v.string(),
+      contentHash: v.string(),
+      title: v.string(),
+      type: v.string(),
+      episodes: v.optional(v.number()),
+      status: v.string(),
+      animeSeason: v.optional(v.object({
+        season: v.optional(v.string()),
+        year: v.optional(v.number()),
+      })),
+      picture: v.optional(v.string()),
+      thumbnail: v.optional(v.string()),
+      malId: v.optional(v.string()),
+      duration: v.optional(v.object({
+        value: v.optional(v.number()),
+        unit: v.optional(v.string()),
+      })),
+      score: v.optional(v.object({
+        arithmeticGeometricMean: v.optional(v.number()),
+        arithmeticMean: v.optional(v.number()),
+        median: v.optional(v.number()),
+      })),
+      sources: v.array(v.string()),
+      synonyms: v.array(v.string()),
+      studios: v.array(v.string()),
+      producers: v.array(v.string()),
+      relatedAnime: v.array(v.string()),
+      tags: v.array(v.string()),
+    })),
+  },
+  handler: async (ctx, args) => {
+    let inserted = 0;
+    let updated = 0;
+    let failed = 0;
+    const errors: string[] = [];
+
+    for (const { id, ...anime } of args.animes) {
+      try {
+        const existing = id
+          ? await ctx.db.get(id)
+          : await ctx.db
+              .query("anime")
+              .withIndex("by_syncKey", (q) => q.eq("syncKey", anime.syncKey))
+              .first();
+        if (existing) {
+          await ctx.db.replace(existing._id, anime);
+          updated++;
+        } else {
+          await ctx.db.insert("anime", anime);
+          inserted++;
+        }
+      } catch (error) {
+        failed++;
+        if (errors.length < 10) {
+          errors.push(`${anime.title}: ${error instanceof Error ? error.message : String(error)}`);
+        }
+      }
+    }
+
+    return {
+      imported: inserted + updated,
+      inserted,
+      updated,
+      failed,
       total: args.animes.length,
       errors,
     };
   },
 });
+
+// Move every reference to anime `from` onto `to` (the row it was merged
+// into), or drop the references when there is no such row. A user or list
+// that already has `to` keeps one row, with the flags of both.
+async function moveAnimeReferences(
+  ctx: MutationCtx,
+  from: Id<"anime">,
+  to: Id<"anime"> | null,
+  caches: Doc<"topAnimeCache">[],
+  changedCaches: Set<Doc<"topAnimeCache">>
+) {
+  const now = Date.now();
+
+  const userAnimeRows = await ctx.db
+    .query("userAnime")
+    .withIndex("by_animeId", (q) => q.eq("animeId", from))
+    .collect();
+  for (const row of userAnimeRows) {
+    const existing = to
+      ? await ctx.db
+          .query("userAnime")
+          .withIndex("by_userId_animeId", (q) =>
+            q.eq("userId", row.userId).eq("animeId", to)
+          )
+          .unique()
+      : null;
+    if (to && !existing) {
+      await ctx.db.patch(row._id, { animeId: to, updatedAt: now });
+      continue;
+    }
+    if (existing) {
+      const watchedAt =
+        existing.watchedAt !== undefined && row.watchedAt !== undefined
+          ? Math.min(existing.watchedAt, row.watchedAt)
+          : existing.watchedAt ?? row.watchedAt;
+      await ctx.db.patch(existing._id, {
+        isFavorite: existing.isFavorite || row.isFavorite,
+        isWatched: existing.isWatched || row.isWatched,
+        watchedAt,
+        watchedComment: existing.watchedComment ?? row.watchedComment,
+        updatedAt: now,
+      });
+    }
+    await ctx.db.delete(row._id);
+  }
+
+  const listItems = await ctx.db
+    .query("animeListItems")
+    .withIndex("by_animeId", (q) => q.eq("animeId", from))
+    .collect();
+  for (const item of listItems) {
+    const duplicate = to
+      ? await ctx.db
+          .query("animeListItems")
+          .withIndex("by_listId", (q) => q.eq("listId", item.listId))
+          .filter((q) => q.eq(q.field("animeId"), to))
+          .first()
+      : null;
+    if (to && !duplicate) {
+      await ctx.db.patch(item._id, { animeId: to });
+      continue;
+    }
+    await ctx.db.delete(item._id);
+    const list = await ctx.db.get(item.listId);
+    if (list) {
+      await ctx.db.patch(list._id, {
+        itemCount: Math.max(0, list.itemCount - 1),
+        updatedAt: now,
+      });
+    }
+  }
+
+  const episodeLogs = await ctx.db
+    .query("episodeLogs")
+    .withIndex("by_animeId", (q) => q.eq("animeId", from))
+    .collect();
+  for (const log of episodeLogs) {
+    if (to) {
+      await ctx.db.patch(log._id, { animeId: to });
+    } else {
+      await ctx.db.delete(log._id);
+    }
+  }
+
+  // The caches are read once per batch by the caller and rewritten here in
+  // memory; the caller writes the changed rows back
+  for (const cache of caches) {
+    if (!cache.animeIds.includes(from)) continue;
+    const animeIds = cache.animeIds.map((id) => (id === from ? to : id));
+    cache.animeIds = [...new Set(animeIds)].filter(
+      (id): id is Id<"anime"> => id !== null
+    );
+    changedCaches.add(cache);
+  }
+}
+
+// Delta sync: delete rows that are no longer in the catalogue. When the
+// row was merged into another, mergeInto[i] is the syncKey of the row that
+// absorbed ids[i]; user data (watched / favorite rows, list items, episode
+// logs, top-anime caches) is moved onto it before the delete. Without a
+// target, that data is deleted with the row instead of left dangling. A row
+// whose target does not exist (its upsert failed) is kept for the next sync.
+// Each id touches several tables, so callers keep batches small (the Python
+// sync sends 100 ids) to stay within the per-mutation read/write limits.
+export const deleteBatch = mutation({
+  args: {
+    ids: v.array(v.id("anime")),
+    mergeInto: v.optional(v.array(v.union(v.string(), v.null()))),
+  },
+  handler: async (ctx, { ids, mergeInto }) => {
+    let deleted = 0;
+    let merged = 0;
+    let missingTargets = 0;
+    // One row per season: read once for the whole batch
+    const caches = await ctx.db.query("topAnimeCache").collect();
+    const changedCaches = new Set<Doc<"topAnimeCache">>();
+    for (const [index, id] of ids.entries()) {
+      if (!(await ctx.db.get(id))) continue;
+
+      const targetKey = mergeInto?.[index] ?? null;
+      let to: Id<"anime"> | null = null;
+      if (targetKey) {
+        // Duplicates share the key with the row that keeps it; skip this one
+        const target = (
+          await ctx.db
+            .query("anime")
+            .withIndex("by_syncKey", (q) => q.eq("syncKey", targetKey))
+            .take(2)
+        ).find((row) => row._id !== id);
+        if (!target) {
+          missingTargets++;
+          continue;
+        }
+        to = target._id;
+      }
+
+      await moveAnimeReferences(ctx, id, to, caches, changedCaches);
+      await ctx.db.delete(id);
+      deleted++;
+      if (to) merged++;
+    }
+    for (const cache of changedCaches) {
+      await ctx.db.patch(cache._id, { animeIds: cache.animeIds });
+    }
+    return { deleted, merged, missingTargets, total: ids.length };
+  },
+});
@@ -1,6 +1,16 @@
 import { httpRouter } from "convex/server";
 import { auth } from "./auth";
-import { bulkImport, getAllAnime, clearAllAnime, bulkInsertAnime } from "./httpActions";
+import {
+  bulkImport,
+  getAllAnime,
+  getAnimeBounds,
+  clearAllAnime,
+  bulkInsertAnime,
+  getAnimeHashes,
+  upsertAnime,
+  deleteAnime,
+  importMalList,
+} from "./httpActions";
 
 const http = httpRouter();
 
@@ -18,6 +28,12 @@ http.route({
   handler: getAllAnime,
 });
 
+http.route({
+  path: "/anime/bounds",
+  method: "GET",
+  handler: getAnimeBounds,
+});
+
 http.route({
   path: "/anime/clear",
   method: "POST",
@@ -30,4 +46,28 @@ http.route({
   handler: bulkInsertAnime,
 });
 
+http.route({
+  path: "/anime/hashes",
+  method: "GET",
+  handler: getAnimeHashes,
+});
+
+http.route({
+  path: "/anime/upsert",
+  method: "POST",
+  handler: upsertAnime,
+});
+
+http.route({
+  path: "/anime/delete",
+  method: "POST",
+  handler: deleteAnime,
+});
+
+http.route({
+  path: "/userAnime/import-mal",
+  method: "POST",
+  handler: importMalList,
+});
+
 export default http;
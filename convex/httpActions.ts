@@ -1,5 +1,16 @@
 import { httpAction } from "./_generated/server";
-import { api } from "./_generated/api";
+import { api, internal } from "./_generated/api";
+
+// Parse a JSON request body, gunzipping it first when the client sent
+// `Content-Encoding: gzip` (the Python upload scripts' --gzip mode)
+async function readJsonBody(request: Request): Promise<any> {
+  const encoding = request.headers.get("Content-Encoding");
+  if (encoding === "gzip" && request.body) {
+    const decompressed = request.body.pipeThrough(new DecompressionStream("gzip"));
+    return await new Response(decompressed).json();
+  }
+  return await request.json();
+}
 
 // HTTP action to bulk import anime data
 export const bulkImport = httpAction(async (ctx, request) => {
@@ -8,7 +19,7 @@ export const bulkImport = httpAction(async (ctx, request) => {
   }
 
   try {
-    const data = await request.json();
+    const data = await readJsonBody(request);
     const { animes } = data;
 
     if (!Array.isArray(animes)) {
@@ -90,10 +101,16 @@ export const getAllAnime = httpAction(async (ctx, request) => {
     const cursor: string | null = cursorParam;
     const limitParam = url.searchParams.get("limit");
     const limit = limitParam ? parseInt(limitParam, 10) : undefined;
+    const afterParam = url.searchParams.get("after");
+    const after = afterParam ? parseFloat(afterParam) : undefined;
+    const beforeParam = url.searchParams.get("before");
+    const before = beforeParam ? parseFloat(beforeParam) : undefined;
     
     const result = await ctx.runQuery(api.anime.getAllAnime, { 
       cursor,
-      limit
+      limit,
+      after,
+      before
     });
     
     return new Response(
@@ -119,6 +136,38 @@ export const getAllAnime = httpAction(async (ctx, request) => {
   }
 });
 
+// GET /anime/bounds - Oldest and newest _creationTime, for partitioned exports
+export const getAnimeBounds = httpAction(async (ctx, request) => {
+  if (request.method !== "GET") {
+    return new Response("Method not allowed", { status: 405 });
+  }
+
+  try {
+    const result = await ctx.runQuery(api.anime.getAnimeCreationTimeBounds, {});
+    
+    return new Response(
+      JSON.stringify({ 
+        success: true, 
+        ...result
+      }),
+      { 
+        status: 200, 
+        headers: { "Content-Type": "application/json" } 
+      }
+    );
+  } catch (error) {
+    return new Response(
+      JSON.stringify({ 
+        error: error instanceof Error ? error.message : String(error) 
+      }),
+      { 
+        status: 500, 
+        headers: { "Content-Type": "application/json" } 
+      }
+    );
+  }
+});
+
 // POST /anime/clear - Clear all anime and user data for migration
 export const clearAllAnime = httpAction(async (ctx, request) => {
   if (request.method !== "POST") {
@@ -157,7 +206,7 @@ export const bulkInsertAnime = httpAction(async (ctx, request) => {
   }
 
   try {
-    const data = await request.json();
+    const data = await readJsonBody(request);
     const { animes } = data;
 
     if (!Array.isArray(animes)) {
@@ -191,3 +240,207 @@ export const bulkInsertAnime = httpAction(async (ctx, request) => {
     );
   }
 });
+
+// GET /anime/hashes - Sync keys and content hashes for delta sync (paginated)
+export const getAnimeHashes = httpAction(async (ctx, request) => {
+  if (request.method !== "GET") {
+    return new Response("Method not allowed", { status: 405 });
+  }
+
+  try {
+    const url = new URL(request.url);
+    const cursor: string | null = url.searchParams.get("cursor");
+    const limitParam = url.searchParams.get("limit");
+    const limit = limitParam ? parseInt(limitParam, 10) : undefined;
+
+    const result = await ctx.runQuery(api.anime.getSyncHashes, {
+      cursor,
+      limit
+    });
+
+    return new Response(
+      JSON.stringify({
+        success: true,
+        ...result
+      }),
+      {
+        status: 200,
+        headers: { "Content-Type": "application/json" }
+      }
+    );
+  } catch (error) {
+    return new Response(
+      JSON.stringify({
+        error: error instanceof Error ? error.message : String(error)
+      }),
+      {
+        status: 500,
+        headers: { "Content-Type": "application/json" }
+      }
+    );
+  }
+});
+
+// POST /anime/upsert - Insert or replace anime rows by id / syncKey
+export const upsertAnime = httpAction(async (ctx, request) => {
+  if (request.method !== "POST") {
+    return new Response("Method not allowed", { status: 405 });
+  }
+
+  try {
+    const data = await readJsonBody(request);
+    const { animes } = data;
+
+    if (!Array.isArray(animes)) {
+      return new Response(
+        JSON.stringify({ error: "Expected 'animes' array" }),
+        { status: 400, headers: { "Content-Type": "application/json" } }
+      );
+    }
+
+    const result = await ctx.runMutation(api.anime.upsertBatch, { animes });
+
+    return new Response(
+      JSON.stringify({
+        success: true,
+        ...result
+      }),
+      {
+        status: 200,
+        headers: { "Content-Type": "application/json" }
+      }
+    );
+  } catch (error) {
+    return new Response(
+      JSON.stringify({
+        error: error instanceof Error ? error.message : String(error)
+      }),
+      {
+        status: 500,
+        headers: { "Content-Type": "application/json" }
+      }
+    );
+  }
+});
+
+// POST /anime/delete - Delete anime rows by id
+export const deleteAnime = httpAction(async (ctx, request) => {
+  if (request.method !== "POST") {
+    return new Response("Method not allowed", { status: 405 });
+  }
+
+  try {
+    const data = await readJsonBody(request);
+    const { ids, mergeInto } = data;
+
+    if (!Array.isArray(ids)) {
+      return new Response(
+        JSON.stringify({ error: "Expected 'ids' array" }),
+        { status: 400, headers: { "Content-Type": "application/json" } }
+      );
+    }
+
+    const result = await ctx.runMutation(api.anime.deleteBatch, {
+      ids,
+      mergeInto,
+    });
+
+    return new Response(
+      JSON.stringify({
+        success: true,
+        ...result
+      }),
+      {
+        status: 200,
+        headers: { "Content-Type": "application/json" }
+      }
+    );
+  } catch (error) {
+    return new Response(
+      JSON.stringify({
+        error: error instanceof Error ? error.message : String(error)
+      }),
+      {
+        status: 500,
+        headers: { "Content-Type": "application/json" }
+      }
+    );
+  }
+});
+
+// Compare two strings in time independent of where they first differ
+function timingSafeEqual(a: string, b: string): boolean {
+  if (a.length !== b.length) {
+    return false;
+  }
+  let diff = 0;
+  for (let i = 0; i < a.length; i++) {
+    diff |= a.charCodeAt(i) ^ b.charCodeAt(i);
+  }
+  return diff === 0;
+}
+
+// POST /userAnime/import-mal - Mark a user's scraped MAL list entries as
+// watched / favorite, resolved by MAL id. `key` makes a batch idempotent.
+// The request writes to any userId, so it must carry
+// `Authorization: Bearer <MAL_IMPORT_SECRET>` (a deployment env variable).
+export const importMalList = httpAction(async (ctx, request) => {
+  if (request.method !== "POST") {
+    return new Response("Method not allowed", { status: 405 });
+  }
+
+  const secret = process.env.MAL_IMPORT_SECRET;
+  const authorization = request.headers.get("Authorization") ?? "";
+  if (!secret || !timingSafeEqual(authorization, `Bearer ${secret}`)) {
+    return new Response(
+      JSON.stringify({ error: "Unauthorized" }),
+      { status: 401, headers: { "Content-Type": "application/json" } }
+    );
+  }
+
+  try {
+    const data = await readJsonBody(request);
+    const { userId, key, items } = data;
+
+    if (!Array.isArray(items)) {
+      return new Response(
+        JSON.stringify({ error: "Expected 'items' array" }),
+        { status: 400, headers: { "Content-Type": "application/json" } }
+      );
+    }
+
+    if (typeof userId !== "string" || typeof key !== "string") {
+      return new Response(
+        JSON.stringify({ error: "Expected 'userId' and 'key' strings" }),
+        { status: 400, headers: { "Content-Type": "application/json" } }
+      );
+    }
+
+    const result = await ctx.runMutation(internal.userAnime.importMalBatch, {
+      userId,
+      key,
+      items,
+    });
+
+    return new Response(
+      JSON.stringify({
+        success: true,
+        ...result
+      }),
+      {
+        status: 200,
+        headers: { "Content-Type": "application/json" }
+      }
+    );
+  } catch (error) {
+    return new Response(
+      JSON.stringify({
+        error: error instanceof Error ? error.message : String(error)
+      }),
+      {
+        status: 500,
+        headers: { "Content-Type": "application/json" }
+      }
+    );
+  }
+});
@@ -32,11 +32,16 @@ export default defineSchema({
     producers: v.array(v.string()),
     relatedAnime: v.array(v.string()),
     tags: v.array(v.string()),
+    // Set by the Python delta sync: MAL id or normalized title key, and a
+    // hash of the uploaded fields used to skip unchanged rows
+    syncKey: v.optional(v.string()),
+    contentHash: v.optional(v.string()),
   })
     .index("by_title", ["title"])
     .index("by_type", ["type"])
     .index("by_year", ["animeSeason.year"])
     .index("by_malId", ["malId"])
+    .index("by_syncKey", ["syncKey"])
     .searchIndex("search_title", {
       searchField: "title",
       filterFields: ["type", "status"],
@@ -66,7 +71,22 @@ export default defineSchema({
     .index("by_userId", ["userId"])
     .index("by_userId_favorite", ["userId", "isFavorite"])
     .index("by_userId_watched", ["userId", "isWatched"])
-    .index("by_userId_animeId", ["userId", "animeId"]),
+    .index("by_userId_animeId", ["userId", "animeId"])
+    .index("by_animeId", ["animeId"]),
+
+  // Results of userAnime.importMalBatch, so a retried batch with the same
+  // idempotency key returns the first outcome instead of writing again
+  userAnimeImports: defineTable({
+    userId: v.string(),
+    key: v.string(),
+    inserted: v.number(),
+    updated: v.number(),
+    skipped: v.number(),
+    notFound: v.array(v.string()),
+    total: v.number(),
+    createdAt: v.number(),
+  })
+    .index("by_userId_key", ["userId", "key"]),
 
   topAnimeCache: defineTable({
     season: v.string(),
@@ -1,6 +1,7 @@
-import { query, mutation } from "./_generated/server";
+import { query, mutation, internalMutation } from "./_generated/server";
 import { getAuthUserId } from "@convex-dev/auth/server";
 import { v } from "convex/values";
+import { Doc, Id } from "./_generated/dataModel";
 
 export const getMyFavorites = query({
   handler: async (ctx) => {
@@ -256,3 +257,141 @@ export const bulkMarkAsWatched = mutation({
     return { imported, skipped };
   },
 });
+
+// Import a batch of a user's MAL list: resolve the MAL ids through the
+// anime by_malId index, then insert or patch the user's rows. Flags are only
+// ever set, never cleared, so importing an overlapping list is safe. A batch
+// sent again under the same idempotency key (a client retry after a lost
+// response) returns the stored result without writing anything. Internal:
+// it takes the userId as an argument, so only the secret-checked
+// /userAnime/import-mal action may call it.
+export const importMalBatch = internalMutation({
+  args: {
+    userId: v.string(),
+    key: v.string(),
+    items: v.array(
+      v.object({
+        malId: v.string(),
+        isWatched: v.boolean(),
+        isFavorite: v.boolean(),
+      })
+    ),
+  },
+  handler: async (ctx, args) => {
+    const previous = await ctx.db
+      .query("userAnimeImports")
+      .withIndex("by_userId_key", (q) =>
+        q.eq("userId", args.userId).eq("key", args.key)
+      )
+      .unique();
+
+    if (previous) {
+      return {
+        imported: previous.inserted + previous.updated,
+        inserted: previous.inserted,
+        updated: previous.updated,
+        skipped: previous.skipped,
+        notFound: previous.notFound,
+        failed: 0,
+        total: previous.total,
+        replayed: true,
+      };
+    }
+
+    const malIds = [...new Set(args.items.map((item) => item.malId))];
+    const resolved = await Promise.all(
+      malIds.map(async (malId) => {
+        const anime = await ctx.db
+          .query("anime")
+          .withIndex("by_malId", (q) => q.eq("malId", malId))
+          .first();
+        return [malId, anime?._id ?? null] as const;
+      })
+    );
+    const animeIdByMalId = new Map(resolved);
+    const notFound = malIds.filter((malId) => !animeIdByMalId.get(malId));
+
+    // Merge duplicate entries so each anime is read and written once
+    const wanted = new Map<Id<"anime">, { isWatched: boolean; isFavorite: boolean }>();
+    for (const item of args.items) {
+      const animeId = animeIdByMalId.get(item.malId);
+      if (!animeId) continue;
+      const flags = wanted.get(animeId);
+      wanted.set(animeId, {
+        isWatched: item.isWatched || (flags?.isWatched ?? false),
+        isFavorite: item.isFavorite || (flags?.isFavorite ?? false),
+      });
+    }
+
+    const existingRows = await Promise.all(
+      [...wanted.keys()].map((animeId) =>
+        ctx.db
+          .query("userAnime")
+          .withIndex("by_userId_animeId", (q) =>
+            q.eq("userId", args.userId).eq("animeId", animeId)
+          )
+          .unique()
+      )
+    );
+
+    const now = Date.now();
+    let inserted = 0;
+    let updated = 0;
+    let skipped = 0;
+
+    let i = 0;
+    for (const [animeId, flags] of wanted) {
+      const existing = existingRows[i++];
+
+      if (!existing) {
+        await ctx.db.insert("userAnime", {
+          userId: args.userId,
+          animeId,
+          isFavorite: flags.isFavorite,
+          isWatched: flags.isWatched,
+          watchedAt: flags.isWatched ? now : undefined,
+          updatedAt: now,
+        });
+        inserted++;
+        continue;
+      }
+
+      const patch: Partial<Doc<"userAnime">> = {};
+      if (flags.isWatched && !existing.isWatched) {
+        patch.isWatched = true;
+        patch.watchedAt = now;
+      }
+      if (flags.isFavorite && !existing.isFavorite) {
+        patch.isFavorite = true;
+      }
+      if (Object.keys(patch).length === 0) {
+        skipped++;
+        continue;
+      }
+      await ctx.db.patch(existing._id, { ...patch, updatedAt: now });
+      updated++;
+    }
+
+    await ctx.db.insert("userAnimeImports", {
+      userId: args.userId,
+      key: args.key,
+      inserted,
+      updated,
+      skipped,
+      notFound,
+      total: args.items.length,
+      createdAt: now,
+    });
+
+    return {
+      imported: inserted + updated,
+      inserted,
+      updated,
+      skipped,
+      notFound,
+      failed: 0,
+      total: args.items.length,
+      replayed: false,
+    };
+  },
+});
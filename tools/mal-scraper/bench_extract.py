@@ -0,0 +1,184 @@
+"""
+Per-page cost of extracting the data-items payload from MAL list pages.
+
+Compares the original path (full BeautifulSoup tree, then find the
+list-table) with the targeted ListTableFinder in scraper.py on saved
+pages, and checks that both decode to the same items.
+
+Save real pages with `python scraper.py <username> anime 2 --save-pages
+fixtures/`; without page arguments, synthetic pages shaped like MAL's are
+used.
+
+Usage:
+    python bench_extract.py fixtures/
+    python bench_extract.py --synthetic 5 --items 300
+"""
+
+import argparse
+import html
+import json
+import os
+import random
+import time
+
+from scraper import find_list_table, soup_list_table
+
+
+def extract_items(page: str, find_table) -> list | None:
+    """The scraper's page -> items steps, with the given table lookup."""
+    list_table = find_table(page)
+    if not list_table:
+        return None
+    data_items = list_table.get("data-items")
+    if not data_items:
+        return None
+    return json.loads(html.unescape(str(data_items)))
+
+
+def synthetic_page(rng: random.Random, items: int) -> str:
+    """A list page with MAL's layout: long header, list-table, footer."""
+    rows = [
+        {
+            "status": 2,
+            "score": rng.randrange(11),
+            "tags": "",
+            "is_rewatching": 0,
+            "num_watched_episodes": 12,
+            "anime_title": f'Show {i} & "friends" <{rng.randrange(10**6)}>',
+            "anime_title_eng": f"Show {i}",
+            "anime_num_episodes": 12,
+            "anime_airing_status": 2,
+            "anime_id": 1000 + i,
+            "anime_studios": None,
+            "anime_licensors": None,
+            "anime_season": None,
+            "anime_total_members": rng.randrange(10**6),
+            "anime_total_scores": rng.randrange(10**5),
+            "anime_score_val": round(rng.uniform(5, 9), 2),
+            "has_episode_video": False,
+            "has_promotion_video": True,
+            "has_video": True,
+            "video_url": f"/anime/{1000 + i}/video",
+            "genres": [{"id": 1, "name": "Action"}, {"id": 8, "name": "Drama"}],
+            "demographics": [],
+            "title_localized": None,
+            "anime_url": f"/anime/{1000 + i}/Show_{i}",
+            "anime_image_path": f"https://cdn.myanimelist.net/r/192x272/images/anime/{i}.webp",
+            "is_added_to_list": False,
+            "anime_media_type_string": "TV",
+            "anime_mpaa_rating_string": "PG-13",
+            "start_date_string": None,
+            "finish_date_string": "01-02-24",
+            "anime_start_date_string": "10-01-23",
+            "anime_end_date_string": "12-24-23",
+            "days_string": None,
+            "storage_string": "",
+            "priority_string": "Low",
+            "notes": "",
+            "editable_notes": "",
+        }
+        for i in range(items)
+    ]
+    nav = "".join(
+        f'<li class="menu-item"><a href="/topics/{i}" title="Topic {i}">Topic {i}</a></li>'
+        for i in range(600)
+    )
+    footer = "".join(
+        f'<a href="/about/{i}">About &amp; {i}</a><br>' for i in range(400)
+    )
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>List</title>"
+        + "".join(f'<link rel="preload" href="/css/{i}.css">' for i in range(40))
+        + '<script>window.MAL = {"list": "<table>"};</script></head><body>'
+        + f'<header><nav><ul class="menu">{nav}</ul></nav></header>'
+        + '<div id="list_surround"><table class="list-table" data-items="'
+        + html.escape(json.dumps(rows))
+        + '" data-broadcasts="[]"><tbody class="list-item"><tr class="list-table-data">'
+        + '<td class="data title">{{ item.anime_title }}</td></tr></tbody></table></div>'
+        + f"<footer>{footer}</footer></body></html>"
+    )
+
+
+def load_pages(paths: list[str]) -> list[tuple[str, str]]:
+    pages = []
+    for path in paths:
+        files = (
+            sorted(os.path.join(path, name) for name in os.listdir(path))
+            if os.path.isdir(path)
+            else [path]
+        )
+        for name in files:
+            with open(name, encoding="utf-8") as f:
+                pages.append((os.path.basename(name), f.read()))
+    return pages
+
+
+def best_time(func, page: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(page)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(paths: list[str], synthetic: int, items: int, repeat: int, seed: int):
+    if paths:
+        pages = load_pages(paths)
+    else:
+        rng = random.Random(seed)
+        pages = [
+            (f"synthetic-{i}", synthetic_page(rng, items)) for i in range(synthetic)
+        ]
+
+    total_before = total_after = 0.0
+    identical = True
+    print(f"{'page':40} {'KiB':>7} {'soup ms':>9} {'fast ms':>9} {'speedup':>8}")
+    for name, page in pages:
+        identical &= extract_items(page, soup_list_table) == extract_items(
+            page, find_list_table
+        )
+        before = best_time(lambda p: extract_items(p, soup_list_table), page, repeat)
+        after = best_time(lambda p: extract_items(p, find_list_table), page, repeat)
+        total_before += before
+        total_after += after
+        print(
+            f"{name[:40]:40} {len(page) / 1024:7.0f} {before * 1e3:9.2f} "
+            f"{after * 1e3:9.2f} {before / after:7.1f}x"
+        )
+
+    print(
+        f"\nmean per page: soup {total_before / len(pages) * 1e3:.2f} ms, "
+        f"fast {total_after / len(pages) * 1e3:.2f} ms "
+        f"({total_before / total_after:.1f}x)"
+    )
+    print(f"identical items: {identical}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "pages", nargs="*", help="saved list pages, or directories of them"
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=5,
+        help="synthetic pages to use when no pages are given (default: 5)",
+    )
+    parser.add_argument(
+        "--items", type=int, default=300, help="items per synthetic page (default: 300)"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    main(
+        paths=args.pages,
+        synthetic=args.synthetic,
+        items=args.items,
+        repeat=args.repeat,
+        seed=args.seed,
+    )
@@ -0,0 +1,149 @@
+"""
+On-disk cache of fetched list pages for scraper.py.
+
+Pages are stored zlib-compressed in one SQLite file, keyed by URL and query
+parameters, together with their ETag and Last-Modified validators. A page
+younger than the TTL is served without touching the network. Older pages
+are revalidated with If-None-Match / If-Modified-Since, so an unchanged
+list costs a 304 instead of the full page. When the stored pages exceed the
+size limit, the least recently used ones are evicted. In offline mode only
+cached pages are served, whatever their age.
+"""
+
+import sqlite3
+import threading
+import time
+import zlib
+from typing import NamedTuple
+from urllib.parse import urlencode
+
+DEFAULT_CACHE_PATH = ".mal_cache.sqlite"
+DEFAULT_TTL = 6 * 3600  # seconds
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class CacheMiss(Exception):
+    """An offline lookup for a page that is not in the cache."""
+
+
+class CachedPage(NamedTuple):
+    key: str
+    text: str
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+
+
+class PageCache:
+    """Size-bounded LRU page cache. Safe to share between threads."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        offline: bool = False,
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.stats = {"fresh": 0, "revalidated": 0, "fetched": 0}
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_pages_used_at ON pages(used_at)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def key(url: str, params: dict) -> str:
+        return f"{url}?{urlencode(sorted(params.items()))}"
+
+    def get(self, url: str, params: dict) -> CachedPage | None:
+        """The cached page for this request (marking it used), or None."""
+        key = self.key(url, params)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM pages WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE pages SET used_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+        body, etag, last_modified, stored_at = row
+        return CachedPage(
+            key, zlib.decompress(body).decode("utf-8"), etag, last_modified, stored_at
+        )
+
+    def count(self, outcome: str):
+        """Tally a lookup outcome ("fresh", "revalidated" or "fetched")."""
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return time.time() - page.stored_at < self.ttl
+
+    def put(
+        self,
+        url: str,
+        params: dict,
+        text: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ):
+        """Store a page, then evict least recently used pages over the limit."""
+        body = zlib.compress(text.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(url, params), body, etag, last_modified, now, now, len(body)),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def revalidated(self, page: CachedPage):
+        """Restart the TTL of a page the server confirmed unchanged (304)."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "UPDATE pages SET stored_at = ?, used_at = ? WHERE key = ?",
+                (now, now, page.key),
+            )
+            self.conn.commit()
+
+    def _evict(self):
+        (total,) = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM pages ORDER BY used_at"
+        ):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM pages WHERE key = ?", doomed)
+
+    def close(self):
+        self.conn.close()
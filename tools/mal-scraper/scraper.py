@@ -1,12 +1,228 @@
 import requests
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from html.parser import HTMLParser
+from http_cache import (
+    DEFAULT_CACHE_PATH,
+    DEFAULT_MAX_BYTES,
+    DEFAULT_TTL,
+    CacheMiss,
+    PageCache,
+)
+from requests.adapters import HTTPAdapter
+import argparse
+import csv
 import json
 import html
+import os
 import sys
+import threading
 import time
+from typing import Callable, TextIO
 
+MAL_URL = "https://myanimelist.net"
+PAGE_SIZE = 300  # items per list page
+MAX_RETRIES = 3  # per page, on HTTP 429
+DEFAULT_RATE = 1.0  # list pages per second, shared by all jobs
+DEFAULT_WORKERS = 4
 
-def scrape_mal_list(username: str, list_type: str = "manga", status: int = 1):
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: at most `rate` requests per second on average,
+    with bursts of up to `burst`. Callers that find the bucket empty reserve
+    the next token and sleep until it is due, so waiting threads are served
+    in order.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = 1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+class _StopParsing(Exception):
+    pass
+
+
+# Stands in for "&quot;" while a page is tokenized (see find_list_table)
+_QUOT = "\ue000"
+
+
+class ListTableFinder(HTMLParser):
+    """
+    Tokenizer that stops at the first <table> whose class includes
+    "list-table" and keeps that tag's attributes, without building a tree.
+
+    BeautifulSoup's "html.parser" builder sits on the same HTMLParser, so
+    the table found is the one soup.find("table", class_="list-table")
+    would return (values entity-decoded, last duplicate winning, valueless
+    attributes as ""), but nothing after it is tokenized and no tree is
+    built. Only the public feed() / handle_starttag() interface is used;
+    the search stops by raising from handle_starttag().
+
+    With quoted=True the page had each "&quot;" swapped for _QUOT, which is
+    mapped back here.
+    """
+
+    def __init__(self, quoted: bool = False):
+        # BeautifulSoup decodes character references itself
+        super().__init__(convert_charrefs=False)
+        self.quoted = quoted
+        self.attrs: dict[str, str] | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "table":
+            return
+        table_attrs = {}
+        for name, value in attrs:
+            if self.quoted:
+                # Names are not unescaped, values are
+                name = name.replace(_QUOT, "&quot;")
+                value = value and value.replace(_QUOT, '"')
+            table_attrs[name] = value or ""
+        if "list-table" in table_attrs.get("class", "").split():
+            self.attrs = table_attrs
+            raise _StopParsing
+
+
+def find_list_table(page: str) -> dict[str, str] | None:
+    """
+    Attributes of the page's list-table, or None if it has none.
+
+    data-items holds a whole page of JSON with every quote escaped, and
+    html.unescape() calls back into Python for each of them. Each "&quot;"
+    is swapped for a private-use character before tokenizing and mapped
+    back afterwards. The character is not special to the tokenizer or to
+    html.unescape(), so the result is the same, only faster.
+    """
+    quoted = _QUOT not in page and "&quot;" in page
+    if quoted:
+        page = page.replace("&quot;", _QUOT)
+    finder = ListTableFinder(quoted)
+    try:
+        finder.feed(page)
+        finder.close()
+    except _StopParsing:
+        pass
+    return finder.attrs
+
+
+def soup_list_table(page: str):
+    """find_list_table() through a full BeautifulSoup tree (the original path)."""
+    soup = BeautifulSoup(page, "html.parser")
+    return soup.find("table", class_="list-table")
+
+
+class JsonlWriter:
+    """
+    Writes list items as JSON Lines, one object per item, a page at a time.
+    Each page is flushed as soon as it is written, so a consumer can work
+    on it while later pages are still downloading. Safe to share between
+    threads.
+    """
+
+    def __init__(self, stream: TextIO = sys.stdout):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, items: list[dict], extra: dict | None = None):
+        lines = "".join(json.dumps({**(extra or {}), **item}) + "\n" for item in items)
+        with self._lock:
+            self.stream.write(lines)
+            self.stream.flush()
+
+    def write_job(self, job: tuple, items: list[dict]):
+        """scrape_batch() on_page hook: items tagged with the job's username."""
+        self.write(items, {"username": job[0]})
+
+
+def make_session(pool_size: int = DEFAULT_WORKERS) -> requests.Session:
+    """Keep-alive session whose connection pool fits `pool_size` threads."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch_page(
+    session, limiter, url: str, params: dict, cache: PageCache | None = None
+) -> str:
+    """
+    GET one list page and return its HTML, waiting for the limiter and
+    retrying on 429. With a cache, fresh pages are served without a
+    request and stale ones are revalidated.
+    """
+    cached = cache.get(url, params) if cache else None
+    if cached and (cache.offline or cache.is_fresh(cached)):
+        cache.count("fresh")
+        return cached.text
+    if cache and cache.offline:
+        raise CacheMiss(f"{cache.key(url, params)} is not cached")
+
+    headers = {}
+    if cached and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        response = session.get(url, params=params, headers=headers, timeout=30)
+        if response.status_code != 429 or attempt == MAX_RETRIES:
+            break
+        retry_after = response.headers.get("Retry-After", "")
+        time.sleep(float(retry_after) if retry_after.isdigit() else 5 * 2**attempt)
+
+    if cached and response.status_code == 304:
+        cache.revalidated(cached)
+        cache.count("revalidated")
+        return cached.text
+    response.raise_for_status()
+    if cache:
+        cache.put(
+            url,
+            params,
+            response.text,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+        cache.count("fetched")
+    return response.text
+
+
+def scrape_mal_list(
+    username: str,
+    list_type: str = "manga",
+    status: int = 1,
+    session: requests.Session | None = None,
+    limiter: TokenBucket | None = None,
+    echo: bool = True,
+    save_dir: str | None = None,
+    cache: PageCache | None = None,
+    on_page: Callable[[list[dict]], None] | None = None,
+):
     """
     Scrape titles from a public MyAnimeList user list.
 
@@ -14,19 +230,25 @@ def scrape_mal_list(username: str, list_type: str = "manga", status: int = 1):
         username: MAL username
         list_type: "anime" or "manga"
         status: 1=Reading/Watching, 2=Completed, 3=On Hold, 4=Dropped, 6=Plan to Read/Watch, 7=All
+        session: shared keep-alive session (a new one if omitted)
+        limiter: shared TokenBucket pacing page requests (DEFAULT_RATE if omitted)
+        echo: print each title to stdout as it is found
+        save_dir: also write every fetched page there (fixtures for bench_extract.py)
+        cache: on-disk PageCache to serve and revalidate pages from
+        on_page: called with every page's data-items records, as parsed
     """
-    base_url = f"https://myanimelist.net/{list_type}list/{username}"
+    base_url = f"{MAL_URL}/{list_type}list/{username}"
     params = {"status": status}
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+    session = session or make_session(1)
+    limiter = limiter or TokenBucket()
+    # Prefix progress messages when several lists are scraped at once
+    label = "" if echo else f"[{username} {list_type} {status}] "
 
     all_titles = []
     offset = 0
 
     while True:
-        print(f"Fetching page with offset {offset}...", file=sys.stderr)
+        print(f"{label}Fetching page with offset {offset}...", file=sys.stderr)
 
         # Add offset for pagination
         current_params = params.copy()
@@ -34,23 +256,22 @@ def scrape_mal_list(username: str, list_type: str = "manga", status: int = 1):
             current_params["offset"] = offset
 
         try:
-            response = requests.get(
-                base_url, params=current_params, headers=headers, timeout=30
-            )
-            response.raise_for_status()
-        except requests.RequestException as e:
-            print(f"Error fetching page: {e}", file=sys.stderr)
+            page = fetch_page(session, limiter, base_url, current_params, cache)
+        except (requests.RequestException, CacheMiss) as e:
+            print(f"{label}Error fetching page: {e}", file=sys.stderr)
             break
 
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, "html.parser")
+        if save_dir:
+            name = f"{list_type}list_{username}_{status}_{offset}.html"
+            with open(os.path.join(save_dir, name), "w", encoding="utf-8") as f:
+                f.write(page)
 
         # Find the list table which contains the data-items attribute
-        list_table = soup.find("table", class_="list-table")
+        list_table = find_list_table(page)
 
         if not list_table:
             print(
-                "No list table found. User might have a private list or no items.",
+                f"{label}No list table found. User might have a private list or no items.",
                 file=sys.stderr,
             )
             break
@@ -59,20 +280,23 @@ def scrape_mal_list(username: str, list_type: str = "manga", status: int = 1):
         data_items = list_table.get("data-items")
 
         if not data_items:
-            print("No data-items attribute found.", file=sys.stderr)
+            print(f"{label}No data-items attribute found.", file=sys.stderr)
             break
 
         # Decode HTML entities and parse JSON
         try:
             items = json.loads(html.unescape(str(data_items)))
         except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}", file=sys.stderr)
+            print(f"{label}Error parsing JSON: {e}", file=sys.stderr)
             break
 
         if not items:
-            print("No items found on this page.", file=sys.stderr)
+            print(f"{label}No items found on this page.", file=sys.stderr)
             break
 
+        if on_page:
+            on_page(items)
+
         # Extract titles
         page_titles = 0
         for item in items:
@@ -87,33 +311,198 @@ def scrape_mal_list(username: str, list_type: str = "manga", status: int = 1):
                 )
             if title and title != "Unknown":
                 all_titles.append(title)
-                print(title)
+                if echo:
+                    print(title)
                 page_titles += 1
 
-        print(f"Found {page_titles} titles on this page", file=sys.stderr)
+        print(f"{label}Found {page_titles} titles on this page", file=sys.stderr)
 
         # Check if there's a next page (MAL uses 300 items per page)
-        if len(items) < 300:
+        if len(items) < PAGE_SIZE:
             # Less than 300 items means we're on the last page
             break
 
-        offset += 300
-
-        # Be polite - add a small delay between requests
-        time.sleep(1)
+        offset += PAGE_SIZE
 
-    print(f"\nTotal titles scraped: {len(all_titles)}", file=sys.stderr)
+    print(f"\n{label}Total titles scraped: {len(all_titles)}", file=sys.stderr)
     return all_titles
 
 
+def read_jobs(path: str) -> list[tuple[str, str, int]]:
+    """
+    Read batch jobs, one `username,type,status` per line. Type and status
+    may be left out (manga, 1); blank lines and lines starting with # are
+    skipped.
+    """
+    jobs = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            row = [field.strip() for field in row]
+            if not row or not row[0] or row[0].startswith("#"):
+                continue
+            list_type, status = parse_list_args(row[1:])
+            jobs.append((row[0], list_type, status))
+    return jobs
+
+
+def scrape_batch(
+    jobs: list[tuple[str, str, int]],
+    workers: int = DEFAULT_WORKERS,
+    rate: float = DEFAULT_RATE,
+    burst: int = 1,
+    save_dir: str | None = None,
+    cache: PageCache | None = None,
+    on_page: Callable[[tuple, list[dict]], None] | None = None,
+):
+    """
+    Scrape many lists concurrently on one keep-alive session. All page
+    requests share one token bucket, so the total request rate stays at
+    `rate` however many jobs run at once. Yields (job, titles) as each job
+    finishes; `on_page`, if given, is called with (job, items) for every
+    page as it is parsed.
+    """
+    session = make_session(workers)
+    limiter = TokenBucket(rate, burst)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                scrape_mal_list,
+                *job,
+                session=session,
+                limiter=limiter,
+                echo=False,
+                save_dir=save_dir,
+                cache=cache,
+                on_page=on_page and partial(on_page, job),
+            ): job
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def parse_list_args(args: list[str]) -> tuple[str, int]:
+    """[type] [status] as accepted on the command line -> (type, status)."""
+    if args and args[0] in ["anime", "manga"]:
+        list_type, args = args[0], args[1:]
+    else:
+        list_type = "manga"
+    status = int(args[0]) if args else 1
+    return list_type, status
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python scraper.py <username> [type] [status]", file=sys.stderr)
-        print("Type: anime or manga (default: manga)", file=sys.stderr)
-        print(
-            "Status codes: 1=Reading/Watching, 2=Completed, 3=On Hold, 4=Dropped, 6=Plan to Read/Watch, 7=All",
-            file=sys.stderr,
+    parser = argparse.ArgumentParser(
+        description="Scrape titles from public MyAnimeList lists.",
+        epilog="Status codes: 1=Reading/Watching, 2=Completed, 3=On Hold, 4=Dropped, 6=Plan to Read/Watch, 7=All",
+    )
+    parser.add_argument("username", nargs="?", help="MAL username")
+    parser.add_argument(
+        "list_args",
+        nargs="*",
+        metavar="[type] [status]",
+        help="anime or manga (default: manga), then a status code (default: 1)",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="scrape every username,type,status line of FILE concurrently",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"lists scraped at once in --batch mode (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=DEFAULT_RATE,
+        help=f"page requests per second across all lists (default: {DEFAULT_RATE:g})",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=1,
+        help="requests that may go out back to back before --rate applies (default: 1)",
+    )
+    parser.add_argument(
+        "--save-pages",
+        metavar="DIR",
+        help="also save every fetched list page to DIR (fixtures for bench_extract.py)",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=DEFAULT_CACHE_PATH,
+        metavar="FILE",
+        help=f"cache pages in this SQLite file (default with no FILE: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=DEFAULT_TTL,
+        help=f"seconds a cached page is used without revalidating it (default: {DEFAULT_TTL})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // 2**20,
+        help=f"MiB of pages kept before evicting the least recently used (default: {DEFAULT_MAX_BYTES // 2**20})",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="serve pages from the cache only, never from MAL (implies --cache)",
+    )
+    parser.add_argument(
+        "--jsonl",
+        action="store_true",
+        help="print every list item as a JSON object (all fields, including "
+        "anime_id/manga_id) instead of titles; --batch adds the username",
+    )
+    args = parser.parse_args()
+    writer = JsonlWriter() if args.jsonl else None
+    if args.save_pages:
+        os.makedirs(args.save_pages, exist_ok=True)
+    cache = None
+    if args.cache or args.offline:
+        cache = PageCache(
+            args.cache or DEFAULT_CACHE_PATH,
+            ttl=args.cache_ttl,
+            max_bytes=args.cache_size * 2**20,
+            offline=args.offline,
         )
+
+    if args.batch:
+        for (username, list_type, status), titles in scrape_batch(
+            read_jobs(args.batch),
+            args.workers,
+            args.rate,
+            args.burst,
+            args.save_pages,
+            cache,
+            writer and writer.write_job,
+        ):
+            if writer:
+                continue
+            # One tab-separated "username type status title" line per title
+            for title in titles:
+                print(f"{username}\t{list_type}\t{status}\t{title}")
+    elif args.username:
+        list_type, status = parse_list_args(args.list_args)
+        scrape_mal_list(
+            args.username,
+            list_type,
+            status,
+            limiter=TokenBucket(args.rate, args.burst),
+            echo=not writer,
+            save_dir=args.save_pages,
+            cache=cache,
+            on_page=writer and writer.write,
+        )
+    else:
+        parser.print_usage(sys.stderr)
         print("\nExamples:", file=sys.stderr)
         print(
             "  python scraper.py TheGOF 1              # manga reading list",
@@ -127,29 +516,17 @@ if __name__ == "__main__":
             "  python scraper.py BarJsX anime 2        # anime completed list",
             file=sys.stderr,
         )
+        print(
+            "  python scraper.py --batch jobs.csv      # many lists at once",
+            file=sys.stderr,
+        )
         sys.exit(1)
 
-    username = sys.argv[1]
-
-    # Parse arguments - check if second arg is type or status
-    if len(sys.argv) == 2:
-        list_type = "manga"
-        status = 1
-    elif len(sys.argv) == 3:
-        # Check if arg 2 is a type or status
-        if sys.argv[2] in ["anime", "manga"]:
-            list_type = sys.argv[2]
-            status = 1
-        else:
-            list_type = "manga"
-            status = int(sys.argv[2])
-    else:
-        # len >= 4
-        if sys.argv[2] in ["anime", "manga"]:
-            list_type = sys.argv[2]
-            status = int(sys.argv[3])
-        else:
-            list_type = "manga"
-            status = int(sys.argv[2])
-
-    scrape_mal_list(username, list_type, status)
+    if cache:
+        stats = cache.stats
+        print(
+            f"Cache: {stats['fresh']} pages served from cache, "
+            f"{stats['revalidated']} revalidated (304), {stats['fetched']} downloaded",
+            file=sys.stderr,
+        )
+        cache.close()
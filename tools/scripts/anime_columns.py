@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshot files for the anime catalogue.
+
+A column file stores each field of the catalogue as its own contiguous
+column, so a reader can memory-map the file and decode only the columns it
+needs (column projection): a stage that only looks at titles and sources
+never touches pictures, tags or related URLs.
+
+Layout (all integers little-endian):
+
+    8s magic "ANIMECOL", u32 version, u32 header length
+    JSON header: {"rows": n, "columns": {name: spec}}
+    column blocks, each 8-byte aligned, addressed by [offset, length]
+    relative to the first block
+
+Column kinds:
+
+- num:  int64 ("q") or float64 ("d") values. A column mixing ints and
+        floats is stored as float64 with an "ints" block of one 0/1 byte
+        per row, so each value reads back with its own type (7, not 7.0).
+- str:  UTF-8 text of all values separated by NUL, or, when a value
+        contains NUL itself, concatenated with n + 1 code point offsets
+- dict: dictionary-encoded strings (type, status, season, unit and the
+        studio/producer/tag lists): a str column of distinct values plus
+        int32 codes, -1 for null. Decoding shares one string object per
+        distinct value, like the interning in anime_record.py.
+- list: n + 1 offsets into a str or dict column of all list items
+
+Nullable columns carry a "valid" block with one 0/1 byte per row. Nested
+fields are flattened into one column per key ("animeSeason.year").
+
+Usage:
+    python anime_columns.py anime_export.jsonl catalogue.acol
+    python anime_columns.py newanimedb.json catalogue.acol
+    python anime_columns.py anime.db catalogue.acol
+    python anime_columns.py --info catalogue.acol
+"""
+
+import argparse
+import gc
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+from itertools import accumulate, chain, repeat, starmap
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping
+
+from anime_db import load_anime_by_id
+from anime_record import (
+    FIELD_SET,
+    FIELDS,
+    LIST_FIELDS,
+    NESTED_FIELDS,
+    AnimeRecord,
+    shared_nested,
+)
+from anime_spill import count_spill, iter_spill
+from json_stream import iter_json_array
+from jsonl_to_sqlite import iter_jsonl_entries
+
+COLUMN_SUFFIX = ".acol"
+MAGIC = b"ANIMECOL"
+VERSION = 2
+# Version 1 files have no "ints" blocks and read back the same way
+READABLE_VERSIONS = {1, 2}
+PREAMBLE = struct.Struct("<8sII")
+ALIGN = 8
+SEPARATOR = "\0"
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+# Column name -> kind, in file order
+COLUMN_KINDS = {
+    "title": "str",
+    "type": "dict",
+    "episodes": "num",
+    "status": "dict",
+    "animeSeason.season": "dict",
+    "animeSeason.year": "num",
+    "picture": "str",
+    "thumbnail": "str",
+    "duration.value": "num",
+    "duration.unit": "dict",
+    "score.arithmeticGeometricMean": "num",
+    "score.arithmeticMean": "num",
+    "score.median": "num",
+    "sources": "list",
+    "synonyms": "list",
+    "studios": "list",
+    "producers": "list",
+    "relatedAnime": "list",
+    "tags": "list",
+    "malId": "str",
+}
+# List columns whose items are dictionary-encoded
+DICT_LIST_COLUMNS = {"studios", "producers", "tags"}
+
+
+def _align(n: int) -> int:
+    return n + (-n % ALIGN)
+
+
+def _array_bytes(values: array) -> bytes:
+    if not LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class _BlockWriter:
+    """Collect column blocks into one aligned buffer."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def add(self, data: bytes) -> list[int]:
+        self.buffer += bytes(-len(self.buffer) % ALIGN)
+        offset = len(self.buffer)
+        self.buffer += data
+        return [offset, len(data)]
+
+    def add_array(self, values: array) -> list[int]:
+        return self.add(_array_bytes(values))
+
+    def add_valid(self, spec: dict, values: list):
+        if any(value is None for value in values):
+            spec["valid"] = self.add(bytes(value is not None for value in values))
+
+
+def _encode_str(blocks: _BlockWriter, values: list[str | None]) -> dict:
+    text = SEPARATOR.join(value or "" for value in values)
+    spec = {"kind": "str", "count": len(values)}
+    # One separator per gap means no value contains it, so the reader can
+    # split the text in C instead of slicing each value out
+    if text.count(SEPARATOR) != max(len(values) - 1, 0):
+        lengths = (len(value) if value is not None else 0 for value in values)
+        spec["offsets"] = blocks.add_array(array("Q", accumulate(lengths, initial=0)))
+        text = "".join(filter(None, values))
+    spec["data"] = blocks.add(text.encode("utf-8"))
+    blocks.add_valid(spec, values)
+    return spec
+
+
+def _encode_dict(blocks: _BlockWriter, values: list[str | None]) -> dict:
+    codes_by_value: dict[str, int] = {}
+    codes = array(
+        "i",
+        (
+            -1
+            if value is None
+            else codes_by_value.setdefault(value, len(codes_by_value))
+            for value in values
+        ),
+    )
+    return {
+        "kind": "dict",
+        "values": _encode_str(blocks, list(codes_by_value)),
+        "codes": blocks.add_array(codes),
+    }
+
+
+def _encode_num(blocks: _BlockWriter, values: list[float | None]) -> dict:
+    is_int = [type(value) is int for value in values]
+    present = [value for value in values if value is not None]
+    typecode = "q" if sum(is_int) == len(present) else "d"
+    spec = {
+        "kind": "num",
+        "type": typecode,
+        "data": blocks.add_array(
+            array(typecode, (0 if value is None else value for value in values))
+        ),
+    }
+    if typecode == "d" and any(is_int):
+        for value, flag in zip(values, is_int):
+            if flag and float(value) != value:
+                raise ValueError(f"{value} cannot be stored exactly in a mixed column")
+        spec["ints"] = blocks.add(bytes(is_int))
+    blocks.add_valid(spec, values)
+    return spec
+
+
+def _encode_list(
+    blocks: _BlockWriter, values: list[Iterable[str]], dictionary: bool
+) -> dict:
+    items = list(chain.from_iterable(values))
+    encode_items = _encode_dict if dictionary else _encode_str
+    return {
+        "kind": "list",
+        "offsets": blocks.add_array(
+            array("Q", accumulate(map(len, values), initial=0))
+        ),
+        "items": encode_items(blocks, items),
+    }
+
+
+def write_columns(path: Path, entries: Iterable[Mapping[str, Any]]) -> int:
+    """
+    Write entries (Convex-format dicts or AnimeRecords) to a column file.
+
+    The file is written to `<path>.part` and renamed into place once
+    complete. Returns the number of rows.
+    """
+    path = Path(path)
+    columns: dict[str, list] = {name: [] for name in COLUMN_KINDS}
+    nested_columns = [
+        (field, [columns[f"{field}.{key}"] for key in keys], keys)
+        for field, keys in NESTED_FIELDS.items()
+    ]
+    rows = 0
+
+    for entry in entries:
+        for field in (
+            "title",
+            "type",
+            "episodes",
+            "status",
+            "picture",
+            "thumbnail",
+            "malId",
+        ):
+            columns[field].append(entry.get(field))
+        for field, targets, keys in nested_columns:
+            nested = entry.get(field) or {}
+            for target, key in zip(targets, keys):
+                target.append(nested.get(key))
+        for field in LIST_FIELDS:
+            columns[field].append(tuple(entry.get(field) or ()))
+        rows += 1
+
+    blocks = _BlockWriter()
+    specs = {}
+    for name, kind in COLUMN_KINDS.items():
+        values = columns.pop(name)
+        if kind == "str":
+            specs[name] = _encode_str(blocks, values)
+        elif kind == "dict":
+            specs[name] = _encode_dict(blocks, values)
+        elif kind == "num":
+            specs[name] = _encode_num(blocks, values)
+        else:
+            specs[name] = _encode_list(blocks, values, name in DICT_LIST_COLUMNS)
+
+    header = json.dumps({"rows": rows, "columns": specs}).encode("utf-8")
+    preamble = PREAMBLE.pack(MAGIC, VERSION, len(header))
+    part_path = path.with_name(path.name + ".part")
+    with open(part_path, "wb") as f:
+        f.write(preamble)
+        f.write(header)
+        f.write(
+            bytes(_align(len(preamble) + len(header)) - len(preamble) - len(header))
+        )
+        f.write(blocks.buffer)
+    os.replace(part_path, path)
+    return rows
+
+
+def is_column_file(path: Path) -> bool:
+    """Whether `path` is an existing column file (checked by its magic)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class ColumnFile:
+    """
+    Memory-mapped reader for a column file.
+
+    Numeric columns are read straight from the mapping; only the columns
+    that are asked for are decoded.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = PREAMBLE.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an anime column file")
+        if version not in READABLE_VERSIONS:
+            raise ValueError(f"{self.path}: unsupported column file version {version}")
+
+        header_end = PREAMBLE.size + header_length
+        header = json.loads(self._mmap[PREAMBLE.size : header_end])
+        self.rows: int = header["rows"]
+        self._specs: dict[str, dict] = header["columns"]
+        self._view = memoryview(self._mmap)
+        self._data_start = _align(header_end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self._specs)
+
+    def kind(self, name: str) -> str:
+        return self._specs[name]["kind"]
+
+    def _block(self, ref: list[int]) -> memoryview:
+        start = self._data_start + ref[0]
+        return self._view[start : start + ref[1]]
+
+    def _array(self, ref: list[int], typecode: str):
+        if LITTLE_ENDIAN:
+            return self._block(ref).cast(typecode)
+        values = array(typecode, self._block(ref))
+        values.byteswap()
+        return values
+
+    def _decode(self, spec: dict) -> list:
+        kind = spec["kind"]
+        if kind == "str":
+            text = str(self._block(spec["data"]), "utf-8")
+            if "offsets" in spec:
+                offsets = self._array(spec["offsets"], "Q")
+                values = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+            else:
+                values = text.split(SEPARATOR) if spec["count"] else []
+        elif kind == "dict":
+            dictionary = self._decode(spec["values"])
+            dictionary.append(None)  # code -1
+            codes = self._array(spec["codes"], "i")
+            values = list(map(dictionary.__getitem__, codes))
+        elif kind == "num":
+            values = self._array(spec["data"], spec["type"]).tolist()
+            if "ints" in spec:
+                ints = self._block(spec["ints"])
+                values = [
+                    int(value) if flag else value for value, flag in zip(values, ints)
+                ]
+        else:
+            items = self._decode(spec["items"])
+            offsets = self._array(spec["offsets"], "Q")
+            # slice -> items[slice] -> tuple, with the per-row loop kept in C
+            rows = map(items.__getitem__, map(slice, offsets, offsets[1:]))
+            return list(map(tuple, rows))
+
+        if "valid" in spec:
+            valid = self._block(spec["valid"])
+            values = [value if ok else None for value, ok in zip(values, valid)]
+        return values
+
+    def column(self, name: str) -> list:
+        """Decode one column (e.g. "title" or "animeSeason.year")."""
+        if name not in self._specs:
+            raise KeyError(f"{self.path} has no column {name!r}")
+        return self._decode(self._specs[name])
+
+    def records(self, fields: Iterable[str] | None = None) -> list[AnimeRecord]:
+        """
+        Build an AnimeRecord per row. With `fields`, only those Convex
+        fields are decoded; the others are left empty.
+        """
+        wanted = FIELD_SET if fields is None else set(fields)
+        unknown = wanted - FIELD_SET
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+        # Decoding creates a string or tuple per value and no reference
+        # cycles; pausing the cyclic GC spares it repeated scans of them
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._records(wanted)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _records(self, wanted: set[str] | frozenset[str]) -> list[AnimeRecord]:
+        slots: list[Iterable] = []
+        for field in FIELDS:
+            keys = NESTED_FIELDS.get(field)
+            if field not in wanted:
+                slots.append(repeat(() if field in LIST_FIELDS else None, self.rows))
+            elif keys is not None:
+                nested = list(zip(*(self.column(f"{field}.{key}") for key in keys)))
+                # Few distinct values: share each one once, then look them up
+                shared = {values: shared_nested(values) for values in set(nested)}
+                slots.append(map(shared.__getitem__, nested))
+            else:
+                slots.append(self.column(field))
+
+        return list(starmap(AnimeRecord.from_slots, zip(*slots)))
+
+
+def iter_snapshot(path: Path) -> Iterator[Mapping[str, Any]]:
+    """Iterate the entries of a snapshot: a column file or a JSONL spill."""
+    if is_column_file(path):
+        with ColumnFile(path) as columns:
+            return iter(columns.records())
+    return iter_spill(path)
+
+
+def count_snapshot(path: Path) -> int:
+    """Number of entries in a column file or JSONL spill."""
+    if is_column_file(path):
+        with ColumnFile(path) as columns:
+            return columns.rows
+    return count_spill(path)
+
+
+def read_source(path: Path) -> Iterator[Mapping[str, Any]]:
+    """
+    Entries from any catalogue file the scripts use: a JSONL export or
+    offline database (.jsonl), newanimedb.json (.json), anime.db (.db) or
+    another column file.
+    """
+    path = Path(path)
+    if is_column_file(path):
+        yield from iter_snapshot(path)
+    elif path.suffix == ".db":
+        conn = sqlite3.connect(path)
+        try:
+            yield from load_anime_by_id(conn, records=True).values()
+        finally:
+            conn.close()
+    elif path.suffix == ".json":
+        yield from iter_json_array(path, "data")
+    else:
+        stats = {"skipped": 0}
+        with open(path, "rb") as f:
+            for entry in iter_jsonl_entries(f, stats, parse=json.loads):
+                # Skip the offline database's metadata line
+                if "sources" in entry:
+                    yield entry
+
+
+def print_info(path: Path):
+    """Print the columns of a file with their size and decode time."""
+    with ColumnFile(path) as columns:
+        print(f"{path}: {columns.rows} rows, {path.stat().st_size / 1024:.0f} KiB")
+        for name in columns.columns:
+            started = time.perf_counter()
+            columns.column(name)
+            elapsed = time.perf_counter() - started
+            print(f"  {name:32} {columns.kind(name):5} {elapsed * 1000:7.1f} ms")
+
+        started = time.perf_counter()
+        columns.records(("title", "sources"))
+        print(
+            f"  records(title, sources):  {(time.perf_counter() - started) * 1000:7.1f} ms"
+        )
+        started = time.perf_counter()
+        columns.records()
+        print(
+            f"  records(all fields):      {(time.perf_counter() - started) * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("source", type=Path, help="catalogue file to read")
+    parser.add_argument(
+        "dest", type=Path, nargs="?", help=f"column file to write (*{COLUMN_SUFFIX})"
+    )
+    parser.add_argument(
+        "--info",
+        action="store_true",
+        help="show the columns of SOURCE (a column file) and their decode times",
+    )
+    args = parser.parse_args()
+
+    if args.info:
+        print_info(args.source)
+    elif args.dest is None:
+        parser.error("DEST is required unless --info is given")
+    else:
+        started = time.perf_counter()
+        rows = write_columns(args.dest, read_source(args.source))
+        print(
+            f"Wrote {rows} rows to {args.dest} "
+            f"({args.dest.stat().st_size / 1024:.0f} KiB) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
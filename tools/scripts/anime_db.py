@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+SQLite storage helpers for anime.db.
+
+Two layouts are supported:
+
+- legacy: a single `anime` table where list and nested fields are JSON TEXT
+  (written by jsonl_to_sqlite.py by default)
+- normalized: an `anime_entry` table with real season/year/duration/score
+  columns plus one side table per list field (anime_source, anime_synonym,
+  anime_studio, anime_producer, anime_related, anime_tag), each indexed on
+  its value so tag/studio/source lookups are index seeks
+
+Both layouts also carry mal_id, anidb_id, anilist_id and source_priority
+columns computed once at ingest time (see source_ids.py), so the dedupe step
+can group by MAL id with an indexed query instead of regex-scanning sources.
+
+load_anime() reads either layout and returns dicts in the Convex format;
+the dedupe loaders can build compact AnimeRecords instead.
+"""
+
+import json
+import sqlite3
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Iterable
+
+from anime_record import AnimeRecord
+from source_ids import extract_source_ids, source_priority
+
+# Entry field -> (side table, value column)
+SIDE_TABLES = {
+    "sources": ("anime_source", "url"),
+    "synonyms": ("anime_synonym", "synonym"),
+    "studios": ("anime_studio", "studio"),
+    "producers": ("anime_producer", "producer"),
+    "relatedAnime": ("anime_related", "url"),
+    "tags": ("anime_tag", "tag"),
+}
+
+# Columns materialized from the sources list at ingest time
+SOURCE_ID_COLUMNS = {
+    "mal_id": "TEXT",
+    "anidb_id": "TEXT",
+    "anilist_id": "TEXT",
+    "source_priority": "INTEGER",
+}
+
+ENTRY_INSERT_SQL = """
+    INSERT INTO anime_entry
+    (id, title, type, episodes, status, season, year, picture, thumbnail,
+     duration_value, duration_unit, score_agm, score_mean, score_median,
+     mal_id, anidb_id, anilist_id, source_priority)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def create_normalized_tables(conn):
+    """Create the normalized anime tables (indexes are built separately)."""
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS anime_entry (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            type TEXT,
+            episodes INTEGER,
+            status TEXT,
+            season TEXT,
+            year INTEGER,
+            picture TEXT,
+            thumbnail TEXT,
+            duration_value INTEGER,
+            duration_unit TEXT,
+            score_agm REAL,
+            score_mean REAL,
+            score_median REAL,
+            mal_id TEXT,
+            anidb_id TEXT,
+            anilist_id TEXT,
+            source_priority INTEGER
+        )
+    """)
+
+    for table, column in SIDE_TABLES.values():
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                anime_id INTEGER NOT NULL REFERENCES anime_entry(id),
+                position INTEGER NOT NULL,
+                {column} TEXT NOT NULL,
+                PRIMARY KEY (anime_id, position)
+            ) WITHOUT ROWID
+        """)
+
+    conn.commit()
+    ensure_source_id_columns(conn, "anime_entry")
+
+
+def create_normalized_indexes(conn):
+    """Create lookup indexes for the normalized layout."""
+    cursor = conn.cursor()
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_entry_title ON anime_entry(title)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_entry_type ON anime_entry(type)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_entry_year ON anime_entry(year)")
+
+    for table, column in SIDE_TABLES.values():
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column}, anime_id)"
+        )
+
+    create_source_id_indexes(conn, "anime_entry")
+
+
+def create_source_id_indexes(conn, table: str):
+    """Index the materialized source id columns of `table`."""
+    cursor = conn.cursor()
+
+    # Covers the dedupe grouping query: WHERE mal_id ... ORDER BY mal_id, priority
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_mal_id "
+        f"ON {table}(mal_id, source_priority DESC, id)"
+    )
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_anidb_id ON {table}(anidb_id)"
+    )
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_anilist_id ON {table}(anilist_id)"
+    )
+
+    conn.commit()
+
+
+def ensure_source_id_columns(conn, table: str | None = None):
+    """
+    Add and backfill the source id columns on databases created before they
+    existed. A no-op when the columns are already present.
+    """
+    if table is None:
+        table = "anime_entry" if has_normalized_schema(conn) else "anime"
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    missing = [column for column in SOURCE_ID_COLUMNS if column not in existing]
+    if not missing:
+        return
+
+    print(f"Backfilling source id columns on {table}...")
+    cursor = conn.cursor()
+    for column in missing:
+        cursor.execute(
+            f"ALTER TABLE {table} ADD COLUMN {column} {SOURCE_ID_COLUMNS[column]}"
+        )
+
+    if table == "anime":
+        rows = (
+            (anime_id, json.loads(sources or "[]"))
+            for anime_id, sources in conn.execute("SELECT id, sources FROM anime")
+        )
+    else:
+        by_id: dict[int, list[str]] = {}
+        for anime_id, url in conn.execute(
+            "SELECT anime_id, url FROM anime_source ORDER BY anime_id, position"
+        ):
+            by_id.setdefault(anime_id, []).append(url)
+        rows = (
+            (anime_id, by_id.get(anime_id, []))
+            for (anime_id,) in conn.execute("SELECT id FROM anime_entry")
+        )
+
+    updates = [
+        (*extract_source_ids(sources), source_priority(sources), anime_id)
+        for anime_id, sources in rows
+    ]
+    cursor.executemany(
+        f"UPDATE {table} SET mal_id = ?, anidb_id = ?, anilist_id = ?, "
+        f"source_priority = ? WHERE id = ?",
+        updates,
+    )
+    conn.commit()
+
+    create_source_id_indexes(conn, table)
+
+
+def has_normalized_schema(conn) -> bool:
+    """Check whether the database contains the normalized layout."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'anime_entry'"
+    ).fetchone()
+    return row is not None
+
+
+def next_entry_id(conn) -> int:
+    """Return the first free anime_entry id."""
+    row = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM anime_entry").fetchone()
+    return row[0]
+
+
+def insert_normalized(conn, entries: Iterable[dict[str, Any]], first_id: int) -> int:
+    """
+    Insert raw (offline-database format) entries into the normalized tables.
+
+    Ids are assigned from `first_id` so side rows can be written with
+    executemany() without a round trip per entry. Returns the next free id.
+    The caller owns the transaction.
+    """
+    entry_rows = []
+    side_rows: dict[str, list[tuple]] = {field: [] for field in SIDE_TABLES}
+
+    anime_id = first_id
+    for data in entries:
+        season = data.get("animeSeason") or {}
+        duration = data.get("duration") or {}
+        score = data.get("score") or {}
+        sources = data.get("sources") or []
+
+        entry_rows.append(
+            (
+                anime_id,
+                data.get("title", ""),
+                data.get("type", ""),
+                data.get("episodes"),
+                data.get("status", ""),
+                season.get("season"),
+                season.get("year"),
+                data.get("picture", ""),
+                data.get("thumbnail", ""),
+                duration.get("value"),
+                duration.get("unit"),
+                score.get("arithmeticGeometricMean"),
+                score.get("arithmeticMean"),
+                score.get("median"),
+                *extract_source_ids(sources),
+                source_priority(sources),
+            )
+        )
+
+        for field, rows in side_rows.items():
+            rows.extend(
+                (anime_id, position, value)
+                for position, value in enumerate(data.get(field) or [])
+            )
+
+        anime_id += 1
+
+    cursor = conn.cursor()
+    cursor.executemany(ENTRY_INSERT_SQL, entry_rows)
+    for field, (table, column) in SIDE_TABLES.items():
+        cursor.executemany(
+            f"INSERT INTO {table} (anime_id, position, {column}) VALUES (?, ?, ?)",
+            side_rows[field],
+        )
+
+    return anime_id
+
+
+def _compact(**fields) -> dict[str, Any]:
+    """Build a nested dict, leaving out NULL columns."""
+    return {key: value for key, value in fields.items() if value is not None}
+
+
+def _side_lists(conn, table: str, column: str) -> dict[int, list[str]]:
+    """Values of one side table grouped by anime_id, in position order."""
+    rows = conn.execute(
+        f"SELECT anime_id, {column} FROM {table} ORDER BY anime_id, position"
+    )
+    return {
+        anime_id: [value for _, value in group]
+        for anime_id, group in groupby(rows, key=itemgetter(0))
+    }
+
+
+def load_normalized(conn, records: bool = False) -> dict[int, Any]:
+    """
+    Rebuild entries from the normalized tables, keyed by anime_entry id.
+
+    Each side table is read in primary-key order (anime_id, position) and
+    attached to its entry by id, so no per-row JSON parsing is needed. With
+    records=True each entry is an AnimeRecord instead of a dict.
+    """
+    side = {
+        field: _side_lists(conn, table, column)
+        for field, (table, column) in SIDE_TABLES.items()
+    }
+    by_id: dict[int, Any] = {}
+
+    for row in conn.execute("""
+        SELECT id, title, type, episodes, status, season, year, picture, thumbnail,
+               duration_value, duration_unit, score_agm, score_mean, score_median,
+               mal_id
+        FROM anime_entry
+        ORDER BY id
+    """):
+        anime = {
+            "title": row[1],
+            "type": row[2],
+            "episodes": row[3],
+            "status": row[4],
+            "animeSeason": _compact(season=row[5], year=row[6]),
+            "picture": row[7],
+            "thumbnail": row[8],
+            "duration": _compact(value=row[9], unit=row[10]),
+            "score": _compact(
+                arithmeticGeometricMean=row[11], arithmeticMean=row[12], median=row[13]
+            ),
+            **{field: values.pop(row[0], []) for field, values in side.items()},
+        }
+        if row[14] is not None:
+            anime["malId"] = row[14]
+        by_id[row[0]] = AnimeRecord(anime) if records else anime
+
+    return by_id
+
+
+def load_legacy(conn, records: bool = False) -> dict[int, Any]:
+    """
+    Load entries from the legacy JSON-text `anime` table, keyed by id. With
+    records=True each entry is an AnimeRecord instead of a dict.
+    """
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT id, title, type, episodes, status, anime_season, picture, thumbnail,
+               duration, score, sources, synonyms, studios, producers, related_anime, tags,
+               mal_id
+        FROM anime
+        ORDER BY id
+    """)
+
+    by_id = {}
+    for row in cursor:
+        anime = {
+            "title": row["title"],
+            "type": row["type"],
+            "episodes": row["episodes"],
+            "status": row["status"],
+            "animeSeason": json.loads(row["anime_season"] or "{}"),
+            "picture": row["picture"],
+            "thumbnail": row["thumbnail"],
+            "duration": json.loads(row["duration"] or "{}"),
+            "score": json.loads(row["score"] or "{}"),
+            "sources": json.loads(row["sources"] or "[]"),
+            "synonyms": json.loads(row["synonyms"] or "[]"),
+            "studios": json.loads(row["studios"] or "[]"),
+            "producers": json.loads(row["producers"] or "[]"),
+            "relatedAnime": json.loads(row["related_anime"] or "[]"),
+            "tags": json.loads(row["tags"] or "[]"),
+        }
+        if row["mal_id"] is not None:
+            anime["malId"] = row["mal_id"]
+        by_id[row["id"]] = AnimeRecord(anime) if records else anime
+
+    conn.row_factory = None
+    return by_id
+
+
+def load_anime_by_id(conn, records: bool = False) -> dict[int, Any]:
+    """Load all entries keyed by row id, preferring the normalized layout."""
+    ensure_source_id_columns(conn)
+    if has_normalized_schema(conn):
+        return load_normalized(conn, records)
+    return load_legacy(conn, records)
+
+
+def load_anime(conn) -> list[dict[str, Any]]:
+    """Load all entries, preferring the normalized layout when present."""
+    return list(load_anime_by_id(conn).values())
+
+
+def load_anime_grouped(
+    conn, records: bool = False
+) -> tuple[dict[str, list[Any]], list[Any]]:
+    """
+    Load entries already grouped by MAL id.
+
+    Returns (by_mal_id, without_mal_id). Grouping comes from one query over
+    the (mal_id, source_priority DESC, id) index, so each group is ordered
+    highest priority first, ties in row order, exactly as the merge step
+    would sort it. With records=True entries are AnimeRecords.
+    """
+    by_id = load_anime_by_id(conn, records)
+    table = "anime_entry" if has_normalized_schema(conn) else "anime"
+
+    by_mal_id: dict[str, list[Any]] = {}
+    for mal_id, anime_id in conn.execute(f"""
+        SELECT mal_id, id FROM {table}
+        WHERE mal_id IS NOT NULL
+        ORDER BY mal_id, source_priority DESC, id
+    """):
+        by_mal_id.setdefault(mal_id, []).append(by_id.pop(anime_id))
+
+    return by_mal_id, list(by_id.values())
+
+
+def find_ids(conn, field: str, value: str) -> list[int]:
+    """
+    Return anime_entry ids whose list `field` contains `value`.
+
+    Example: find_ids(conn, "tags", "mecha"). Served by the side table's
+    value index rather than a scan.
+    """
+    table, column = SIDE_TABLES[field]
+    rows = conn.execute(
+        f"SELECT DISTINCT anime_id FROM {table} WHERE {column} = ? ORDER BY anime_id",
+        (value,),
+    )
+    return [row[0] for row in rows]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Partitioned, parallel export of the Convex anime table.
+
+/anime/all pages through the table one cursor at a time, so a serial export
+takes page count x round-trip time. Here the _creationTime range reported by
+/anime/bounds is split into partitions, each partition is paginated
+independently on its own worker, and the per-partition spill files are
+concatenated in creation-time order. The result is the same snapshot the
+serial fetch produces.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from tqdm import tqdm
+
+from anime_spill import SPILL_PATH, SpillWriter, concat_spills
+from convex_client import get_client
+from upload_engine import DEFAULT_WORKERS
+
+PAGE_SIZE = 500
+PARTITIONS_PER_WORKER = 4  # smaller ranges keep workers busy if one is dense
+
+
+def fetch_bounds() -> tuple[float, float] | None:
+    """Return the (oldest, newest) _creationTime, or None for an empty table."""
+    data = get_client().get("/anime/bounds")
+    if not data.get("success"):
+        raise Exception(data.get("error", "Unknown error"))
+    if data.get("min") is None:
+        return None
+    return data["min"], data["max"]
+
+
+def plan_partitions(
+    low: float, high: float, partitions: int
+) -> list[tuple[float, float]]:
+    """
+    Split [low, high] into `partitions` contiguous [after, before) ranges.
+
+    The last range ends just past `high` so the newest document is included.
+    """
+    width = (high - low) / partitions
+    edges = [low + width * i for i in range(partitions)] + [high + 1]
+    return list(zip(edges, edges[1:]))
+
+
+def fetch_partition(after: float, before: float, spill_path: Path) -> int:
+    """Page through one _creationTime range into its own spill file."""
+    client = get_client()
+    cursor = None
+
+    with SpillWriter(spill_path) as spill:
+        while True:
+            params = {"limit": PAGE_SIZE, "after": after, "before": before}
+            if cursor:
+                params["cursor"] = cursor
+
+            data = client.get("/anime/all", params)
+            if not data.get("success"):
+                raise Exception(data.get("error", "Unknown error"))
+
+            spill.write_many(data.get("page", []))
+            cursor = data.get("continueCursor")
+            if data.get("isDone") or not cursor:
+                break
+
+    return spill.count
+
+
+def export_partitioned(
+    spill_path: Path = SPILL_PATH,
+    workers: int = DEFAULT_WORKERS,
+    partitions: int | None = None,
+) -> int:
+    """
+    Export every anime entry into `spill_path` using `workers` concurrent
+    partition scans. Returns the number of entries exported.
+    """
+    spill_path = Path(spill_path)
+    partitions = partitions or workers * PARTITIONS_PER_WORKER
+    print(f"Fetching all anime from Convex ({workers} workers)...")
+
+    bounds = fetch_bounds()
+    if bounds is None:
+        concat_spills([], spill_path)
+        print("\n  Total fetched: 0 anime entries")
+        return 0
+
+    ranges = plan_partitions(*bounds, partitions)
+    part_paths = [
+        spill_path.with_name(f"{spill_path.name}.{i}") for i in range(len(ranges))
+    ]
+
+    total = 0
+    try:
+        with (
+            ThreadPoolExecutor(max_workers=workers) as pool,
+            tqdm(total=len(ranges), desc="Fetching partitions") as progress,
+        ):
+            futures = [
+                pool.submit(fetch_partition, after, before, part_path)
+                for (after, before), part_path in zip(ranges, part_paths)
+            ]
+            for future in as_completed(futures):
+                total += future.result()
+                progress.update(1)
+    except BaseException:
+        for part_path in part_paths:
+            part_path.unlink(missing_ok=True)
+        raise
+
+    concat_spills(part_paths, spill_path)
+    print(f"\n  Total fetched: {total} anime entries")
+    print(f"  Snapshot saved to: {spill_path}")
+    return total
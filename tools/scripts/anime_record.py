@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory anime record for the dedupe pipeline.
+
+As a dict, every catalogue entry costs a 16-key dict plus three nested dicts
+and six lists, and the same tag, studio and producer strings are repeated in
+thousands of entries. AnimeRecord keeps the same data in __slots__:
+
+- list fields are tuples; tag, studio and producer strings are interned
+- animeSeason, duration and score are tuples of their values, shared by all
+  records with the same values
+- type, status, season and duration unit strings are interned
+
+Records are read-only mappings in the Convex format (get(), items(), ...),
+so the clustering, merge and sync code accepts them and plain dicts alike.
+They become JSON only at the upload edge, through to_convex() or
+json_default as a json.dumps(default=...) hook.
+"""
+
+import sys
+from collections.abc import Mapping
+from typing import Any, Iterator
+
+NESTED_FIELDS = {
+    "animeSeason": ("season", "year"),
+    "duration": ("value", "unit"),
+    "score": ("arithmeticGeometricMean", "arithmeticMean", "median"),
+}
+LIST_FIELDS = ("sources", "synonyms", "studios", "producers", "relatedAnime", "tags")
+# Small vocabularies repeated across the whole catalogue
+INTERNED_LIST_FIELDS = {"studios", "producers", "tags"}
+
+# Convex field order, as in the upload payload
+FIELDS = (
+    "title",
+    "type",
+    "episodes",
+    "status",
+    "animeSeason",
+    "picture",
+    "thumbnail",
+    "duration",
+    "score",
+    *LIST_FIELDS,
+    "malId",
+)
+FIELD_SET = frozenset(FIELDS)
+
+# Shared nested value tuples. Keys carry the value types so that e.g. a year
+# of 2001 is never replaced by an equal 2001.0 from another record.
+_shared_nested: dict[tuple, tuple] = {}
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def shared_nested(values: tuple) -> tuple | None:
+    """The shared copy of a nested value tuple (None if all are null)."""
+    if all(item is None for item in values):
+        return None
+    key = (values, tuple(map(type, values)))
+    return _shared_nested.setdefault(key, values)
+
+
+def _pack_nested(
+    value: Mapping[str, Any] | None, keys: tuple[str, ...]
+) -> tuple | None:
+    """Nested object -> shared tuple of its values."""
+    if not value:
+        return None
+    return shared_nested(tuple(_intern(value.get(key)) for key in keys))
+
+
+class AnimeRecord(Mapping):
+    """One catalogue entry, built from a Convex-format mapping."""
+
+    __slots__ = FIELDS
+
+    def __init__(self, data: Mapping[str, Any]):
+        self.title = data.get("title")
+        self.type = _intern(data.get("type"))
+        self.episodes = data.get("episodes")
+        self.status = _intern(data.get("status"))
+        self.picture = data.get("picture")
+        self.thumbnail = data.get("thumbnail")
+        self.malId = data.get("malId")
+        for field, keys in NESTED_FIELDS.items():
+            setattr(self, field, _pack_nested(data.get(field), keys))
+        for field in LIST_FIELDS:
+            values = data.get(field) or ()
+            if field in INTERNED_LIST_FIELDS:
+                values = map(sys.intern, values)
+            setattr(self, field, tuple(values))
+
+    @classmethod
+    def from_slots(
+        cls,
+        title,
+        type,
+        episodes,
+        status,
+        animeSeason,
+        picture,
+        thumbnail,
+        duration,
+        score,
+        sources,
+        synonyms,
+        studios,
+        producers,
+        relatedAnime,
+        tags,
+        malId,
+    ) -> "AnimeRecord":
+        """
+        Build a record from slot values in FIELDS order that are already in
+        record form (list fields as tuples, nested fields as shared_nested()
+        tuples), skipping the conversion in __init__. Used by readers of
+        compact formats such as anime_columns.py.
+        """
+        record = cls.__new__(cls)
+        record.title = title
+        record.type = type
+        record.episodes = episodes
+        record.status = status
+        record.animeSeason = animeSeason
+        record.picture = picture
+        record.thumbnail = thumbnail
+        record.duration = duration
+        record.score = score
+        record.sources = sources
+        record.synonyms = synonyms
+        record.studios = studios
+        record.producers = producers
+        record.relatedAnime = relatedAnime
+        record.tags = tags
+        record.malId = malId
+        return record
+
+    def get(self, field: str, default: Any = None) -> Any:
+        """
+        Value of a Convex field, or `default` when it is null. Nested fields
+        come back as fresh dicts without null keys, list fields as tuples.
+        """
+        if field not in FIELD_SET:
+            return default
+        value = getattr(self, field)
+        if value is None:
+            return default
+        keys = NESTED_FIELDS.get(field)
+        if keys is not None:
+            return {key: item for key, item in zip(keys, value) if item is not None}
+        return value
+
+    def __getitem__(self, field: str) -> Any:
+        value = self.get(field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return (field for field in FIELDS if getattr(self, field) is not None)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"AnimeRecord({self.to_convex()!r})"
+
+    def to_convex(self) -> dict[str, Any]:
+        """JSON-ready dict in the Convex format, leaving out null fields."""
+        entry = {}
+        for field in self:
+            value = self.get(field)
+            entry[field] = list(value) if isinstance(value, tuple) else value
+        return entry
+
+
+def json_default(value: Any) -> Any:
+    """json.dumps() default hook that serializes AnimeRecords."""
+    if isinstance(value, AnimeRecord):
+        return value.to_convex()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+JSONL spill files for catalogue exports.
+
+Pages fetched from /anime/all are appended to disk as they arrive instead of
+being collected in one in-memory list, so the download itself runs in
+flat memory. Deduplication still reads the whole file back to cluster it. A
+finished export is kept so it can be reused by the next run without
+re-downloading.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+SPILL_PATH = Path("anime_export.jsonl")
+
+
+class SpillWriter:
+    """
+    Append entries to a JSONL file.
+
+    Writes go to `<path>.part`, which is renamed into place only when the
+    writer is closed without an exception, so an interrupted download never
+    leaves a truncated snapshot behind.
+    """
+
+    def __init__(self, path: Path = SPILL_PATH):
+        self.path = Path(path)
+        self.part_path = self.path.with_name(self.path.name + ".part")
+        self.count = 0
+        self._file = open(self.part_path, "w", encoding="utf-8")
+
+    def write_many(self, entries: Iterable[dict[str, Any]]):
+        for entry in entries:
+            self._file.write(json.dumps(entry))
+            self._file.write("\n")
+            self.count += 1
+
+    def close(self, commit: bool = True):
+        self._file.close()
+        if commit:
+            os.replace(self.part_path, self.path)
+        else:
+            self.part_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+
+
+def iter_spill(path: Path = SPILL_PATH) -> Iterator[dict[str, Any]]:
+    """Yield entries from a spill file one at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def count_spill(path: Path = SPILL_PATH) -> int:
+    """Count entries in a spill file without parsing them."""
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def concat_spills(parts: Iterable[Path], path: Path = SPILL_PATH):
+    """Concatenate spill files, in order, into `path` and delete the parts."""
+    path = Path(path)
+    part_path = path.with_name(path.name + ".part")
+    with open(part_path, "wb") as out:
+        for part in parts:
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out)
+    os.replace(part_path, path)
+    for part in parts:
+        Path(part).unlink()
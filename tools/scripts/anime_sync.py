@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Delta sync of the deduplicated catalogue into Convex.
+
+Instead of clearing every table and re-inserting the whole catalogue, each
+canonical entry gets a stable sync key (its MAL id, or its normalized title
+when it has none) and a hash of the fields that are uploaded. The keys and
+hashes stored remotely are fetched from /anime/hashes and only the rows that
+differ are sent: new and changed entries go to /anime/upsert, which replaces
+rows in place so their _id (and every userAnime/list reference to it) is
+kept, and rows that are no longer in the catalogue go to /anime/delete.
+A deleted row that was merged into a canonical entry is sent with that
+entry's sync key, so the server moves its user data onto the survivor
+before deleting it.
+
+Rows uploaded before sync keys existed are matched by their MAL id or title
+the first time, then carry a key from then on.
+"""
+
+import hashlib
+import json
+from typing import Any
+from tqdm import tqdm
+
+from convex_client import get_client
+from source_ids import MAL_ID_RE, extract_source_ids
+from upload_engine import DEFAULT_WORKERS, AdaptiveBatcher, post_json, upload_batches
+
+MAX_BATCH_SIZE = 1000  # upsert batches are sized by bytes, this only caps row count
+# Each deleted id moves its user data (userAnime, list items, episode logs)
+# in the same mutation; keep batches well inside Convex's per-mutation limits
+DELETE_BATCH_SIZE = 100
+HASH_PAGE_SIZE = 2000
+
+# Fields stored alongside the entry that are not part of its content
+SYNC_FIELDS = {"id", "syncKey", "contentHash"}
+
+
+def sync_key(entry: dict[str, Any]) -> str | None:
+    """
+    Stable identity of a canonical entry: MAL id, else normalized title.
+    Entries with neither are keyed by their content hash instead.
+    """
+    mal_id = entry.get("malId") or extract_source_ids(entry.get("sources", []))[0]
+    if mal_id:
+        return f"mal:{mal_id}"
+    title = (entry.get("title") or "").lower().strip()
+    return f"title:{title}" if title else None
+
+
+def _drop_none(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _drop_none(v) for k, v in value.items() if v is not None}
+    return value
+
+
+def sync_payload(entry: dict[str, Any]) -> dict[str, Any]:
+    """
+    The fields of an entry that are uploaded: no Convex system fields, no
+    sync bookkeeping, and no null values (optional validators reject null).
+    """
+    return {
+        key: _drop_none(value)
+        for key, value in entry.items()
+        if value is not None and not key.startswith("_") and key not in SYNC_FIELDS
+    }
+
+
+def content_hash(payload: dict[str, Any]) -> str:
+    """Hash of an upload payload that does not depend on key order."""
+    encoded = json.dumps(
+        payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+
+def fetch_remote_hashes() -> list[dict[str, Any]]:
+    """
+    Fetch _id, syncKey, contentHash, malId and title of every remote row
+    (plus sources for rows that have neither a sync key nor a malId).
+    """
+    client = get_client()
+    rows = []
+    cursor = None
+
+    with tqdm(desc="Fetching remote hashes", unit=" rows") as progress:
+        while True:
+            params = {"limit": HASH_PAGE_SIZE}
+            if cursor:
+                params["cursor"] = cursor
+
+            data = client.get("/anime/hashes", params)
+            if not data.get("success"):
+                raise Exception(data.get("error", "Unknown error"))
+
+            page = data.get("page", [])
+            rows.extend(page)
+            progress.update(len(page))
+
+            cursor = data.get("continueCursor")
+            if data.get("isDone") or not cursor:
+                break
+
+    return rows
+
+
+class MergeTargets:
+    """
+    Finds the canonical entry a removed remote row was merged into, by the
+    MAL ids and source URLs the canonical entries absorbed, then by title.
+    """
+
+    def __init__(self):
+        self.by_mal_id: dict[str, str] = {}
+        self.by_source: dict[str, str] = {}
+        self.by_title: dict[str, str] = {}
+
+    def add(self, key: str, entry: dict[str, Any]):
+        for source in entry.get("sources") or []:
+            self.by_source.setdefault(source, key)
+            match = MAL_ID_RE.search(source)
+            if match:
+                self.by_mal_id.setdefault(match[1], key)
+        if entry.get("malId"):
+            self.by_mal_id.setdefault(entry["malId"], key)
+        for title in [entry.get("title"), *(entry.get("synonyms") or [])]:
+            if title:
+                self.by_title.setdefault(title.lower().strip(), key)
+
+    def find(self, key: str | None, row: dict[str, Any]) -> str | None:
+        """Sync key of the entry that absorbed `row` (remote key `key`)."""
+        kind, _, value = (key or "").partition(":")
+        value = value.split("#")[0]
+        mal_id = value if kind == "mal" else row.get("malId")
+        if mal_id and mal_id in self.by_mal_id:
+            return self.by_mal_id[mal_id]
+        for source in row.get("sources") or []:
+            if source in self.by_source:
+                return self.by_source[source]
+        title = value if kind == "title" else (row.get("title") or "").lower().strip()
+        return self.by_title.get(title)
+
+
+def plan_sync(
+    entries: list[dict[str, Any]], remote_rows: list[dict[str, Any]]
+) -> tuple[list[dict[str, Any]], list[tuple[str, str | None]], int]:
+    """
+    Compare canonical entries with the remote rows.
+
+    Returns (upserts, deletes, unchanged). Each upsert is the upload
+    payload plus syncKey, contentHash and, when it replaces an existing row,
+    that row's id. Remote rows whose key is no longer in the catalogue, and
+    extra rows sharing a key, are deleted: each delete is (row id, sync key
+    of the entry it was merged into, or None).
+    """
+    remote_by_key: dict[str, dict[str, Any]] = {}
+    removed = []
+    for row in remote_rows:
+        key = row.get("syncKey") or sync_key(row)
+        if key is None or key in remote_by_key:
+            removed.append((key, row))
+        else:
+            remote_by_key[key] = row
+
+    planned = []
+    by_key: dict[str, list[int]] = {}
+    for entry in entries:
+        payload = sync_payload(entry)
+        digest = content_hash(payload)
+        key = sync_key(entry) or f"hash:{digest}"
+        by_key.setdefault(key, []).append(len(planned))
+        planned.append([key, entry, payload, digest])
+
+    # Entries that normalize to the same key still need distinct rows. The
+    # suffix comes from their content (first source URL, else content hash),
+    # not their position, so a reordered export keeps every key in place.
+    for key, indices in by_key.items():
+        if len(indices) == 1:
+            continue
+        first_source = {i: min(planned[i][1].get("sources") or [""]) for i in indices}
+        indices.sort(key=lambda i: (first_source[i], planned[i][3]))
+        used = {key}
+        for i in indices[1:]:
+            suffixed = f"{key}#{first_source[i] or planned[i][3]}"
+            if suffixed in used:
+                suffixed = f"{key}#{planned[i][3]}"
+            used.add(suffixed)
+            planned[i][0] = suffixed
+
+    upserts = []
+    unchanged = 0
+    catalogue_keys = set()
+    targets = MergeTargets()
+    for key, entry, payload, digest in planned:
+        catalogue_keys.add(key)
+        targets.add(key, entry)
+        remote = remote_by_key.pop(key, None)
+
+        if remote is not None and remote.get("contentHash") == digest:
+            unchanged += 1
+            continue
+
+        upsert = {**payload, "syncKey": key, "contentHash": digest}
+        if remote is not None:
+            upsert["id"] = remote["_id"]
+        upserts.append(upsert)
+
+    removed.extend(remote_by_key.items())
+    deletes = []
+    for key, row in removed:
+        # A duplicate of a catalogue key merges into the row that keeps it
+        target = key if key in catalogue_keys else targets.find(key, row)
+        deletes.append((row["_id"], target))
+    return upserts, deletes, unchanged
+
+
+def delete_rows(deletes: list[tuple[str, str | None]]) -> tuple[int, int, int]:
+    """
+    Delete remote rows, moving user data onto their merge targets. Returns
+    (deleted, merged, failed); rows whose target is missing remotely (its
+    upsert failed) are kept and counted as failed.
+    """
+    client = get_client()
+    deleted = 0
+    merged = 0
+    failed = 0
+
+    for start in tqdm(
+        range(0, len(deletes), DELETE_BATCH_SIZE), desc="Deleting batches"
+    ):
+        batch = deletes[start : start + DELETE_BATCH_SIZE]
+        payload = {
+            "ids": [doc_id for doc_id, _ in batch],
+            "mergeInto": [target for _, target in batch],
+        }
+        try:
+            result = post_json(client, "/anime/delete", payload)
+        except Exception as e:
+            failed += len(batch)
+            print(f"\n  Delete batch failed: {e}")
+            continue
+        deleted += result.get("deleted", 0)
+        merged += result.get("merged", 0)
+        failed += result.get("missingTargets", 0)
+
+    return deleted, merged, failed
+
+
+def sync_anime(
+    entries: list[dict[str, Any]],
+    workers: int = DEFAULT_WORKERS,
+    compress: bool = False,
+) -> dict[str, int]:
+    """
+    Bring the remote anime table in line with `entries`, sending only the
+    rows that changed. Returns counts for the report.
+    """
+    print("\nComputing delta against remote hashes...")
+    remote_rows = fetch_remote_hashes()
+    upserts, deletes, unchanged = plan_sync(entries, remote_rows)
+
+    print(f"\n  Remote rows: {len(remote_rows)}")
+    print(f"  Unchanged: {unchanged}")
+    print(f"  To insert: {sum(1 for u in upserts if 'id' not in u)}")
+    print(f"  To update: {sum(1 for u in upserts if 'id' in u)}")
+    print(f"  To delete: {len(deletes)}")
+    print(f"  (merged into a kept row: {sum(1 for _, t in deletes if t)})")
+
+    stats = {
+        "unchanged": unchanged,
+        "upserted": 0,
+        "deleted": 0,
+        "merged": 0,
+        "failed": 0,
+    }
+
+    if upserts:
+        batcher = AdaptiveBatcher(max_entries=MAX_BATCH_SIZE)
+        upserted, failed = upload_batches(
+            "/anime/upsert",
+            batcher.batches(upserts),
+            workers=workers,
+            desc="Upserting batches",
+            batcher=batcher,
+            compress=compress,
+        )
+        stats["upserted"] = upserted
+        stats["failed"] += failed
+
+    if deletes:
+        deleted, merged, failed = delete_rows(deletes)
+        stats["deleted"] = deleted
+        stats["merged"] = merged
+        stats["failed"] += failed
+
+    return stats
+
+
+def print_sync_report(stats: dict[str, int]):
+    print("\n" + "=" * 60)
+    print("SYNC COMPLETE")
+    print("=" * 60)
+    print(f"  Unchanged: {stats['unchanged']}")
+    print(f"  Inserted/updated: {stats['upserted']}")
+    print(f"  Deleted: {stats['deleted']} ({stats['merged']} merged into a kept row)")
+    print(f"  Failed: {stats['failed']}")
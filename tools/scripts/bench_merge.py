@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for merge_anime_entries() on large clusters.
+
+Compares the original merge (copy every list, extend from each entry, then
+round-trip through set()) with the single-pass merge in dedupe_core.py on
+synthetic clusters, and checks that both produce the same values.
+
+Usage:
+    python bench_merge.py --clusters 200 --cluster-size 50 --list-size 40
+"""
+
+import argparse
+import copy
+import random
+import time
+from typing import Any
+
+from dedupe_core import LIST_FIELDS, merge_anime_entries
+from source_ids import source_priority
+
+
+def legacy_merge_anime_entries(entries: list[dict[str, Any]]) -> dict[str, Any]:
+    """The merge as it was before dedupe_core.py (kept for comparison)."""
+    sorted_entries = sorted(
+        entries, key=lambda e: source_priority(e.get("sources", [])), reverse=True
+    )
+
+    canonical = sorted_entries[0]
+
+    merged = {
+        "title": canonical.get("title"),
+        "type": canonical.get("type"),
+        "episodes": canonical.get("episodes"),
+        "status": canonical.get("status"),
+        "animeSeason": canonical.get("animeSeason") or {},
+        "picture": canonical.get("picture"),
+        "thumbnail": canonical.get("thumbnail"),
+        "duration": canonical.get("duration") or {},
+        "score": canonical.get("score") or {},
+        "sources": list(canonical.get("sources", [])),
+        "synonyms": list(canonical.get("synonyms", [])),
+        "studios": list(canonical.get("studios", [])),
+        "producers": list(canonical.get("producers", [])),
+        "relatedAnime": list(canonical.get("relatedAnime", [])),
+        "tags": list(canonical.get("tags", [])),
+    }
+
+    for entry in sorted_entries[1:]:
+        if not merged["episodes"] and entry.get("episodes"):
+            merged["episodes"] = entry["episodes"]
+        if not merged["picture"] and entry.get("picture"):
+            merged["picture"] = entry["picture"]
+        if not merged["thumbnail"] and entry.get("thumbnail"):
+            merged["thumbnail"] = entry["thumbnail"]
+        if not merged["duration"] and entry.get("duration"):
+            merged["duration"] = entry["duration"]
+        if not merged["animeSeason"] and entry.get("animeSeason"):
+            merged["animeSeason"] = entry["animeSeason"]
+        elif entry.get("animeSeason"):
+            if not merged["animeSeason"].get("season") and entry["animeSeason"].get(
+                "season"
+            ):
+                merged["animeSeason"]["season"] = entry["animeSeason"]["season"]
+            if not merged["animeSeason"].get("year") and entry["animeSeason"].get(
+                "year"
+            ):
+                merged["animeSeason"]["year"] = entry["animeSeason"]["year"]
+
+        if entry.get("score"):
+            if not merged["score"].get("arithmeticMean") and entry["score"].get(
+                "arithmeticMean"
+            ):
+                merged["score"]["arithmeticMean"] = entry["score"]["arithmeticMean"]
+            if not merged["score"].get("arithmeticGeometricMean") and entry[
+                "score"
+            ].get("arithmeticGeometricMean"):
+                merged["score"]["arithmeticGeometricMean"] = entry["score"][
+                    "arithmeticGeometricMean"
+                ]
+            if not merged["score"].get("median") and entry["score"].get("median"):
+                merged["score"]["median"] = entry["score"]["median"]
+
+        merged["sources"].extend(entry.get("sources", []))
+        merged["synonyms"].extend(entry.get("synonyms", []))
+        merged["studios"].extend(entry.get("studios", []))
+        merged["producers"].extend(entry.get("producers", []))
+        merged["relatedAnime"].extend(entry.get("relatedAnime", []))
+        merged["tags"].extend(entry.get("tags", []))
+
+    merged["sources"] = list(set(merged["sources"]))
+    merged["synonyms"] = list(set(merged["synonyms"]))
+    merged["studios"] = list(set(merged["studios"]))
+    merged["producers"] = list(set(merged["producers"]))
+    merged["relatedAnime"] = list(set(merged["relatedAnime"]))
+    merged["tags"] = list(set(merged["tags"]))
+
+    if not merged["animeSeason"]:
+        merged["animeSeason"] = None
+    if not merged["duration"]:
+        merged["duration"] = None
+    if not merged["score"]:
+        merged["score"] = None
+
+    return merged
+
+
+def make_cluster(rng: random.Random, size: int, list_size: int) -> list[dict]:
+    """Entries of one show as several sources would describe it."""
+    hosts = [
+        "myanimelist.net/anime",
+        "anidb.net/anime",
+        "anilist.co/anime",
+        "kitsu.app/anime",
+    ]
+    show = rng.randrange(1_000_000)
+    cluster = []
+    for i in range(size):
+        cluster.append(
+            {
+                "title": f"Show {show} ({i})",
+                "type": "TV",
+                "status": "FINISHED",
+                "episodes": rng.choice([None, 0, 12, 24]),
+                "picture": rng.choice([None, f"https://img/{show}.jpg"]),
+                "thumbnail": None,
+                "animeSeason": rng.choice(
+                    [
+                        None,
+                        {"season": "FALL"},
+                        {"year": 2001},
+                        {"season": None, "year": 2001},
+                    ]
+                ),
+                "duration": rng.choice([None, {"value": 1440, "unit": "SECONDS"}]),
+                "score": rng.choice([None, {"arithmeticMean": 7.5}, {"median": 7.0}]),
+                "sources": [f"https://{rng.choice(hosts)}/{show + i}"],
+                # Sources overlap in most of their values; lists themselves
+                # hold no repeats, like the offline database's
+                **{
+                    field: [
+                        f"{field}-{n}"
+                        for n in rng.sample(range(list_size * 2), list_size)
+                    ]
+                    for field in LIST_FIELDS
+                    if field != "sources"
+                },
+            }
+        )
+    return cluster
+
+
+def same_values(old: dict[str, Any], new: dict[str, Any]) -> bool:
+    """Compare merges ignoring list order and keys whose value is None."""
+    for field in set(old) | set(new):
+        a, b = old.get(field), new.get(field)
+        if field in LIST_FIELDS:
+            a, b = sorted(a), sorted(b)
+        elif isinstance(a, dict) or isinstance(b, dict):
+            a = {k: v for k, v in (a or {}).items() if v is not None} or None
+            b = {k: v for k, v in (b or {}).items() if v is not None} or None
+        if a != b and field != "malId":
+            return False
+    return True
+
+
+def bench(merge, clusters: list[list[dict]], repeat: int) -> float:
+    """Best-of-`repeat` seconds per cluster. Each run merges fresh copies."""
+    best = float("inf")
+    for _ in range(repeat):
+        inputs = copy.deepcopy(clusters)
+        started = time.perf_counter()
+        for cluster in inputs:
+            merge(cluster)
+        best = min(best, time.perf_counter() - started)
+    return best / len(clusters)
+
+
+def main(clusters: int, cluster_size: int, list_size: int, repeat: int, seed: int):
+    rng = random.Random(seed)
+    data = [make_cluster(rng, cluster_size, list_size) for _ in range(clusters)]
+
+    pristine = copy.deepcopy(data)
+    for cluster in data:
+        merge_anime_entries(cluster)
+    aliasing_ok = data == pristine
+
+    equal = all(
+        same_values(
+            legacy_merge_anime_entries(copy.deepcopy(cluster)),
+            merge_anime_entries(cluster),
+        )
+        for cluster in data
+    )
+
+    before = bench(legacy_merge_anime_entries, data, repeat)
+    after = bench(merge_anime_entries, data, repeat)
+
+    print(f"{clusters} clusters x {cluster_size} entries, {list_size} values per list")
+    print(f"  before: {before * 1e6:9.1f} us/cluster")
+    print(f"  after:  {after * 1e6:9.1f} us/cluster ({before / after:.2f}x)")
+    print(f"  same merged values: {equal}")
+    print(f"  inputs left unmodified: {aliasing_ok}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--cluster-size", type=int, default=50)
+    parser.add_argument("--list-size", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    main(
+        clusters=args.clusters,
+        cluster_size=args.cluster_size,
+        list_size=args.list_size,
+        repeat=args.repeat,
+        seed=args.seed,
+    )
@@ -1,30 +1,16 @@
 #!/usr/bin/env python3
 """Clear all anime data from Convex in batches."""
 
-import json
-import urllib.request
-import urllib.error
+import argparse
 import time
 
-CONVEX_URL = "https://pastel-condor-398.convex.site"
+from convex_client import CONVEX_URL, get_client, set_base_url
 
 
 def clear_batch():
     """Clear one batch of data."""
-    url = f"{CONVEX_URL}/anime/clear"
-
     try:
-        req = urllib.request.Request(
-            url,
-            data=json.dumps({"batch": 1000}).encode("utf-8"),
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=120) as response:
-            return json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8")
-        return {"success": False, "error": f"HTTP {e.code}: {error_body}"}
+        return get_client().post("/anime/clear", {"batch": 1000}, timeout=120)
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -79,4 +65,13 @@ def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--base-url",
+        default=CONVEX_URL,
+        help=f"Convex HTTP actions URL (default: $CONVEX_SITE_URL or {CONVEX_URL})",
+    )
+    args = parser.parse_args()
+    set_base_url(args.base_url)
+
     main()
@@ -1,34 +1,29 @@
 #!/usr/bin/env python3
 """Clear auth sessions and refresh tokens from Convex."""
 
-import json
-import urllib.request
-import urllib.error
+import argparse
 
-CONVEX_URL = "https://pastel-condor-398.convex.site"
+from convex_client import CONVEX_URL, get_client, set_base_url
 
 
 def clear_auth():
     """Clear auth sessions via HTTP action."""
-    url = f"{CONVEX_URL}/api/auth/clear-sessions"
-
     try:
-        req = urllib.request.Request(
-            url,
-            data=json.dumps({}).encode("utf-8"),
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=30) as response:
-            return json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8")
-        return {"success": False, "error": f"HTTP {e.code}: {error_body}"}
+        return get_client().post("/api/auth/clear-sessions", {})
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--base-url",
+        default=CONVEX_URL,
+        help=f"Convex HTTP actions URL (default: $CONVEX_SITE_URL or {CONVEX_URL})",
+    )
+    args = parser.parse_args()
+    set_base_url(args.base_url)
+
     print("Clearing auth sessions...")
     result = clear_auth()
     print(result)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Small HTTP client for the Convex HTTP actions used by the scripts.
+
+Keeps a pool of keep-alive connections to CONVEX_URL so consecutive fetch,
+clear and insert requests reuse the same TCP/TLS session instead of doing a
+fresh handshake per batch. Safe to share between threads.
+
+The deployment defaults to production; set CONVEX_SITE_URL or pass
+--base-url to a script (e.g. http://127.0.0.1:8787 for convex_standin.py)
+to point it elsewhere.
+"""
+
+import gzip
+import http.client
+import json
+import os
+import queue
+import threading
+from typing import Any
+from urllib.parse import urlencode, urlsplit
+
+# Convex deployment URL (the .convex.site host that serves HTTP actions)
+CONVEX_URL = os.environ.get("CONVEX_SITE_URL", "https://pastel-condor-398.convex.site")
+
+DEFAULT_TIMEOUT = 120
+ENDPOINT_TIMEOUTS = {
+    "/anime/all": 300,
+    "/anime/bounds": 30,
+    "/anime/clear": 300,
+    "/anime/bulk-insert": 120,
+    "/import": 120,
+    "/api/auth/clear-sessions": 30,
+}
+POOL_SIZE = 8
+GZIP_LEVEL = 6
+
+# Errors that mean a pooled keep-alive connection was closed by the server
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class ConvexHTTPError(Exception):
+    """Non-2xx response from a Convex HTTP action."""
+
+    def __init__(self, status: int, body: str, headers=None):
+        super().__init__(f"HTTP {status}: {body}")
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+
+class ResponseLostError(ConnectionError):
+    """
+    The request was sent but no response arrived (timeout or dropped
+    connection), so the server may or may not have applied it.
+    """
+
+
+class ConvexClient:
+    """Pooled keep-alive JSON client for one Convex deployment."""
+
+    def __init__(
+        self,
+        base_url: str = CONVEX_URL,
+        pool_size: int = POOL_SIZE,
+        timeouts: dict[str, float] | None = None,
+    ):
+        parts = urlsplit(base_url)
+        self.base_url = base_url.rstrip("/")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.timeouts = {**ENDPOINT_TIMEOUTS, **(timeouts or {})}
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused)."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn: http.client.HTTPConnection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        payload: Any = None,
+        params: dict | None = None,
+        timeout: float | None = None,
+        headers: dict[str, str] | None = None,
+        body: bytes | None = None,
+        compress: bool = False,
+        idempotent: bool = True,
+    ) -> dict:
+        """
+        Send a request and return the decoded JSON response.
+
+        Either `payload` (JSON-encoded here) or a pre-encoded `body` may be
+        given. With compress=True the body is sent gzip-encoded; only the
+        /import and /anime/bulk-insert actions decode it. Raises
+        ConvexHTTPError for non-2xx responses, and ResponseLostError when the
+        connection fails after the request went out. A reused connection the
+        server closed without answering is retried on a fresh one only when
+        the request is idempotent; the server may have read the body first.
+        """
+        if timeout is None:
+            timeout = self.timeouts.get(path, DEFAULT_TIMEOUT)
+
+        url = self.prefix + path
+        if params:
+            url = f"{url}?{urlencode(params)}"
+
+        request_headers = {"Connection": "keep-alive", **(headers or {})}
+        if body is None and payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+        if body is not None:
+            request_headers.setdefault("Content-Type", "application/json")
+            if compress:
+                body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+                request_headers["Content-Encoding"] = "gzip"
+
+        while True:
+            conn, reused = self._acquire(timeout)
+            try:
+                conn.request(method, url, body=body, headers=request_headers)
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            try:
+                response = conn.getresponse()
+                data = response.read()
+            except http.client.RemoteDisconnected:
+                conn.close()
+                if reused and idempotent:
+                    # The server dropped an idle connection without answering;
+                    # retry on a fresh one
+                    continue
+                raise ResponseLostError(
+                    "Server closed the connection without a response"
+                )
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise ResponseLostError(str(e) or type(e).__name__) from e
+            except BaseException:
+                conn.close()
+                raise
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+        text = data.decode("utf-8")
+        if response.status >= 400:
+            raise ConvexHTTPError(response.status, text, dict(response.getheaders()))
+        return json.loads(text)
+
+    def get(self, path: str, params: dict | None = None, **kwargs) -> dict:
+        return self.request("GET", path, params=params, **kwargs)
+
+    def post(self, path: str, payload: Any, **kwargs) -> dict:
+        return self.request("POST", path, payload=payload, **kwargs)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_shared_client: ConvexClient | None = None
+_shared_base_url = CONVEX_URL
+_shared_lock = threading.Lock()
+
+
+def set_base_url(base_url: str):
+    """Point the process-wide client at another deployment."""
+    global _shared_client, _shared_base_url
+    with _shared_lock:
+        if _shared_client is not None:
+            _shared_client.close()
+            _shared_client = None
+        _shared_base_url = base_url
+
+
+def get_client() -> ConvexClient:
+    """Return the process-wide client (CONVEX_URL unless set_base_url())."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = ConvexClient(_shared_base_url)
+        return _shared_client
@@ -0,0 +1,888 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Convex HTTP actions, for offline benchmarks and tests.
+
+Serves the routes of convex/http.ts that the scripts call (/import,
+/anime/all, /anime/bounds, /anime/clear, /anime/bulk-insert, /anime/hashes,
+/anime/upsert, /anime/delete, /userAnime/import-mal and
+/api/auth/clear-sessions) from in-memory anime and userAnime tables, with
+the response shapes of convex/httpActions.ts. Request bodies are checked
+against the same argument validators as the mutations (optional fields
+reject null, extra fields are refused), so a payload the stand-in accepts
+is one production accepts.
+
+Latency, injected failures and the page size are configurable, which makes
+throughput and back-off changes measurable without touching production:
+
+    python convex_standin.py --port 8787 --latency 0.05 --error-rate 0.02
+    python upload_anime.py --base-url http://127.0.0.1:8787
+
+With --import-secret, /userAnime/import-mal answers 401 unless the request
+carries `Authorization: Bearer <secret>`, like MAL_IMPORT_SECRET in
+production.
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import random
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlsplit
+
+from anime_spill import iter_spill
+
+DEFAULT_PORT = 8787
+CLEAR_BATCH = 1000  # clearAllAnime batch used by the /anime/clear action
+ALL_PAGE_SIZE = 500  # getAllAnime default numItems
+# Routes that check `Authorization: Bearer <import secret>`
+SECRET_ROUTES = {"/userAnime/import-mal"}
+HASHES_PAGE_SIZE = 2000  # getSyncHashes default numItems
+
+# Argument validators of convex/anime.ts: field -> (spec, required). A spec
+# is a Python type, a {key: type} object of optional keys or a [type] array.
+NUMBER = (int, float)
+ANIME_FIELDS = {
+    "title": (str, True),
+    "type": (str, True),
+    "episodes": (NUMBER, False),
+    "status": (str, True),
+    "animeSeason": ({"season": str, "year": NUMBER}, False),
+    "picture": (str, False),
+    "thumbnail": (str, False),
+    "duration": ({"value": NUMBER, "unit": str}, False),
+    "score": (
+        {"arithmeticGeometricMean": NUMBER, "arithmeticMean": NUMBER, "median": NUMBER},
+        False,
+    ),
+    "sources": ([str], True),
+    "synonyms": ([str], True),
+    "studios": ([str], True),
+    "producers": ([str], True),
+    "relatedAnime": ([str], True),
+    "tags": ([str], True),
+}
+BULK_INSERT_FIELDS = {**ANIME_FIELDS, "malId": (str, False)}
+UPSERT_FIELDS = {
+    **BULK_INSERT_FIELDS,
+    "id": (str, False),
+    "syncKey": (str, True),
+    "contentHash": (str, True),
+}
+# Items of convex/userAnime.ts importMalBatch
+IMPORT_ITEM_FIELDS = {
+    "malId": (str, True),
+    "isWatched": (bool, True),
+    "isFavorite": (bool, True),
+}
+
+
+class ValidationError(Exception):
+    """Arguments that the Convex validator would reject."""
+
+
+def _check_value(value: Any, spec: Any, path: str):
+    if isinstance(spec, dict):
+        if not isinstance(value, dict):
+            raise ValidationError(f"Value at {path} is not an object")
+        for key, item in value.items():
+            if key not in spec:
+                raise ValidationError(f"Object at {path} contains extra field `{key}`")
+            _check_value(item, spec[key], f"{path}.{key}")
+    elif isinstance(spec, list):
+        if not isinstance(value, list):
+            raise ValidationError(f"Value at {path} is not an array")
+        for i, item in enumerate(value):
+            _check_value(item, spec[0], f"{path}[{i}]")
+    elif spec is bool:
+        if not isinstance(value, bool):
+            raise ValidationError(f"Value {value!r} at {path} does not match validator")
+    elif isinstance(value, bool) or not isinstance(value, spec):
+        raise ValidationError(f"Value {value!r} at {path} does not match validator")
+
+
+def check_object(value: Any, fields: dict[str, tuple], path: str):
+    """Raise ValidationError unless `value` matches a v.object() of `fields`."""
+    if not isinstance(value, dict):
+        raise ValidationError(f"Value at {path} is not an object")
+    for key in value:
+        if key not in fields:
+            raise ValidationError(f"Object at {path} contains extra field `{key}`")
+    for key, (spec, required) in fields.items():
+        if key in value:
+            _check_value(value[key], spec, f"{path}.{key}")
+        elif required:
+            raise ValidationError(
+                f"Object at {path} is missing the required field `{key}`"
+            )
+
+
+class AnimeTable:
+    """
+    In-memory anime table with Convex-style ids, _creationTime and cursor
+    pagination in creation order. Safe to share between handler threads.
+    """
+
+    def __init__(self):
+        self.docs: dict[str, dict[str, Any]] = {}
+        self.by_sync_key: dict[str, str] = {}
+        # Creation order; deleted ids stay here until the next compaction
+        self._times: list[float] = []
+        self._ids: list[str] = []
+        self._next_id = 0
+        self._last_time = 0.0
+        self._lock = threading.Lock()
+
+    def _insert(self, fields: dict[str, Any]) -> str:
+        self._next_id += 1
+        doc_id = f"j{self._next_id:031x}"
+        self._last_time = max(time.time() * 1000, self._last_time + 0.001)
+        self.docs[doc_id] = {"_id": doc_id, "_creationTime": self._last_time, **fields}
+        self._times.append(self._last_time)
+        self._ids.append(doc_id)
+        if "syncKey" in fields:
+            self.by_sync_key[fields["syncKey"]] = doc_id
+        return doc_id
+
+    def _delete(self, doc_id: str) -> bool:
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        if self.by_sync_key.get(doc.get("syncKey")) == doc_id:
+            del self.by_sync_key[doc["syncKey"]]
+        return True
+
+    def _compact(self):
+        if len(self._ids) > 2 * len(self.docs) + 1024:
+            live = [(t, i) for t, i in zip(self._times, self._ids) if i in self.docs]
+            self._times = [t for t, _ in live]
+            self._ids = [i for _, i in live]
+
+    def insert_many(self, entries: list[dict[str, Any]]) -> list[str]:
+        with self._lock:
+            return [self._insert(entry) for entry in entries]
+
+    def upsert(self, doc_id: str | None, fields: dict[str, Any]) -> bool:
+        """Replace the row matched by id or syncKey, else insert. True if replaced."""
+        with self._lock:
+            if doc_id is None:
+                doc_id = self.by_sync_key.get(fields["syncKey"])
+            existing = self.docs.get(doc_id) if doc_id else None
+            if existing is None:
+                self._insert(fields)
+                return False
+            if self.by_sync_key.get(existing.get("syncKey")) == doc_id:
+                del self.by_sync_key[existing["syncKey"]]
+            # Assigning to the existing key keeps the row's creation order
+            self.docs[doc_id] = {
+                "_id": doc_id,
+                "_creationTime": existing["_creationTime"],
+                **fields,
+            }
+            self.by_sync_key[fields["syncKey"]] = doc_id
+            return True
+
+    def merge_target(self, doc_id: str, sync_key: str) -> str | None:
+        """Id of a row other than `doc_id` that has `sync_key`, if any."""
+        with self._lock:
+            found = self.by_sync_key.get(sync_key)
+            if found is not None and found != doc_id:
+                return found
+            for other_id, doc in self.docs.items():
+                if other_id != doc_id and doc.get("syncKey") == sync_key:
+                    return other_id
+            return None
+
+    def delete_many(self, ids: list[str]) -> int:
+        with self._lock:
+            deleted = sum(self._delete(doc_id) for doc_id in ids)
+            self._compact()
+            return deleted
+
+    def clear(self, batch: int) -> int:
+        """Delete the `batch` oldest rows; return how many were deleted."""
+        with self._lock:
+            doomed = [doc_id for doc_id, _ in zip(self.docs, range(batch))]
+            for doc_id in doomed:
+                self._delete(doc_id)
+            self._compact()
+            return len(doomed)
+
+    def find_by_mal_id(self, mal_ids: set[str]) -> dict[str, str]:
+        """
+        malId -> _id of the oldest row with it, like .withIndex("by_malId")
+        .first(). A scan rather than an index: imports are rare here.
+        """
+        found: dict[str, str] = {}
+        with self._lock:
+            for doc_id, doc in self.docs.items():
+                mal_id = doc.get("malId")
+                if mal_id in mal_ids and mal_id not in found:
+                    found[mal_id] = doc_id
+        return found
+
+    def bounds(self) -> tuple[float | None, float | None]:
+        with self._lock:
+            if not self.docs:
+                return None, None
+            first = next(iter(self.docs.values()))
+            last = next(reversed(self.docs.values()))
+            return first["_creationTime"], last["_creationTime"]
+
+    def paginate(
+        self,
+        cursor: str | None,
+        num_items: int,
+        after: float | None = None,
+        before: float | None = None,
+    ) -> dict[str, Any]:
+        """
+        One page in _creationTime order within [after, before), in the shape
+        of Convex's PaginationResult. The cursor is the _creationTime of the
+        last row returned.
+        """
+        with self._lock:
+            if cursor:
+                start = bisect.bisect_right(self._times, float(cursor))
+            elif after is not None:
+                start = bisect.bisect_left(self._times, after)
+            else:
+                start = 0
+            end = len(self._times)
+            if before is not None:
+                end = bisect.bisect_left(self._times, before)
+
+            page = []
+            position = start
+            while position < end and len(page) < num_items:
+                doc = self.docs.get(self._ids[position])
+                if doc is not None:
+                    page.append(dict(doc))
+                position += 1
+
+            while position < end and self._ids[position] not in self.docs:
+                position += 1
+            is_done = position >= end
+            if page:
+                cursor = repr(page[-1]["_creationTime"])
+            return {"page": page, "continueCursor": cursor or "", "isDone": is_done}
+
+
+class UserAnimeTable:
+    """In-memory userAnime rows and import results, keyed like their indexes."""
+
+    def __init__(self):
+        self.rows: dict[tuple[str, str], dict[str, Any]] = {}
+        self.imports: dict[tuple[str, str], dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def import_mal_batch(
+        self, anime: AnimeTable, user_id: str, key: str, items: list[dict]
+    ) -> dict[str, Any]:
+        """Same resolution, merge and replay rules as importMalBatch."""
+        with self._lock:
+            previous = self.imports.get((user_id, key))
+            if previous is not None:
+                return {**previous, "replayed": True}
+
+            mal_ids = list(dict.fromkeys(item["malId"] for item in items))
+            anime_ids = anime.find_by_mal_id(set(mal_ids))
+            wanted: dict[str, dict[str, bool]] = {}
+            for item in items:
+                anime_id = anime_ids.get(item["malId"])
+                if anime_id is None:
+                    continue
+                flags = wanted.setdefault(
+                    anime_id, {"isWatched": False, "isFavorite": False}
+                )
+                flags["isWatched"] |= item["isWatched"]
+                flags["isFavorite"] |= item["isFavorite"]
+
+            now = time.time() * 1000
+            inserted = updated = skipped = 0
+            for anime_id, flags in wanted.items():
+                existing = self.rows.get((user_id, anime_id))
+                if existing is None:
+                    self.rows[(user_id, anime_id)] = {
+                        "userId": user_id,
+                        "animeId": anime_id,
+                        **flags,
+                        **({"watchedAt": now} if flags["isWatched"] else {}),
+                        "updatedAt": now,
+                    }
+                    inserted += 1
+                    continue
+                patch: dict[str, Any] = {}
+                if flags["isWatched"] and not existing["isWatched"]:
+                    patch.update(isWatched=True, watchedAt=now)
+                if flags["isFavorite"] and not existing["isFavorite"]:
+                    patch["isFavorite"] = True
+                if not patch:
+                    skipped += 1
+                    continue
+                existing.update(patch, updatedAt=now)
+                updated += 1
+
+            result = {
+                "imported": inserted + updated,
+                "inserted": inserted,
+                "updated": updated,
+                "skipped": skipped,
+                "notFound": [mal_id for mal_id in mal_ids if mal_id not in anime_ids],
+                "failed": 0,
+                "total": len(items),
+            }
+            self.imports[(user_id, key)] = result
+            return {**result, "replayed": False}
+
+    def clear(self, batch: int) -> tuple[int, int]:
+        """
+        Delete the `batch` oldest userAnime rows and import results, like
+        clearAllAnime; return how many of each were deleted.
+        """
+        with self._lock:
+            cleared = []
+            for table in (self.rows, self.imports):
+                doomed = [key for key, _ in zip(table, range(batch))]
+                for key in doomed:
+                    del table[key]
+                cleared.append(len(doomed))
+            return cleared[0], cleared[1]
+
+    def move_anime(self, from_id: str, to_id: str | None):
+        """moveAnimeReferences() for userAnime rows: merge flags or drop."""
+        with self._lock:
+            for user_id, anime_id in [k for k in self.rows if k[1] == from_id]:
+                row = self.rows.pop((user_id, anime_id))
+                if to_id is None:
+                    continue
+                existing = self.rows.get((user_id, to_id))
+                if existing is None:
+                    self.rows[(user_id, to_id)] = {**row, "animeId": to_id}
+                    continue
+                existing["isWatched"] |= row["isWatched"]
+                existing["isFavorite"] |= row["isFavorite"]
+                watched = [r["watchedAt"] for r in (existing, row) if "watchedAt" in r]
+                if watched:
+                    existing["watchedAt"] = min(watched)
+
+
+class StandinServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer holding the table, fault settings and counters."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        table: AnimeTable | None = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        item_latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_statuses: tuple[int, ...] = (503,),
+        retry_after: float | None = None,
+        page_size: int | None = None,
+        seed: int | None = None,
+        verbose: bool = False,
+        import_secret: str | None = None,
+    ):
+        super().__init__(address, StandinHandler)
+        self.table = table or AnimeTable()
+        self.user_anime = UserAnimeTable()
+        self.latency = latency
+        self.jitter = jitter
+        self.item_latency = item_latency
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.verbose = verbose
+        self.import_secret = import_secret
+        self.rng = random.Random(seed)
+        self.requests: Counter = Counter()
+        self.injected: Counter = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page_limit(self, requested: int | None, default: int) -> int:
+        """Items per page: the requested limit, capped by --page-size."""
+        limit = requested or default
+        return min(limit, self.page_size) if self.page_size else limit
+
+    def draw_fault(self, path: str) -> int | None:
+        """Status of an injected failure for this request, or None."""
+        with self._stats_lock:
+            self.requests[path] += 1
+            if self.error_rate and self.rng.random() < self.error_rate:
+                status = self.rng.choice(self.error_statuses)
+                self.injected[status] += 1
+                return status
+            return None
+
+    def delay(self, items: int = 0) -> float:
+        with self._stats_lock:
+            extra = self.rng.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + extra + self.item_latency * items
+
+
+def _json_body(request: BaseHTTPRequestHandler) -> Any:
+    """Read the request body, gunzipping it like readJsonBody() does."""
+    length = int(request.headers.get("Content-Length") or 0)
+    body = request.rfile.read(length)
+    if request.headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+def _int_param(params: dict[str, str], name: str) -> int | None:
+    value = params.get(name)
+    return int(value) if value else None
+
+
+def _float_param(params: dict[str, str], name: str) -> float | None:
+    value = params.get(name)
+    return float(value) if value else None
+
+
+def bulk_import(server: StandinServer, data: Any) -> tuple[int, dict[str, Any]]:
+    animes = data.get("animes")
+    if not isinstance(animes, list):
+        return 400, {"error": "Expected 'animes' array"}
+
+    results = []
+    for anime in animes:
+        # The action copies the insert() fields one by one, dropping others
+        args = {key: anime[key] for key in ANIME_FIELDS if key in anime}
+        try:
+            check_object(args, ANIME_FIELDS, "args")
+        except ValidationError as e:
+            results.append(
+                {"success": False, "title": anime.get("title"), "error": str(e)}
+            )
+            continue
+        [doc_id] = server.table.insert_many([args])
+        results.append({"success": True, "id": doc_id, "title": anime.get("title")})
+
+    imported = sum(1 for result in results if result["success"])
+    return 200, {
+        "success": True,
+        "imported": imported,
+        "failed": len(results) - imported,
+        "total": len(animes),
+        "results": results,
+    }
+
+
+def get_all_anime(server: StandinServer, params: dict[str, str]) -> dict[str, Any]:
+    limit = server.page_limit(_int_param(params, "limit"), ALL_PAGE_SIZE)
+    return server.table.paginate(
+        params.get("cursor"),
+        limit,
+        after=_float_param(params, "after"),
+        before=_float_param(params, "before"),
+    )
+
+
+def get_anime_bounds(server: StandinServer, params: dict[str, str]) -> dict[str, Any]:
+    low, high = server.table.bounds()
+    return {"min": low, "max": high}
+
+
+def clear_all_anime(server: StandinServer, data: Any) -> dict[str, Any]:
+    user_anime, imports = server.user_anime.clear(CLEAR_BATCH)
+    cleared = server.table.clear(CLEAR_BATCH)
+    # Lists, comments and the top-anime cache do not exist here
+    return {
+        "userAnimeCleared": user_anime,
+        "userAnimeImportsCleared": imports,
+        "listCommentsCleared": 0,
+        "commentVotesCleared": 0,
+        "listItemsCleared": 0,
+        "listsCleared": 0,
+        "cacheCleared": 0,
+        "animeCleared": cleared,
+        "hasMore": CLEAR_BATCH in (user_anime, imports, cleared),
+    }
+
+
+def bulk_insert_anime(server: StandinServer, animes: list) -> dict[str, Any]:
+    for i, anime in enumerate(animes):
+        check_object(anime, BULK_INSERT_FIELDS, f"args.animes[{i}]")
+    server.table.insert_many(animes)
+    return {
+        "imported": len(animes),
+        "failed": 0,
+        "failedIndices": [],
+        "total": len(animes),
+        "errors": [],
+    }
+
+
+def get_anime_hashes(server: StandinServer, params: dict[str, str]) -> dict[str, Any]:
+    limit = server.page_limit(_int_param(params, "limit"), HASHES_PAGE_SIZE)
+    result = server.table.paginate(params.get("cursor"), limit)
+    result["page"] = [
+        {
+            "_id": anime["_id"],
+            "syncKey": anime.get("syncKey"),
+            "contentHash": anime.get("contentHash"),
+            "malId": anime.get("malId"),
+            "title": anime["title"],
+            "sources": []
+            if anime.get("syncKey") or anime.get("malId")
+            else anime["sources"],
+        }
+        for anime in result["page"]
+    ]
+    return result
+
+
+def upsert_anime(server: StandinServer, animes: list) -> dict[str, Any]:
+    for i, anime in enumerate(animes):
+        check_object(anime, UPSERT_FIELDS, f"args.animes[{i}]")
+    updated = 0
+    for anime in animes:
+        fields = dict(anime)
+        updated += server.table.upsert(fields.pop("id", None), fields)
+    return {
+        "imported": len(animes),
+        "inserted": len(animes) - updated,
+        "updated": updated,
+        "failed": 0,
+        "total": len(animes),
+        "errors": [],
+    }
+
+
+def delete_anime(server: StandinServer, data: Any) -> tuple[int, dict[str, Any]]:
+    ids = data.get("ids")
+    if not isinstance(ids, list):
+        return 400, {"error": "Expected 'ids' array"}
+    _check_value(ids, [str], "args.ids")
+    merge_into = data.get("mergeInto")
+    if merge_into is not None:
+        for i, key in enumerate(merge_into):
+            if key is not None:
+                _check_value(key, str, f"args.mergeInto[{i}]")
+
+    deleted = merged = missing_targets = 0
+    for i, doc_id in enumerate(ids):
+        if doc_id not in server.table.docs:
+            continue
+        key = merge_into[i] if merge_into and i < len(merge_into) else None
+        target = None
+        if key is not None:
+            target = server.table.merge_target(doc_id, key)
+            if target is None:
+                missing_targets += 1
+                continue
+        server.user_anime.move_anime(doc_id, target)
+        deleted += server.table.delete_many([doc_id])
+        merged += target is not None
+    return 200, {
+        "success": True,
+        "deleted": deleted,
+        "merged": merged,
+        "missingTargets": missing_targets,
+        "total": len(ids),
+    }
+
+
+def import_mal_list(server: StandinServer, data: Any) -> tuple[int, dict[str, Any]]:
+    items = data.get("items")
+    if not isinstance(items, list):
+        return 400, {"error": "Expected 'items' array"}
+    user_id, key = data.get("userId"), data.get("key")
+    if not isinstance(user_id, str) or not isinstance(key, str):
+        return 400, {"error": "Expected 'userId' and 'key' strings"}
+    for i, item in enumerate(items):
+        check_object(item, IMPORT_ITEM_FIELDS, f"args.items[{i}]")
+    result = server.user_anime.import_mal_batch(server.table, user_id, key, items)
+    return 200, {"success": True, **result}
+
+
+def clear_auth_sessions(server: StandinServer, data: Any) -> dict[str, Any]:
+    # Same shape as anime.clearAuthSessions; there are no sessions here
+    return {"sessionsCleared": 0, "refreshTokensCleared": 0, "hasMore": False}
+
+
+def _array_action(key: str, action: Callable) -> Callable:
+    """Wrap an action that takes the `key` array of the request body."""
+
+    def handler(server: StandinServer, data: Any) -> tuple[int, dict[str, Any]]:
+        items = data.get(key)
+        if not isinstance(items, list):
+            return 400, {"error": f"Expected '{key}' array"}
+        return 200, {"success": True, **action(server, items)}
+
+    return handler
+
+
+def _action(action: Callable) -> Callable:
+    def handler(server: StandinServer, arg: Any) -> tuple[int, dict[str, Any]]:
+        return 200, {"success": True, **action(server, arg)}
+
+    return handler
+
+
+# path -> (method, handler, reads a JSON body, body array whose length
+# drives --item-latency)
+ROUTES: dict[str, tuple[str, Callable, bool, str | None]] = {
+    "/import": ("POST", bulk_import, True, "animes"),
+    "/anime/all": ("GET", _action(get_all_anime), False, None),
+    "/anime/bounds": ("GET", _action(get_anime_bounds), False, None),
+    "/anime/clear": ("POST", _action(clear_all_anime), False, None),
+    "/anime/bulk-insert": (
+        "POST",
+        _array_action("animes", bulk_insert_anime),
+        True,
+        "animes",
+    ),
+    "/anime/hashes": ("GET", _action(get_anime_hashes), False, None),
+    "/anime/upsert": ("POST", _array_action("animes", upsert_anime), True, "animes"),
+    "/anime/delete": ("POST", delete_anime, True, "ids"),
+    "/userAnime/import-mal": ("POST", import_mal_list, True, "items"),
+    "/api/auth/clear-sessions": ("POST", _action(clear_auth_sessions), False, None),
+}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real deployment
+    server: StandinServer
+
+    def log_message(self, format: str, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, payload: Any, headers: dict[str, str] | None = None):
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str):
+        parts = urlsplit(self.path)
+        route = ROUTES.get(parts.path)
+        if route is None or route[0] != method:
+            # Drain the body so the connection can be reused
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self._send(404, "No matching routes found")
+            return
+        _, handler, reads_body, items_key = route
+
+        server = self.server
+        if (
+            parts.path in SECRET_ROUTES
+            and server.import_secret is not None
+            and self.headers.get("Authorization") != f"Bearer {server.import_secret}"
+        ):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self._send(401, {"error": "Unauthorized"})
+            return
+        fault = server.draw_fault(parts.path)
+        try:
+            if method == "POST":
+                data = _json_body(self)
+            else:
+                data = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        except ValueError as e:
+            # request.json() throws inside the action's try block
+            time.sleep(server.delay())
+            self._send(500, {"error": str(e)})
+            return
+
+        items = data.get(items_key) if reads_body and isinstance(data, dict) else None
+        time.sleep(server.delay(len(items) if isinstance(items, list) else 0))
+
+        if fault is not None:
+            headers = {}
+            if fault == 429 and server.retry_after is not None:
+                headers["Retry-After"] = f"{server.retry_after:g}"
+            self._send(fault, {"error": f"Injected failure ({fault})"}, headers)
+            return
+
+        try:
+            if reads_body and not isinstance(data, dict):
+                raise ValidationError("Request body is not a JSON object")
+            status, payload = handler(server, data)
+        except (ValidationError, TypeError, ValueError) as e:
+            status, payload = 500, {"error": str(e)}
+        self._send(status, payload)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def load_snapshot(table: AnimeTable, path: Path) -> int:
+    """Fill the table from a JSONL export (e.g. anime_export.jsonl)."""
+    count = 0
+    for entry in iter_spill(path):
+        entry.pop("_id", None)
+        entry.pop("_creationTime", None)
+        table.insert_many([entry])
+        count += 1
+    return count
+
+
+def print_stats(server: StandinServer):
+    print("\nRequests:")
+    for path, count in sorted(server.requests.items()):
+        print(f"  {path}: {count}")
+    for status, count in sorted(server.injected.items()):
+        print(f"  injected {status}: {count}")
+    print(f"Rows in table: {len(server.table.docs)}")
+    if server.user_anime.rows:
+        print(f"userAnime rows: {len(server.user_anime.rows)}")
+
+
+def main(
+    host: str,
+    port: int,
+    data: Path | None,
+    latency: float,
+    jitter: float,
+    item_latency: float,
+    error_rate: float,
+    error_statuses: tuple[int, ...],
+    retry_after: float | None,
+    page_size: int | None,
+    seed: int | None,
+    verbose: bool,
+    import_secret: str | None = None,
+):
+    table = AnimeTable()
+    if data:
+        print(f"Loaded {load_snapshot(table, data)} anime entries from {data}")
+
+    server = StandinServer(
+        (host, port),
+        table,
+        latency=latency,
+        jitter=jitter,
+        item_latency=item_latency,
+        error_rate=error_rate,
+        error_statuses=error_statuses,
+        retry_after=retry_after,
+        page_size=page_size,
+        seed=seed,
+        verbose=verbose,
+        import_secret=import_secret,
+    )
+    print(f"Convex stand-in listening on {server.base_url}")
+    # Stop cleanly (and print the counters) when killed by a benchmark script
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print_stats(server)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--data",
+        type=Path,
+        default=None,
+        help="preload the anime table from this JSONL export",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds added to every response (default: 0)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="up to this many extra seconds, drawn uniformly per request",
+    )
+    parser.add_argument(
+        "--item-latency",
+        type=float,
+        default=0.0,
+        help="extra seconds per row in /import, bulk-insert, upsert, delete and import-mal bodies",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of requests answered with an injected error (e.g. 0.05)",
+    )
+    parser.add_argument(
+        "--error-status",
+        type=int,
+        action="append",
+        default=None,
+        help="status of injected errors; repeat to pick among several (default: 503)",
+    )
+    parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=None,
+        help="Retry-After seconds sent with injected 429s",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=None,
+        help="cap on rows per /anime/all and /anime/hashes page, whatever limit is requested",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="seed for jitter and error injection",
+    )
+    parser.add_argument(
+        "--import-secret",
+        default=None,
+        help="require this bearer token on /userAnime/import-mal (default: no check)",
+    )
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    main(
+        host=args.host,
+        port=args.port,
+        data=args.data,
+        latency=args.latency,
+        jitter=args.jitter,
+        item_latency=args.item_latency,
+        error_rate=args.error_rate,
+        error_statuses=tuple(args.error_status or (503,)),
+        retry_after=args.retry_after,
+        page_size=args.page_size,
+        seed=args.seed,
+        verbose=args.verbose,
+        import_secret=args.import_secret,
+    )
@@ -9,296 +9,186 @@ Priority hierarchy:
 4. Other sources (priority 0)
 """
 
-import json
-import re
+import argparse
 import sqlite3
-import urllib.request
-import urllib.error
 from pathlib import Path
-from typing import Any
-from tqdm import tqdm
+
+from anime_columns import ColumnFile
+from anime_db import load_anime_grouped
+from anime_record import AnimeRecord
+from anime_sync import print_sync_report, sync_anime
+from convex_client import CONVEX_URL, set_base_url
+from dedupe_core import deduplicate
+from entity_resolution import FUZZY_REPORT_PATH, entry_mal_id
+from parallel_merge import DEFAULT_PROCESSES
+from source_ids import source_priority
+from upload_engine import DEFAULT_WORKERS, measure_compression
+from upload_journal import UploadJournal, upload_pending
 
 # Paths
 DB_PATH = Path(__file__).parent.parent.parent / "anime.db"
-CONVEX_URL = "https://pastel-condor-398.convex.site"
-BATCH_SIZE = 100
-
-
-def extract_mal_id(sources: list[str]) -> str | None:
-    """Extract MyAnimeList ID from sources list."""
-    for source in sources:
-        match = re.search(r"myanimelist\.net/anime/(\d+)", source)
-        if match:
-            return match[1]
-    return None
-
+MAX_BATCH_SIZE = 1000  # batches are sized by bytes, this only caps row count
 
-def get_priority(sources: list[str]) -> int:
-    """Get priority score based on sources (higher is better)."""
-    priority = 0
-    for source in sources:
-        if "myanimelist.net" in source:
-            priority = max(priority, 3)
-        elif "anidb.net" in source:
-            priority = max(priority, 2)
-        elif "anilist.co" in source:
-            priority = max(priority, 1)
-    return priority
 
+def load_anime_from_sqlite() -> tuple[dict[str, list[AnimeRecord]], list[AnimeRecord]]:
+    """
+    Load all anime entries from SQLite (legacy or normalized layout).
 
-def normalize_title(title: str) -> str:
-    """Normalize title for comparison."""
-    return title.lower().strip()
-
-
-def merge_anime_entries(entries: list[dict[str, Any]]) -> dict[str, Any]:
-    """Merge multiple anime entries into one canonical entry."""
-    sorted_entries = sorted(
-        entries, key=lambda e: get_priority(e.get("sources", [])), reverse=True
-    )
-
-    canonical = sorted_entries[0]
-
-    merged = {
-        "title": canonical.get("title"),
-        "type": canonical.get("type"),
-        "episodes": canonical.get("episodes"),
-        "status": canonical.get("status"),
-        "animeSeason": canonical.get("animeSeason") or {},
-        "picture": canonical.get("picture"),
-        "thumbnail": canonical.get("thumbnail"),
-        "duration": canonical.get("duration") or {},
-        "score": canonical.get("score") or {},
-        "sources": list(canonical.get("sources", [])),
-        "synonyms": list(canonical.get("synonyms", [])),
-        "studios": list(canonical.get("studios", [])),
-        "producers": list(canonical.get("producers", [])),
-        "relatedAnime": list(canonical.get("relatedAnime", [])),
-        "tags": list(canonical.get("tags", [])),
-    }
-
-    for entry in sorted_entries[1:]:
-        if not merged["episodes"] and entry.get("episodes"):
-            merged["episodes"] = entry["episodes"]
-        if not merged["picture"] and entry.get("picture"):
-            merged["picture"] = entry["picture"]
-        if not merged["thumbnail"] and entry.get("thumbnail"):
-            merged["thumbnail"] = entry["thumbnail"]
-        if not merged["duration"] and entry.get("duration"):
-            merged["duration"] = entry["duration"]
-        if not merged["animeSeason"] and entry.get("animeSeason"):
-            merged["animeSeason"] = entry["animeSeason"]
-        elif entry.get("animeSeason"):
-            if not merged["animeSeason"].get("season") and entry["animeSeason"].get(
-                "season"
-            ):
-                merged["animeSeason"]["season"] = entry["animeSeason"]["season"]
-            if not merged["animeSeason"].get("year") and entry["animeSeason"].get(
-                "year"
-            ):
-                merged["animeSeason"]["year"] = entry["animeSeason"]["year"]
-
-        if entry.get("score"):
-            if not merged["score"].get("arithmeticMean") and entry["score"].get(
-                "arithmeticMean"
-            ):
-                merged["score"]["arithmeticMean"] = entry["score"]["arithmeticMean"]
-            if not merged["score"].get("arithmeticGeometricMean") and entry[
-                "score"
-            ].get("arithmeticGeometricMean"):
-                merged["score"]["arithmeticGeometricMean"] = entry["score"][
-                    "arithmeticGeometricMean"
-                ]
-            if not merged["score"].get("median") and entry["score"].get("median"):
-                merged["score"]["median"] = entry["score"]["median"]
-
-        merged["sources"].extend(entry.get("sources", []))
-        merged["synonyms"].extend(entry.get("synonyms", []))
-        merged["studios"].extend(entry.get("studios", []))
-        merged["producers"].extend(entry.get("producers", []))
-        merged["relatedAnime"].extend(entry.get("relatedAnime", []))
-        merged["tags"].extend(entry.get("tags", []))
-
-    merged["sources"] = list(set(merged["sources"]))
-    merged["synonyms"] = list(set(merged["synonyms"]))
-    merged["studios"] = list(set(merged["studios"]))
-    merged["producers"] = list(set(merged["producers"]))
-    merged["relatedAnime"] = list(set(merged["relatedAnime"]))
-    merged["tags"] = list(set(merged["tags"]))
-
-    if not merged["animeSeason"]:
-        merged["animeSeason"] = None
-    if not merged["duration"]:
-        merged["duration"] = None
-    if not merged["score"]:
-        merged["score"] = None
-
-    return merged
-
-
-def load_anime_from_sqlite() -> list[dict]:
-    """Load all anime entries from SQLite."""
+    Entries come back grouped by the precomputed mal_id column, each group
+    ordered by source_priority, plus the list of entries without a MAL id.
+    Entries are compact AnimeRecords.
+    """
     print(f"Loading anime from: {DB_PATH}")
 
     if not DB_PATH.exists():
         raise FileNotFoundError(f"Database not found at {DB_PATH}")
 
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT title, type, episodes, status, anime_season, picture, thumbnail,
-               duration, score, sources, synonyms, studios, producers, related_anime, tags
-        FROM anime
-    """)
-
-    animes = []
-    for row in cursor.fetchall():
-        anime = {
-            "title": row["title"],
-            "type": row["type"],
-            "episodes": row["episodes"],
-            "status": row["status"],
-            "animeSeason": json.loads(row["anime_season"] or "{}"),
-            "picture": row["picture"],
-            "thumbnail": row["thumbnail"],
-            "duration": json.loads(row["duration"] or "{}"),
-            "score": json.loads(row["score"] or "{}"),
-            "sources": json.loads(row["sources"] or "[]"),
-            "synonyms": json.loads(row["synonyms"] or "[]"),
-            "studios": json.loads(row["studios"] or "[]"),
-            "producers": json.loads(row["producers"] or "[]"),
-            "relatedAnime": json.loads(row["related_anime"] or "[]"),
-            "tags": json.loads(row["tags"] or "[]"),
-        }
-        animes.append(anime)
-
+    by_mal_id, without_mal_id = load_anime_grouped(conn, records=True)
     conn.close()
-    print(f"Loaded {len(animes)} entries from SQLite")
-    return animes
-
-
-def deduplicate_anime(all_anime: list[dict]) -> list[dict]:
-    """Deduplicate anime entries using MAL ID and title matching."""
-    print("\nDeduplicating anime entries...")
-
-    by_mal_id: dict[str, list[dict]] = {}
-    by_title: dict[str, list[dict]] = []
-
-    for anime in tqdm(all_anime, desc="Grouping entries"):
-        mal_id = extract_mal_id(anime.get("sources", []))
-        title = normalize_title(anime.get("title", ""))
-
+    total = sum(len(entries) for entries in by_mal_id.values()) + len(without_mal_id)
+    print(f"Loaded {total} entries from SQLite")
+    return by_mal_id, without_mal_id
+
+
+def load_anime_from_columns(
+    path: Path,
+) -> tuple[dict[str, list[AnimeRecord]], list[AnimeRecord]]:
+    """
+    Load all anime entries from a column file (anime_columns.py), grouped
+    the same way as load_anime_from_sqlite().
+    """
+    print(f"Loading anime from: {path}")
+
+    with ColumnFile(path) as columns:
+        entries = columns.records()
+
+    by_mal_id: dict[str, list[AnimeRecord]] = {}
+    without_mal_id = []
+    for entry in entries:
+        mal_id = entry_mal_id(entry)
         if mal_id:
-            if mal_id not in by_mal_id:
-                by_mal_id[mal_id] = []
-            by_mal_id[mal_id].append(anime)
-        elif title:
-            by_title.append((title, anime))
-
-    print(f"\n  Grouped by MAL ID: {len(by_mal_id)} unique IDs")
-    print(f"  Entries without MAL ID: {len(by_title)}")
-
-    # Remove title entries that match MAL entries
-    mal_titles = set()
-    for entries in by_mal_id.values():
-        for entry in entries:
-            mal_titles.add(normalize_title(entry.get("title", "")))
-
-    filtered_by_title = {}
-    for title, anime in by_title:
-        if title not in mal_titles:
-            if title not in filtered_by_title:
-                filtered_by_title[title] = []
-            filtered_by_title[title].append(anime)
-
-    print(f"  Title groups after MAL overlap removal: {len(filtered_by_title)}")
-
-    # Merge each group
-    deduplicated = []
-
-    print("\n  Merging MAL ID groups...")
-    for mal_id, entries in tqdm(by_mal_id.items(), desc="MAL groups"):
-        if len(entries) > 1:
-            merged = merge_anime_entries(entries)
-            deduplicated.append(merged)
-        else:
-            deduplicated.append(entries[0])
-
-    print("  Merging title groups...")
-    for title, entries in tqdm(filtered_by_title.items(), desc="Title groups"):
-        if len(entries) > 1:
-            merged = merge_anime_entries(entries)
-            deduplicated.append(merged)
+            by_mal_id.setdefault(mal_id, []).append(entry)
         else:
-            deduplicated.append(entries[0])
-
-    return deduplicated
-
-
-def insert_batch(batch: list[dict], batch_num: int, total_batches: int) -> dict:
-    """Insert a batch of anime entries."""
-    url = f"{CONVEX_URL}/anime/bulk-insert"
-
-    data = json.dumps({"animes": batch}).encode("utf-8")
+            without_mal_id.append(entry)
+    for group in by_mal_id.values():
+        # Stable, so ties stay in row order as with the SQLite index
+        group.sort(key=lambda e: source_priority(e.sources), reverse=True)
+
+    print(f"Loaded {len(entries)} entries from {path}")
+    return by_mal_id, without_mal_id
+
+
+def deduplicate_anime(
+    by_mal_id: dict[str, list[AnimeRecord]],
+    without_mal_id: list[AnimeRecord],
+    fuzzy_threshold: float | None = None,
+    fuzzy_report: Path = FUZZY_REPORT_PATH,
+    merge_processes: int = 1,
+) -> list[AnimeRecord]:
+    """
+    Deduplicate anime entries by clustering on MAL id, source URLs, titles
+    and synonyms (see entity_resolution.py), then merging each cluster.
+    """
+    print("\nDeduplicating anime entries...")
 
-    try:
-        req = urllib.request.Request(
-            url, data=data, headers={"Content-Type": "application/json"}, method="POST"
-        )
-        with urllib.request.urlopen(req, timeout=120) as response:
-            result = json.loads(response.read().decode("utf-8"))
-            return result
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8")
-        return {"success": False, "error": f"HTTP {e.code}: {error_body}"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    print(f"\n  Grouped by MAL ID: {len(by_mal_id)} unique IDs")
+    print(f"  Entries without MAL ID: {len(without_mal_id)}")
+
+    # MAL groups come first and already in priority order, so a cluster that
+    # is exactly one MAL group can skip the priority sort
+    entries = [entry for group in by_mal_id.values() for entry in group]
+    entries.extend(without_mal_id)
+    return deduplicate(
+        entries,
+        mal_groups=by_mal_id,
+        fuzzy_threshold=fuzzy_threshold,
+        fuzzy_report=fuzzy_report,
+        merge_processes=merge_processes,
+    )
 
 
-def insert_deduplicated_anime(animes: list[dict]) -> tuple[int, int]:
-    """Insert deduplicated anime entries in batches."""
-    print(f"\nInserting {len(animes)} deduplicated anime entries...")
+def insert_deduplicated_anime(
+    journal: UploadJournal, workers: int = DEFAULT_WORKERS, compress: bool = False
+) -> tuple[int, int]:
+    """Insert the journaled deduplicated entries that are not yet acknowledged."""
+    total, acked = journal.counts()
+    print(f"\nInserting {total - acked} deduplicated anime entries...")
 
-    batches = [animes[i : i + BATCH_SIZE] for i in range(0, len(animes), BATCH_SIZE)]
-    total_imported = 0
-    total_failed = 0
+    return upload_pending(
+        journal,
+        MAX_BATCH_SIZE,
+        workers=workers,
+        desc="Inserting batches",
+        compress=compress,
+    )
 
-    for i, batch in enumerate(tqdm(batches, desc="Inserting batches"), 1):
-        result = insert_batch(batch, i, len(batches))
 
-        if result.get("success"):
-            total_imported += result.get("imported", 0)
-            total_failed += result.get("failed", 0)
+def main(
+    workers: int = DEFAULT_WORKERS,
+    resume: bool = False,
+    compress: bool = False,
+    measure_compression_only: bool = False,
+    sync: bool = False,
+    fuzzy_threshold: float | None = None,
+    fuzzy_report: Path = FUZZY_REPORT_PATH,
+    merge_processes: int = 1,
+    columns: Path | None = None,
+):
+    print("=" * 60)
+    print("ANIME DEDUPLICATION & UPLOAD")
+    print("=" * 60)
 
-            if result.get("errors"):
-                for error in result["errors"]:
-                    print(f"\n  Error: {error}")
-        else:
-            total_failed += len(batch)
-            print(f"\n  Batch {i} failed: {result.get('error')}")
+    journal = UploadJournal("dedupe_and_upload")
 
-    return total_imported, total_failed
+    if resume:
+        if not journal.has_unfinished_run():
+            print("\nNothing to resume: no interrupted upload in the journal.")
+            return
 
+        if not journal.is_cleared():
+            # Only journals from before the clear phase was recorded; this
+            # job inserts on top of the table and never clears it
+            journal.mark_cleared()
 
-def main():
-    print("=" * 60)
-    print("ANIME DEDUPLICATION & UPLOAD")
-    print("=" * 60)
+        total, acked = journal.counts()
+        print(f"\nResuming upload: {acked}/{total} entries already acknowledged")
+        imported, failed = insert_deduplicated_anime(
+            journal, workers=workers, compress=compress
+        )
+        total, acked = journal.counts()
+
+        print("\n" + "=" * 60)
+        print("RESUME COMPLETE")
+        print("=" * 60)
+        print(f"  Successfully imported: {imported}")
+        print(f"  Failed imports: {failed}")
+        print(f"  Acknowledged: {acked}/{total}")
+        return
 
-    # Step 1: Load from SQLite
+    # Step 1: Load from SQLite (or a column file)
     try:
-        all_anime = load_anime_from_sqlite()
+        if columns is not None:
+            by_mal_id, without_mal_id = load_anime_from_columns(columns)
+        else:
+            by_mal_id, without_mal_id = load_anime_from_sqlite()
     except Exception as e:
         print(f"\nError loading anime: {e}")
         return
 
-    original_count = len(all_anime)
+    original_count = sum(len(entries) for entries in by_mal_id.values()) + len(
+        without_mal_id
+    )
     print(f"\nOriginal anime count: {original_count}")
 
     # Step 2: Deduplicate
-    deduplicated = deduplicate_anime(all_anime)
+    deduplicated = deduplicate_anime(
+        by_mal_id,
+        without_mal_id,
+        fuzzy_threshold,
+        fuzzy_report,
+        merge_processes,
+    )
     new_count = len(deduplicated)
 
     print(f"\nDeduplicated anime count: {new_count}")
@@ -306,12 +196,25 @@ def main():
         f"Reduction: {original_count - new_count} entries ({100 * (original_count - new_count) / original_count:.1f}%)"
     )
 
+    if measure_compression_only:
+        measure_compression(deduplicated, MAX_BATCH_SIZE)
+        return
+
+    if sync:
+        # Only send what changed; nothing is cleared
+        stats = sync_anime(deduplicated, workers=workers, compress=compress)
+        print_sync_report(stats)
+        return
+
     # Step 3: Insert
+    journal.begin("/anime/bulk-insert", deduplicated)
     print("\n" + "=" * 60)
     print("INSERTING DEDUPLICATED ENTRIES")
     print("=" * 60)
 
-    imported, failed = insert_deduplicated_anime(deduplicated)
+    imported, failed = insert_deduplicated_anime(
+        journal, workers=workers, compress=compress
+    )
 
     # Final report
     print("\n" + "=" * 60)
@@ -327,4 +230,73 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"bulk-insert requests in flight (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="re-send only the batches of the last interrupted run that were never acknowledged",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="send gzip-compressed request bodies",
+    )
+    parser.add_argument(
+        "--measure-compression",
+        action="store_true",
+        help="report gzip ratio and throughput on this dataset instead of uploading",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="send only inserts, updates and deletes against the remote content hashes instead of a full upload",
+    )
+    parser.add_argument(
+        "--fuzzy-threshold",
+        type=float,
+        default=None,
+        help="also merge near-identical titles with 3-gram similarity at or above this value (e.g. 0.9)",
+    )
+    parser.add_argument(
+        "--fuzzy-report",
+        type=Path,
+        default=FUZZY_REPORT_PATH,
+        help=f"JSONL report of fuzzy merges (default: {FUZZY_REPORT_PATH})",
+    )
+    parser.add_argument(
+        "--merge-processes",
+        type=int,
+        default=1,
+        help=f"merge clusters in this many worker processes (this machine has {DEFAULT_PROCESSES})",
+    )
+    parser.add_argument(
+        "--columns",
+        type=Path,
+        default=None,
+        help="load entries from this column file (anime_columns.py) instead of anime.db",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=CONVEX_URL,
+        help=f"Convex HTTP actions URL (default: $CONVEX_SITE_URL or {CONVEX_URL})",
+    )
+    args = parser.parse_args()
+    set_base_url(args.base_url)
+
+    main(
+        workers=args.workers,
+        resume=args.resume,
+        compress=args.gzip,
+        measure_compression_only=args.measure_compression,
+        sync=args.sync,
+        fuzzy_threshold=args.fuzzy_threshold,
+        fuzzy_report=args.fuzzy_report,
+        merge_processes=args.merge_processes,
+        columns=args.columns,
+    )
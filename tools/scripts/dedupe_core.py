@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Dedupe core shared by deduplicate_anime.py and dedupe_and_upload.py.
+
+Entries are clustered by entity_resolution.py and each cluster is merged
+into one canonical entry, optionally in a process pool (parallel_merge.py).
+Entries and merged results are compact AnimeRecords (anime_record.py).
+
+Priority hierarchy for the canonical entry:
+1. MyAnimeList (priority 3) - always preferred
+2. AniDB (priority 2)
+3. AniList (priority 1)
+4. Other sources (priority 0)
+
+Merges data from all duplicates:
+- Uses highest priority entry as canonical
+- Fills missing fields from other entries
+- Combines synonyms, tags, sources, studios, producers
+"""
+
+from pathlib import Path
+from typing import Any, Mapping
+
+from anime_record import AnimeRecord
+from entity_resolution import FUZZY_REPORT_PATH, entry_mal_id, resolve_clusters
+from parallel_merge import merge_clusters
+from source_ids import source_priority
+
+# Taken from the canonical (highest priority) entry only
+CANONICAL_FIELDS = ("title", "type", "status")
+# First non-empty value in priority order
+FILL_FIELDS = ("episodes", "picture", "thumbnail")
+# Filled key by key from entries in priority order
+NESTED_FIELDS = {
+    "animeSeason": ("season", "year"),
+    "score": ("arithmeticGeometricMean", "arithmeticMean", "median"),
+}
+# Concatenated across entries without duplicates, first-seen order
+LIST_FIELDS = ("sources", "synonyms", "studios", "producers", "relatedAnime", "tags")
+
+
+def _first_value(entries: list[Mapping[str, Any]], field: str) -> Any:
+    """First non-empty value of `field` in priority order."""
+    for entry in entries:
+        value = entry.get(field)
+        if value:
+            return value
+    return None
+
+
+def merge_anime_entries(
+    entries: list[Mapping[str, Any]], presorted: bool = False
+) -> AnimeRecord:
+    """
+    Merge multiple anime entries into one canonical entry.
+
+    Scalars take the first non-empty value in priority order (usually the
+    canonical entry's, so the scan stops at once), nested objects are filled
+    key by key, and list fields are deduplicated as they are read, keeping
+    first-seen order. Every output value is built fresh, so the
+    input entries are never modified or shared with the result.
+
+    Entries may be dicts or AnimeRecords; the result is an AnimeRecord.
+
+    Pass presorted=True when entries are already ordered by source priority
+    (highest first), e.g. groups from load_anime_grouped().
+    """
+    if not presorted:
+        entries = sorted(
+            entries, key=lambda e: source_priority(e.get("sources", [])), reverse=True
+        )
+
+    canonical = entries[0]
+    merged = {field: canonical.get(field) for field in CANONICAL_FIELDS}
+    mal_id = entry_mal_id(canonical)
+    if mal_id:
+        merged["malId"] = mal_id
+
+    for field in FILL_FIELDS:
+        value = canonical.get(field)
+        merged[field] = value or _first_value(entries, field) or value
+
+    for field, keys in NESTED_FIELDS.items():
+        values = {}
+        for entry in entries:
+            source = entry.get(field)
+            if not source:
+                continue
+            for key in keys:
+                if key not in values and source.get(key):
+                    values[key] = source[key]
+            if len(values) == len(keys):
+                break
+        merged[field] = values or None
+
+    # value and unit only make sense together, so duration is taken whole
+    duration = _first_value(entries, "duration")
+    merged["duration"] = dict(duration) if duration else None
+
+    for field in LIST_FIELDS:
+        seen = set()
+        values = []
+        for entry in entries:
+            items = entry.get(field)
+            # Lower-priority entries mostly repeat what is already there;
+            # the C-level superset check skips them without a Python loop
+            if not items or seen.issuperset(items):
+                continue
+            if not values:
+                values = list(dict.fromkeys(items))
+                seen.update(values)
+                continue
+            for item in items:
+                if item not in seen:
+                    seen.add(item)
+                    values.append(item)
+        merged[field] = values
+
+    return AnimeRecord(merged)
+
+
+def deduplicate(
+    entries: list[AnimeRecord],
+    mal_groups: dict[str, list[AnimeRecord]] | None = None,
+    fuzzy_threshold: float | None = None,
+    fuzzy_report: Path = FUZZY_REPORT_PATH,
+    merge_processes: int = 1,
+) -> list[AnimeRecord]:
+    """
+    Cluster entries and merge each cluster into one canonical entry.
+
+    `mal_groups` are priority-ordered groups by MAL id as returned by
+    anime_db.load_anime_grouped(); when `entries` lists them first, in that
+    order, clusters that are exactly one group skip the priority sort.
+    """
+    clusters = resolve_clusters(entries, fuzzy_threshold, fuzzy_report)
+
+    presorted = []
+    for cluster in clusters:
+        group = mal_groups.get(cluster[0].get("malId")) if mal_groups else None
+        presorted.append(group is not None and len(group) == len(cluster))
+
+    print("\n  Merging clusters...")
+    merged = merge_clusters(
+        merge_anime_entries, clusters, presorted, processes=merge_processes
+    )
+    # Singletons are passed through unmerged; give them the malId a merge
+    # would, so it does not depend on whether the loader stored one
+    for idx, entry in enumerate(merged):
+        if not entry.get("malId"):
+            mal_id = entry_mal_id(entry)
+            if mal_id:
+                merged[idx] = AnimeRecord({**entry, "malId": mal_id})
+    return merged
@@ -14,204 +14,77 @@ Merges data from all duplicates:
 - Combines synonyms, tags, sources, studios, producers
 """
 
-import json
-import re
-import urllib.request
-import urllib.error
+import argparse
 from pathlib import Path
-from typing import Any
+from typing import Iterable
 from tqdm import tqdm
 
-# Convex deployment URL
-CONVEX_URL = "https://pastel-condor-398.convex.site"
-BATCH_SIZE = 500
+from anime_columns import COLUMN_SUFFIX, count_snapshot, iter_snapshot, write_columns
+from anime_export import export_partitioned
+from anime_record import AnimeRecord
+from anime_spill import SPILL_PATH, SpillWriter, iter_spill
+from anime_sync import print_sync_report, sync_anime
+from convex_client import CONVEX_URL, get_client, set_base_url
+from dedupe_core import deduplicate
+from entity_resolution import FUZZY_REPORT_PATH
+from parallel_merge import DEFAULT_PROCESSES
+from upload_engine import DEFAULT_WORKERS
+from upload_journal import UploadJournal, upload_pending
+
+MAX_BATCH_SIZE = 1000  # batches are sized by bytes, this only caps row count
 
 # Dry run mode - set to False to actually make changes
 DRY_RUN = False
 
 
-def extract_mal_id(sources: list[str]) -> str | None:
-    """Extract MyAnimeList ID from sources list."""
-    for source in sources:
-        match = re.search(r"myanimelist\.net/anime/(\d+)", source)
-        if match:
-            return match[1]
-    return None
-
-
-def get_priority(sources: list[str]) -> int:
-    """Get priority score based on sources (higher is better)."""
-    priority = 0
-    for source in sources:
-        if "myanimelist.net" in source:
-            priority = max(priority, 3)
-        elif "anidb.net" in source:
-            priority = max(priority, 2)
-        elif "anilist.co" in source:
-            priority = max(priority, 1)
-    return priority
-
-
-def normalize_title(title: str) -> str:
-    """Normalize title for comparison."""
-    return title.lower().strip()
-
-
-def merge_anime_entries(entries: list[dict[str, Any]]) -> dict[str, Any]:
+def fetch_all_anime(spill_path: Path = SPILL_PATH) -> int:
     """
-    Merge multiple anime entries into one canonical entry.
+    Fetch all anime entries from Convex with pagination.
 
-    Uses highest priority entry as base and fills in missing fields.
-    Combines list fields (sources, synonyms, tags, etc.) from all entries.
+    Pages are streamed into a JSONL spill file at `spill_path` instead of
+    being held in memory; read them back with iter_spill(). Returns the
+    number of entries fetched.
     """
-    # Sort by priority (highest first)
-    sorted_entries = sorted(
-        entries, key=lambda e: get_priority(e.get("sources", [])), reverse=True
-    )
-
-    canonical = sorted_entries[0]
-
-    # Start with canonical entry
-    merged = {
-        "title": canonical.get("title"),
-        "type": canonical.get("type"),
-        "episodes": canonical.get("episodes"),
-        "status": canonical.get("status"),
-        "animeSeason": canonical.get("animeSeason") or {},
-        "picture": canonical.get("picture"),
-        "thumbnail": canonical.get("thumbnail"),
-        "duration": canonical.get("duration") or {},
-        "score": canonical.get("score") or {},
-        "sources": list(canonical.get("sources", [])),
-        "synonyms": list(canonical.get("synonyms", [])),
-        "studios": list(canonical.get("studios", [])),
-        "producers": list(canonical.get("producers", [])),
-        "relatedAnime": list(canonical.get("relatedAnime", [])),
-        "tags": list(canonical.get("tags", [])),
-    }
-
-    # Fill missing fields and combine lists from other entries
-    for entry in sorted_entries[1:]:
-        # Fill missing scalar fields
-        if not merged["episodes"] and entry.get("episodes"):
-            merged["episodes"] = entry["episodes"]
-
-        if not merged["picture"] and entry.get("picture"):
-            merged["picture"] = entry["picture"]
-
-        if not merged["thumbnail"] and entry.get("thumbnail"):
-            merged["thumbnail"] = entry["thumbnail"]
-
-        if not merged["duration"] and entry.get("duration"):
-            merged["duration"] = entry["duration"]
-
-        if not merged["animeSeason"] and entry.get("animeSeason"):
-            merged["animeSeason"] = entry["animeSeason"]
-        elif entry.get("animeSeason"):
-            # Merge partial season info
-            if not merged["animeSeason"].get("season") and entry["animeSeason"].get(
-                "season"
-            ):
-                merged["animeSeason"]["season"] = entry["animeSeason"]["season"]
-            if not merged["animeSeason"].get("year") and entry["animeSeason"].get(
-                "year"
-            ):
-                merged["animeSeason"]["year"] = entry["animeSeason"]["year"]
-
-        # Merge score - prefer more complete data
-        if entry.get("score"):
-            if not merged["score"].get("arithmeticMean") and entry["score"].get(
-                "arithmeticMean"
-            ):
-                merged["score"]["arithmeticMean"] = entry["score"]["arithmeticMean"]
-            if not merged["score"].get("arithmeticGeometricMean") and entry[
-                "score"
-            ].get("arithmeticGeometricMean"):
-                merged["score"]["arithmeticGeometricMean"] = entry["score"][
-                    "arithmeticGeometricMean"
-                ]
-            if not merged["score"].get("median") and entry["score"].get("median"):
-                merged["score"]["median"] = entry["score"]["median"]
-
-        # Combine list fields (dedupe)
-        merged["sources"].extend(entry.get("sources", []))
-        merged["synonyms"].extend(entry.get("synonyms", []))
-        merged["studios"].extend(entry.get("studios", []))
-        merged["producers"].extend(entry.get("producers", []))
-        merged["relatedAnime"].extend(entry.get("relatedAnime", []))
-        merged["tags"].extend(entry.get("tags", []))
-
-    # Dedupe list fields
-    merged["sources"] = list(set(merged["sources"]))
-    merged["synonyms"] = list(set(merged["synonyms"]))
-    merged["studios"] = list(set(merged["studios"]))
-    merged["producers"] = list(set(merged["producers"]))
-    merged["relatedAnime"] = list(set(merged["relatedAnime"]))
-    merged["tags"] = list(set(merged["tags"]))
-
-    # Clean up empty objects
-    if not merged["animeSeason"]:
-        merged["animeSeason"] = None
-    if not merged["duration"]:
-        merged["duration"] = None
-    if not merged["score"]:
-        merged["score"] = None
-
-    return merged
-
-
-def fetch_all_anime() -> list[dict[str, Any]]:
-    """Fetch all anime entries from Convex with pagination."""
     print("Fetching all anime from Convex...")
 
-    all_anime = []
+    client = get_client()
     cursor = None
     page_count = 0
 
-    while True:
-        page_count += 1
-        url = f"{CONVEX_URL}/anime/all"
-        params = {"limit": 500}
-        if cursor:
-            params["cursor"] = cursor
+    with SpillWriter(spill_path) as spill:
+        while True:
+            page_count += 1
+            params = {"limit": 500}
+            if cursor:
+                params["cursor"] = cursor
 
-        # Build URL with query params
-        from urllib.parse import urlencode
+            data = client.get("/anime/all", params)
+            if data.get("success"):
+                page = data.get("page", [])
+                spill.write_many(page)
+                print(
+                    f"  Fetched page {page_count}: {len(page)} entries (total: {spill.count})"
+                )
 
-        full_url = f"{url}?{urlencode(params)}"
+                if data.get("isDone"):
+                    break
 
-        try:
-            req = urllib.request.Request(full_url, method="GET")
-            with urllib.request.urlopen(req, timeout=300) as response:
-                data = json.loads(response.read().decode("utf-8"))
-                if data.get("success"):
-                    page = data.get("page", [])
-                    all_anime.extend(page)
-                    print(
-                        f"  Fetched page {page_count}: {len(page)} entries (total: {len(all_anime)})"
-                    )
-
-                    if data.get("isDone"):
-                        break
-
-                    cursor = data.get("continueCursor")
-                    if not cursor:
-                        break
-                else:
-                    raise Exception(data.get("error", "Unknown error"))
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode("utf-8")
-            raise Exception(f"HTTP {e.code}: {error_body}")
-
-    print(f"\n  Total fetched: {len(all_anime)} anime entries")
-    return all_anime
+                cursor = data.get("continueCursor")
+                if not cursor:
+                    break
+            else:
+                raise Exception(data.get("error", "Unknown error"))
+
+    print(f"\n  Total fetched: {spill.count} anime entries")
+    print(f"  Snapshot saved to: {spill_path}")
+    return spill.count
 
 
 def clear_all_data() -> dict:
     """Clear all anime and user data from Convex (in batches)."""
     print("Clearing all anime and user data...")
 
-    url = f"{CONVEX_URL}/anime/clear"
+    client = get_client()
 
     total_user_anime = 0
     total_list_items = 0
@@ -222,32 +95,21 @@ def clear_all_data() -> dict:
     while True:
         iteration += 1
 
-        try:
-            req = urllib.request.Request(
-                url,
-                data=json.dumps({"batch": 1000}).encode("utf-8"),
-                headers={"Content-Type": "application/json"},
-                method="POST",
+        data = client.post("/anime/clear", {"batch": 1000})
+        if data.get("success"):
+            total_user_anime += data.get("userAnimeCleared", 0)
+            total_list_items += data.get("listItemsCleared", 0)
+            total_cache += data.get("cacheCleared", 0)
+            total_anime += data.get("animeCleared", 0)
+
+            print(
+                f"  Batch {iteration}: anime={data.get('animeCleared', 0)}, userAnime={data.get('userAnimeCleared', 0)}"
             )
-            with urllib.request.urlopen(req, timeout=300) as response:
-                data = json.loads(response.read().decode("utf-8"))
-                if data.get("success"):
-                    total_user_anime += data.get("userAnimeCleared", 0)
-                    total_list_items += data.get("listItemsCleared", 0)
-                    total_cache += data.get("cacheCleared", 0)
-                    total_anime += data.get("animeCleared", 0)
-
-                    print(
-                        f"  Batch {iteration}: anime={data.get('animeCleared', 0)}, userAnime={data.get('userAnimeCleared', 0)}"
-                    )
-
-                    if not data.get("hasMore"):
-                        break
-                else:
-                    raise Exception(data.get("error", "Unknown error"))
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode("utf-8")
-            raise Exception(f"HTTP {e.code}: {error_body}")
+
+            if not data.get("hasMore"):
+                break
+        else:
+            raise Exception(data.get("error", "Unknown error"))
 
     print(f"\n  Total cleared:")
     print(f"    Anime: {total_anime}")
@@ -263,124 +125,64 @@ def clear_all_data() -> dict:
     }
 
 
-def insert_batch(batch: list[dict], batch_num: int, total_batches: int) -> dict:
-    """Insert a batch of anime entries."""
-    url = f"{CONVEX_URL}/anime/bulk-insert"
-
-    data = json.dumps({"animes": batch}).encode("utf-8")
-
-    try:
-        req = urllib.request.Request(
-            url, data=data, headers={"Content-Type": "application/json"}, method="POST"
-        )
-        with urllib.request.urlopen(req, timeout=120) as response:
-            result = json.loads(response.read().decode("utf-8"))
-            return result
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8")
-        return {"success": False, "error": f"HTTP {e.code}: {error_body}"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-
-
-def insert_deduplicated_anime(animes: list[dict]) -> tuple[int, int]:
-    """Insert deduplicated anime entries in batches."""
-    print(f"\nInserting {len(animes)} deduplicated anime entries...")
-
-    batches = [animes[i : i + BATCH_SIZE] for i in range(0, len(animes), BATCH_SIZE)]
-    total_imported = 0
-    total_failed = 0
+def insert_deduplicated_anime(
+    journal: UploadJournal, workers: int = DEFAULT_WORKERS, compress: bool = False
+) -> tuple[int, int]:
+    """Insert the journaled deduplicated entries that are not yet acknowledged."""
+    total, acked = journal.counts()
+    print(f"\nInserting {total - acked} deduplicated anime entries...")
 
-    for i, batch in enumerate(tqdm(batches, desc="Inserting batches"), 1):
-        result = insert_batch(batch, i, len(batches))
-
-        if result.get("success"):
-            total_imported += result.get("imported", 0)
-            total_failed += result.get("failed", 0)
-
-            if result.get("errors"):
-                for error in result["errors"]:
-                    print(f"\n  Error: {error}")
-        else:
-            total_failed += len(batch)
-            print(f"\n  Batch {i} failed: {result.get('error')}")
-
-    return total_imported, total_failed
+    return upload_pending(
+        journal,
+        MAX_BATCH_SIZE,
+        workers=workers,
+        desc="Inserting batches",
+        compress=compress,
+    )
 
 
-def deduplicate_anime(all_anime: list[dict]) -> list[dict]:
+def deduplicate_anime(
+    all_anime: Iterable[dict],
+    fuzzy_threshold: float | None = None,
+    fuzzy_report: Path = FUZZY_REPORT_PATH,
+    merge_processes: int = 1,
+) -> list[AnimeRecord]:
     """
-    Deduplicate anime entries using MAL ID and title matching.
+    Deduplicate anime entries by clustering on MAL id, source URLs, titles
+    and synonyms (see entity_resolution.py), then merging each cluster.
+
+    `all_anime` is consumed once, so it can be a stream such as iter_spill();
+    each entry is kept as a compact AnimeRecord as soon as it is read. The
+    clustering still needs every entry at once (title and synonym links span
+    the whole catalogue), so memory here grows with the catalogue; only the
+    download ahead of it is bounded.
     """
     print("\nDeduplicating anime entries...")
 
-    # Group by MAL ID
-    by_mal_id: dict[str, list[dict]] = {}
-    by_title: dict[str, list[dict]] = {}
-    no_mal_no_title: list[dict] = []
-
-    for anime in tqdm(all_anime, desc="Grouping entries"):
-        mal_id = extract_mal_id(anime.get("sources", []))
-        title = normalize_title(anime.get("title", ""))
-
-        if mal_id:
-            if mal_id not in by_mal_id:
-                by_mal_id[mal_id] = []
-            by_mal_id[mal_id].append(anime)
-        elif title:
-            if title not in by_title:
-                by_title[title] = []
-            by_title[title].append(anime)
-        else:
-            no_mal_no_title.append(anime)
-
-    print(f"\n  Grouped by MAL ID: {len(by_mal_id)} unique IDs")
-    print(f"  Grouped by title: {len(by_title)} unique titles")
-    print(f"  No MAL ID or title: {len(no_mal_no_title)} entries")
-
-    # Check for title groups that match MAL groups - remove them from title groups
-    mal_titles = set()
-    for entries in by_mal_id.values():
-        for entry in entries:
-            mal_titles.add(normalize_title(entry.get("title", "")))
-
-    # Remove title groups that are already covered by MAL
-    titles_to_remove = []
-    for title in by_title:
-        if title in mal_titles:
-            titles_to_remove.append(title)
-
-    for title in titles_to_remove:
-        del by_title[title]
-
-    print(f"  Title groups after MAL overlap removal: {len(by_title)}")
-
-    # Merge each group
-    deduplicated = []
-
-    print("\n  Merging MAL ID groups...")
-    for mal_id, entries in tqdm(by_mal_id.items(), desc="MAL groups"):
-        if len(entries) > 1:
-            merged = merge_anime_entries(entries)
-            deduplicated.append(merged)
-        else:
-            deduplicated.append(entries[0])
-
-    print("  Merging title groups...")
-    for title, entries in tqdm(by_title.items(), desc="Title groups"):
-        if len(entries) > 1:
-            merged = merge_anime_entries(entries)
-            deduplicated.append(merged)
-        else:
-            deduplicated.append(entries[0])
-
-    # Add entries with no MAL ID or title (can't dedupe these)
-    deduplicated.extend(no_mal_no_title)
-
-    return deduplicated
+    entries = [
+        entry if isinstance(entry, AnimeRecord) else AnimeRecord(entry)
+        for entry in tqdm(all_anime, desc="Reading entries")
+    ]
+    return deduplicate(
+        entries,
+        fuzzy_threshold=fuzzy_threshold,
+        fuzzy_report=fuzzy_report,
+        merge_processes=merge_processes,
+    )
 
 
-def main():
+def main(
+    workers: int = DEFAULT_WORKERS,
+    resume: bool = False,
+    compress: bool = False,
+    snapshot: Path = SPILL_PATH,
+    reuse_snapshot: bool = False,
+    parallel_export: bool = False,
+    sync: bool = False,
+    fuzzy_threshold: float | None = None,
+    fuzzy_report: Path = FUZZY_REPORT_PATH,
+    merge_processes: int = 1,
+):
     """Main migration function."""
     global DRY_RUN
 
@@ -391,18 +193,67 @@ def main():
     if DRY_RUN:
         print("\n*** DRY RUN MODE - No changes will be made ***\n")
 
-    # Step 1: Fetch all anime
-    try:
-        all_anime = fetch_all_anime()
-    except Exception as e:
-        print(f"\nError fetching anime: {e}")
+    journal = UploadJournal("deduplicate_anime")
+
+    if resume:
+        if not journal.has_unfinished_run():
+            print("\nNothing to resume: no interrupted upload in the journal.")
+            return
+
+        if not journal.is_cleared():
+            # The last run stopped during the clear, before inserting anything
+            print("\nThe interrupted run never finished clearing; clearing again")
+            try:
+                clear_all_data()
+            except Exception as e:
+                print(f"\nError clearing data: {e}")
+                return
+            journal.mark_cleared()
+
+        total, acked = journal.counts()
+        print(f"\nResuming upload: {acked}/{total} entries already acknowledged")
+        imported, failed = insert_deduplicated_anime(
+            journal, workers=workers, compress=compress
+        )
+        total, acked = journal.counts()
+
+        print("\n" + "=" * 60)
+        print("RESUME COMPLETE")
+        print("=" * 60)
+        print(f"  Successfully imported: {imported}")
+        print(f"  Failed imports: {failed}")
+        print(f"  Acknowledged: {acked}/{total}")
         return
 
-    original_count = len(all_anime)
+    # Step 1: Fetch all anime (or reuse the last snapshot). A column file
+    # snapshot is fetched as JSONL first, then converted.
+    columnar = snapshot.suffix == COLUMN_SUFFIX
+    spill_path = snapshot.with_suffix(".jsonl") if columnar else snapshot
+
+    if reuse_snapshot and snapshot.exists():
+        print(f"Reusing snapshot: {snapshot}")
+        original_count = count_snapshot(snapshot)
+    else:
+        try:
+            if parallel_export:
+                original_count = export_partitioned(spill_path, workers=workers)
+            else:
+                original_count = fetch_all_anime(spill_path)
+        except Exception as e:
+            print(f"\nError fetching anime: {e}")
+            return
+
+        if columnar:
+            write_columns(snapshot, iter_spill(spill_path))
+            spill_path.unlink()
+            print(f"  Converted snapshot to column file: {snapshot}")
+
     print(f"\nOriginal anime count: {original_count}")
 
     # Step 2: Deduplicate
-    deduplicated = deduplicate_anime(all_anime)
+    deduplicated = deduplicate_anime(
+        iter_snapshot(snapshot), fuzzy_threshold, fuzzy_report, merge_processes
+    )
     new_count = len(deduplicated)
 
     print(f"\nDeduplicated anime count: {new_count}")
@@ -422,23 +273,37 @@ def main():
             print(f"  Tags: {len(sample.get('tags', []))}")
         return
 
+    if sync:
+        # Only send what changed; nothing is cleared
+        stats = sync_anime(deduplicated, workers=workers, compress=compress)
+        print_sync_report(stats)
+        return
+
+    # Persist the payload first so a crash after clearing can be resumed; the
+    # run only becomes uploadable once the clear has finished
+    journal.begin("/anime/bulk-insert", deduplicated, requires_clear=True)
+
     # Step 3: Clear all data
     print("\n" + "=" * 60)
     print("CLEARING DATABASE")
     print("=" * 60)
 
     try:
-        clear_result = clear_all_data()
+        clear_all_data()
     except Exception as e:
         print(f"\nError clearing data: {e}")
+        print("Run with --resume to clear again and insert.")
         return
+    journal.mark_cleared()
 
     # Step 4: Insert deduplicated entries
     print("\n" + "=" * 60)
     print("INSERTING DEDUPLICATED ENTRIES")
     print("=" * 60)
 
-    imported, failed = insert_deduplicated_anime(deduplicated)
+    imported, failed = insert_deduplicated_anime(
+        journal, workers=workers, compress=compress
+    )
 
     # Final report
     print("\n" + "=" * 60)
@@ -454,4 +319,80 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"bulk-insert requests in flight (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="re-send only the batches of the last interrupted run that were never acknowledged",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="send gzip-compressed request bodies",
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=Path,
+        default=SPILL_PATH,
+        help=f"JSONL file the export is streamed into (default: {SPILL_PATH}); "
+        f"a *{COLUMN_SUFFIX} path keeps it as a column file (anime_columns.py)",
+    )
+    parser.add_argument(
+        "--reuse-snapshot",
+        action="store_true",
+        help="dedupe the existing snapshot instead of downloading /anime/all again",
+    )
+    parser.add_argument(
+        "--parallel-export",
+        action="store_true",
+        help="download the export as --workers concurrent _creationTime partitions",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="send only inserts, updates and deletes against the remote content hashes instead of a full upload",
+    )
+    parser.add_argument(
+        "--fuzzy-threshold",
+        type=float,
+        default=None,
+        help="also merge near-identical titles with 3-gram similarity at or above this value (e.g. 0.9)",
+    )
+    parser.add_argument(
+        "--fuzzy-report",
+        type=Path,
+        default=FUZZY_REPORT_PATH,
+        help=f"JSONL report of fuzzy merges (default: {FUZZY_REPORT_PATH})",
+    )
+    parser.add_argument(
+        "--merge-processes",
+        type=int,
+        default=1,
+        help=f"merge clusters in this many worker processes (this machine has {DEFAULT_PROCESSES})",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=CONVEX_URL,
+        help=f"Convex HTTP actions URL (default: $CONVEX_SITE_URL or {CONVEX_URL})",
+    )
+    args = parser.parse_args()
+    set_base_url(args.base_url)
+
+    main(
+        workers=args.workers,
+        resume=args.resume,
+        compress=args.gzip,
+        snapshot=args.snapshot,
+        reuse_snapshot=args.reuse_snapshot,
+        parallel_export=args.parallel_export,
+        sync=args.sync,
+        fuzzy_threshold=args.fuzzy_threshold,
+        fuzzy_report=args.fuzzy_report,
+        merge_processes=args.merge_processes,
+    )
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Cross-source entity resolution for the dedupe scripts.
+
+Entries are clustered with a union-find (disjoint set) structure over an
+inverted index of their identifying keys:
+
+- MAL id (malId field or a myanimelist.net source URL)
+- every source URL, so entries sharing an AniDB, AniList, Kitsu, ... page
+  are merged even without a MAL id
+- normalized title
+- title <-> synonym: an entry listing another entry's title among its
+  synonyms
+
+Each key links all entries that carry it, so the whole pass is near-linear
+in the number of keys. Two clusters with different MAL ids are never
+merged, which keeps e.g. a 1999 series and its 2011 remake apart even when
+they share a title.
+
+With a fuzzy threshold, near-identical titles found by fuzzy_match.py are
+linked as well, and every merge that stage proposes is written to a report.
+"""
+
+import json
+from pathlib import Path
+from typing import Any
+from tqdm import tqdm
+
+from fuzzy_match import find_similar_pairs, strong_normalize
+from source_ids import extract_source_ids
+
+FUZZY_REPORT_PATH = Path("fuzzy_merges.jsonl")
+
+
+def normalize_title(title: str) -> str:
+    """Normalize title for comparison."""
+    return title.lower().strip()
+
+
+class DisjointSet:
+    """
+    Union-find over entry indices with path halving and union by size.
+
+    Each root remembers the MAL id of its cluster (if any); union() refuses
+    to join two clusters with different MAL ids.
+    """
+
+    def __init__(self, mal_ids: list[str | None]):
+        self.parent = list(range(len(mal_ids)))
+        self.size = [1] * len(mal_ids)
+        self.mal_id = list(mal_ids)
+        self.conflicts = 0
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> bool:
+        """Join the clusters of a and b. Returns False if they conflict."""
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return True
+        mal_a = self.mal_id[a]
+        mal_b = self.mal_id[b]
+        if mal_a and mal_b and mal_a != mal_b:
+            self.conflicts += 1
+            return False
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        self.mal_id[a] = mal_a or mal_b
+        return True
+
+
+def entry_mal_id(entry: dict[str, Any]) -> str | None:
+    """MAL id of an entry (precomputed malId field, else from its sources)."""
+    return entry.get("malId") or extract_source_ids(entry.get("sources", []))[0]
+
+
+def link_fuzzy_titles(
+    entries: list[dict[str, Any]],
+    dsu: DisjointSet,
+    threshold: float,
+    report_path: Path = FUZZY_REPORT_PATH,
+):
+    """
+    Union entries whose titles are equal after strong normalization or
+    similar above `threshold`, and write each proposed merge to a JSONL
+    report (titles, similarity, and whether it was applied or blocked by a
+    MAL id conflict).
+    """
+    # One representative entry per strongly normalized title
+    first_with_title: dict[str, int] = {}
+    proposals = []
+    for idx, entry in enumerate(entries):
+        title = strong_normalize(entry.get("title") or "")
+        if not title:
+            continue
+        first = first_with_title.setdefault(title, idx)
+        if first != idx:
+            proposals.append((first, idx, 1.0))
+
+    titles = list(first_with_title)
+    representatives = list(first_with_title.values())
+    for i, j, similarity in find_similar_pairs(titles, threshold):
+        proposals.append((representatives[i], representatives[j], similarity))
+
+    applied = 0
+    with open(report_path, "w", encoding="utf-8") as report:
+        for a, b, similarity in proposals:
+            if dsu.find(a) == dsu.find(b):
+                continue
+            merged = dsu.union(a, b)
+            applied += merged
+            record = {
+                "title": entries[a].get("title"),
+                "matched": entries[b].get("title"),
+                "similarity": round(similarity, 3),
+                "merged": merged,
+            }
+            report.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    print(f"  Fuzzy title merges: {applied} (report: {report_path})")
+
+
+def resolve_clusters(
+    entries: list[dict[str, Any]],
+    fuzzy_threshold: float | None = None,
+    fuzzy_report: Path = FUZZY_REPORT_PATH,
+) -> list[list[dict[str, Any]]]:
+    """
+    Cluster entries that describe the same show.
+
+    Returns the clusters in order of their first member, each listing its
+    entries in input order, so the result is deterministic for a given input.
+    Pass fuzzy_threshold (0-1) to also merge near-identical titles.
+    """
+    dsu = DisjointSet([entry_mal_id(entry) for entry in entries])
+
+    # Inverted index: key -> first entry that carried it. Every later entry
+    # with the same key is unioned with that one.
+    first_with_key: dict[tuple[str, str], int] = {}
+
+    def link(key: tuple[str, str], idx: int):
+        first = first_with_key.setdefault(key, idx)
+        if first != idx:
+            dsu.union(first, idx)
+
+    # Strong keys first, so MAL ids are attached to clusters before the
+    # weaker title links are considered
+    for idx, entry in enumerate(tqdm(entries, desc="Indexing sources")):
+        mal_id = dsu.mal_id[idx]
+        if mal_id:
+            link(("mal", mal_id), idx)
+        for source in entry.get("sources", []):
+            link(("source", source), idx)
+
+    for idx, entry in enumerate(tqdm(entries, desc="Indexing titles")):
+        title = normalize_title(entry.get("title") or "")
+        if title:
+            link(("title", title), idx)
+
+    for idx, entry in enumerate(tqdm(entries, desc="Indexing synonyms")):
+        for synonym in entry.get("synonyms", []):
+            other = first_with_key.get(("title", normalize_title(synonym)))
+            if other is not None and other != idx:
+                dsu.union(other, idx)
+
+    if fuzzy_threshold is not None:
+        link_fuzzy_titles(entries, dsu, fuzzy_threshold, fuzzy_report)
+
+    clusters: dict[int, list[dict[str, Any]]] = {}
+    for idx, entry in enumerate(entries):
+        clusters.setdefault(dsu.find(idx), []).append(entry)
+
+    merged = sum(1 for members in clusters.values() if len(members) > 1)
+    print(f"\n  Clusters: {len(clusters)} ({merged} with more than one entry)")
+    print(f"  Merges blocked by conflicting MAL ids: {dsu.conflicts}")
+
+    return list(clusters.values())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate title detection for the dedupe scripts.
+
+Titles are first normalized harder than normalize_title() (accents,
+punctuation and repeated whitespace removed), which already catches
+"Shingeki no Kyojin: Season 2" vs "Shingeki no Kyojin Season 2". Remaining
+near-duplicates are found by Jaccard similarity of character 3-gram sets.
+
+Comparing every pair would be quadratic, so candidates come from a blocking
+index: each title's 3-grams are ordered rarest first and only the first
+len - ceil(threshold * len) + 1 of them are indexed (prefix filtering). Two
+titles can only reach the threshold if they share one of those grams, so
+the index yields every qualifying pair while scoring only a small fraction.
+
+Titles whose numbers differ ("Season 2" / "Season 3", "Part II" /
+"Part III") are never matched, however similar the rest is.
+"""
+
+import math
+import re
+import unicodedata
+
+DEFAULT_THRESHOLD = 0.9
+MIN_LENGTH = 6  # shorter titles are too ambiguous to match fuzzily
+NGRAM = 3
+
+NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+NUMBER_RE = re.compile(r"\b(?:\d+|i{1,3}|iv|v|vi{1,3}|ix|x)\b")
+
+
+def strong_normalize(title: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    decomposed = unicodedata.normalize("NFKD", title.lower())
+    ascii_only = decomposed.encode("ascii", "ignore").decode("ascii")
+    return NON_ALNUM_RE.sub(" ", ascii_only).strip()
+
+
+def ngrams(text: str) -> set[str]:
+    padded = f" {text} "
+    return {padded[i : i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+def numbers(text: str) -> tuple[str, ...]:
+    return tuple(NUMBER_RE.findall(text))
+
+
+def find_similar_pairs(
+    titles: list[str], threshold: float = DEFAULT_THRESHOLD
+) -> list[tuple[int, int, float]]:
+    """
+    Return (i, j, similarity) for every pair of strongly normalized `titles`
+    with 3-gram Jaccard similarity >= threshold (i < j).
+    """
+    grams = [ngrams(title) if len(title) >= MIN_LENGTH else set() for title in titles]
+    number_keys = [numbers(title) for title in titles]
+
+    frequency: dict[str, int] = {}
+    for gram_set in grams:
+        for gram in gram_set:
+            frequency[gram] = frequency.get(gram, 0) + 1
+
+    # Visit titles shortest first so each one only needs to be compared with
+    # already-indexed titles no longer than itself. Buckets then fill in size
+    # order, and entries too short for the current title are too short for
+    # every later one, so each bucket keeps a start offset past them. Index
+    # keys include the title's numbers, so titles that differ in them never
+    # become candidates.
+    order = sorted(range(len(titles)), key=lambda i: len(grams[i]))
+    index: dict[tuple[tuple[str, ...], str], list[int]] = {}
+    starts: dict[tuple[tuple[str, ...], str], int] = {}
+    pairs = []
+
+    for j in order:
+        gram_set = grams[j]
+        size = len(gram_set)
+        if not size:
+            continue
+        prefix = sorted(gram_set, key=lambda g: (frequency[g], g))
+        prefix = prefix[: size - math.ceil(threshold * size) + 1]
+        min_size = threshold * size
+        number_key = number_keys[j]
+
+        candidates = set()
+        for gram in prefix:
+            key = (number_key, gram)
+            bucket = index.setdefault(key, [])
+            start = starts.get(key, 0)
+            while start < len(bucket) and len(grams[bucket[start]]) < min_size:
+                start += 1
+            starts[key] = start
+            candidates.update(bucket[start:])
+            bucket.append(j)
+
+        for i in candidates:
+            other = grams[i]
+            common = len(gram_set & other)
+            similarity = common / (size + len(other) - common)
+            if similarity >= threshold:
+                pairs.append((min(i, j), max(i, j), similarity))
+
+    pairs.sort()
+    return pairs
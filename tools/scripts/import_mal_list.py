@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Import a scraped MAL anime list into a user's watched / favorite anime.
+
+Reads the JSON Lines written by `scraper.py ... --jsonl` (one list item per
+line, with its MAL `anime_id`, `status` and `score`) and posts the entries
+in large batches to /userAnime/import-mal. The server resolves each batch
+against the anime `by_malId` index and inserts or patches the user's
+userAnime rows in one mutation, so a 2,000-entry history is a handful of
+requests instead of one lookup and one mutation per title.
+
+Batches are built from the entries sorted by MAL id and keyed by a hash of
+their content, so re-sending a batch (a retry, or re-running the same
+import) replays the stored result instead of writing again. Pass a new
+--import-id to apply the same list afresh.
+
+The action writes to any user, so it requires the deployment's
+MAL_IMPORT_SECRET, taken from the environment or --secret.
+
+Usage:
+    python ../mal-scraper/scraper.py BarJsX anime 7 --jsonl > list.jsonl
+    MAL_IMPORT_SECRET=... python import_mal_list.py list.jsonl \
+        --user-id <userId> --favorite-score 9
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Iterator, TextIO
+
+from convex_client import CONVEX_URL, set_base_url
+from upload_engine import DEFAULT_WORKERS, upload_batches
+
+IMPORT_PATH = "/userAnime/import-mal"
+BATCH_SIZE = 500  # entries per importMalBatch mutation
+COMPLETED = 2  # MAL list status code
+
+
+def iter_jsonl(streams: Iterable[TextIO]) -> Iterator[dict]:
+    for stream in streams:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def collect_entries(
+    items: Iterable[dict],
+    watched_statuses: set[int],
+    favorite_score: int | None,
+    username: str | None,
+    stats: Counter,
+) -> list[dict]:
+    """
+    Turn list items into {malId, isWatched, isFavorite} entries, one per
+    MAL id (flags of repeated ids are merged), sorted by MAL id. Items that
+    set neither flag, manga items and other users' items are dropped.
+
+    Without `username`, the items must all come from one MAL user; mixing
+    lists (scraper --batch output) raises ValueError.
+    """
+    entries: dict[str, dict] = {}
+    seen_user = None
+    for item in items:
+        stats["read"] += 1
+        if username is not None and item.get("username") != username:
+            stats["other user"] += 1
+            continue
+        if username is None and item.get("username") is not None:
+            if seen_user is None:
+                seen_user = item["username"]
+            elif item["username"] != seen_user:
+                raise ValueError(
+                    f"Items of several MAL users ({seen_user}, {item['username']}); "
+                    "pick one with --username"
+                )
+        if item.get("anime_id") is None:
+            stats["not anime"] += 1
+            continue
+        is_watched = item.get("status") in watched_statuses
+        score = item.get("score") or 0
+        is_favorite = favorite_score is not None and score >= favorite_score
+        if not (is_watched or is_favorite):
+            stats["no flag"] += 1
+            continue
+        mal_id = str(item["anime_id"])
+        entry = entries.setdefault(
+            mal_id, {"malId": mal_id, "isWatched": False, "isFavorite": False}
+        )
+        entry["isWatched"] |= is_watched
+        entry["isFavorite"] |= is_favorite
+    return sorted(entries.values(), key=lambda entry: int(entry["malId"]))
+
+
+def batch_key(user_id: str, import_id: str, batch: list[dict]) -> str:
+    """Idempotency key of a batch: a hash of its content for this import."""
+    digest = hashlib.sha256(f"{user_id}\0{import_id}\0".encode("utf-8"))
+    digest.update(json.dumps(batch, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def main(
+    paths: list[Path],
+    user_id: str,
+    secret: str,
+    watched_statuses: set[int],
+    favorite_score: int | None = None,
+    username: str | None = None,
+    import_id: str = "",
+    batch_size: int = BATCH_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    compress: bool = False,
+):
+    stats: Counter = Counter()
+    with contextlib.ExitStack() as stack:
+        files = [stack.enter_context(open(path, encoding="utf-8")) for path in paths]
+        try:
+            entries = collect_entries(
+                iter_jsonl(files or [sys.stdin]),
+                watched_statuses,
+                favorite_score,
+                username,
+                stats,
+            )
+        except ValueError as e:
+            print(e)
+            return
+
+    print(f"Read {stats['read']} list items -> {len(entries)} anime to import")
+    for reason in ("other user", "not anime", "no flag"):
+        if stats[reason]:
+            print(f"  Dropped ({reason}): {stats[reason]}")
+    if not entries:
+        return
+
+    batches = [entries[i : i + batch_size] for i in range(0, len(entries), batch_size)]
+    totals: Counter = Counter()
+    not_found: list[str] = []
+
+    def on_result(batch_num: int, batch: list[dict], result: dict):
+        if not result.get("success"):
+            return
+        for field in ("inserted", "updated", "skipped"):
+            totals[field] += result.get(field, 0)
+        totals["replayed"] += result.get("replayed", False)
+        not_found.extend(result.get("notFound", []))
+
+    _, failed = upload_batches(
+        IMPORT_PATH,
+        batches,
+        workers=workers,
+        total=len(batches),
+        desc="Importing",
+        on_result=on_result,
+        compress=compress,
+        headers={"Authorization": f"Bearer {secret}"},
+        payload=lambda batch: {
+            "userId": user_id,
+            "key": batch_key(user_id, import_id, batch),
+            "items": batch,
+        },
+    )
+
+    print(f"\nRequests: {len(batches)} batches of up to {batch_size}")
+    if totals["replayed"]:
+        print(f"  Already imported (replayed): {totals['replayed']} batches")
+    print(f"  Inserted: {totals['inserted']}")
+    print(f"  Updated: {totals['updated']}")
+    print(f"  Unchanged: {totals['skipped']}")
+    print(f"  Not in the anime table: {len(not_found)}")
+    print(f"  Failed: {failed}")
+    if not_found:
+        print(f"  Unresolved MAL ids: {', '.join(not_found[:20])}", end="")
+        print(" ..." if len(not_found) > 20 else "")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "jsonl",
+        nargs="*",
+        type=Path,
+        help="scraper.py --jsonl output (default: stdin)",
+    )
+    parser.add_argument("--user-id", required=True, help="Convex user id to import for")
+    parser.add_argument(
+        "--secret",
+        default=os.environ.get("MAL_IMPORT_SECRET"),
+        help="MAL_IMPORT_SECRET of the deployment (default: $MAL_IMPORT_SECRET)",
+    )
+    parser.add_argument(
+        "--username",
+        default=None,
+        help="only import items of this MAL user (for scraper --batch output)",
+    )
+    parser.add_argument(
+        "--watched-status",
+        type=int,
+        action="append",
+        default=None,
+        help=f"MAL status counted as watched, repeatable (default: {COMPLETED})",
+    )
+    parser.add_argument(
+        "--favorite-score",
+        type=int,
+        default=None,
+        help="mark entries scored at least this as favorites (default: none)",
+    )
+    parser.add_argument(
+        "--import-id",
+        default="",
+        help="salt for the idempotency keys; change it to re-apply an imported list",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help=f"entries per request (default: {BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"import requests in flight (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="send gzip-compressed request bodies",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=CONVEX_URL,
+        help=f"Convex HTTP actions URL (default: $CONVEX_SITE_URL or {CONVEX_URL})",
+    )
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error("--secret or $MAL_IMPORT_SECRET is required")
+    set_base_url(args.base_url)
+
+    main(
+        paths=args.jsonl,
+        user_id=args.user_id,
+        secret=args.secret,
+        watched_statuses=set(args.watched_status or [COMPLETED]),
+        favorite_score=args.favorite_score,
+        username=args.username,
+        import_id=args.import_id,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        compress=args.gzip,
+    )
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Incremental reader for large JSON documents such as newanimedb.json.
+
+iter_array_items() walks the top-level object of a file and yields the items
+of one array member (e.g. "data") one at a time, decoding each with the C
+scanner behind json.JSONDecoder.raw_decode(). Only the current read chunk
+and the item being decoded are held in memory, so the cost no longer grows
+with the size of the document.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Iterator, TextIO
+
+CHUNK_SIZE = 1 << 20  # characters per read
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+# Characters that can continue a JSON number (12 -> 12.5, 1 -> 1e3)
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+class _Reader:
+    """A window over a text file that decodes JSON values from it."""
+
+    def __init__(self, f: TextIO, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Read another chunk, dropping what was consumed. False at EOF."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character (without consuming it), "" at EOF."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        """Consume one of `chars` (after whitespace) and return it."""
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else "end of file"
+            raise ValueError(f"Expected one of {chars!r} in JSON, found {found}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decode the next JSON value, reading more input as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A top-level number cut off by the chunk boundary decodes as its
+            # prefix ("12." -> 12): until a delimiter follows it, read on
+            if (
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                and all(char in _NUMBER_CHARS for char in self.buffer[end:])
+                and self._fill()
+            ):
+                continue
+            self.pos = end
+            return value
+
+
+def iter_array_items(
+    f: TextIO, key: str, chunk_size: int = CHUNK_SIZE
+) -> Iterator[Any]:
+    """
+    Yield the items of the array stored under `key` in the top-level JSON
+    object read from `f`, one at a time. Other members are decoded and
+    skipped. Raises ValueError if the document is not an object or has no
+    such array.
+    """
+    reader = _Reader(f, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        raise ValueError(f"JSON object has no {key!r} member")
+
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key:
+            reader.expect("[")
+            if reader.peek() == "]":
+                return
+            while True:
+                yield reader.value()
+                if reader.expect(",]") == "]":
+                    return
+        reader.value()
+        if reader.expect(",}") == "}":
+            raise ValueError(f"JSON object has no {key!r} member")
+
+
+def iter_json_array(path: Path, key: str = "data") -> Iterator[Any]:
+    """iter_array_items() over a UTF-8 file."""
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_array_items(f, key)
@@ -2,16 +2,57 @@
 """
 Convert anime-offline-database.jsonl to SQLite database.
 Creates indexes on title, type, and year for faster querying.
+
+The file is streamed once: entries are parsed lazily and inserted with
+executemany() in chunks inside a single transaction. Progress is tracked by
+bytes read rather than by pre-counting lines.
+
+MAL/AniDB/AniList ids and the source priority used by the dedupe step are
+computed here once per row and stored as indexed columns.
+
+Lines that are not JSON objects of the expected shape (see load_entry()) are
+skipped and counted instead of aborting the import.
+
+With --normalized the entries are written to the relational layout in
+anime_db.py (real season/year/duration/score columns plus indexed side tables
+for sources, synonyms, studios, producers, related anime and tags) instead
+of the JSON-text `anime` table.
 """
 
+import argparse
 import json
 import sqlite3
 from pathlib import Path
 from tqdm import tqdm
 
+from anime_db import (
+    create_normalized_indexes,
+    create_normalized_tables,
+    create_source_id_indexes,
+    ensure_source_id_columns,
+    insert_normalized,
+    next_entry_id,
+)
+from source_ids import extract_source_ids, source_priority
+
 # Paths
 JSONL_PATH = Path("/home/koushikk/Downloads/anime-offline-database.jsonl")
 DB_PATH = Path("anime.db")
+CHUNK_SIZE = 2000
+
+# Shape checked by load_entry() before a row reaches executemany()
+LIST_FIELDS = ("sources", "synonyms", "studios", "producers", "relatedAnime", "tags")
+OBJECT_FIELDS = ("animeSeason", "duration", "score")
+
+INSERT_SQL = """
+    INSERT INTO anime
+    (title, type, episodes, status, anime_season, picture, thumbnail,
+     duration, score, sources, synonyms, studios, producers, related_anime, tags,
+     mal_id, anidb_id, anilist_id, source_priority)
+    VALUES (:title, :type, :episodes, :status, :anime_season, :picture, :thumbnail,
+            :duration, :score, :sources, :synonyms, :studios, :producers,
+            :related_anime, :tags, :mal_id, :anidb_id, :anilist_id, :source_priority)
+"""
 
 
 def create_table(conn):
@@ -35,11 +76,26 @@ def create_table(conn):
             studios TEXT,  -- JSON array of strings
             producers TEXT,  -- JSON array of strings
             related_anime TEXT,  -- JSON array of URLs
-            tags TEXT  -- JSON array of strings
+            tags TEXT,  -- JSON array of strings
+            mal_id TEXT,  -- derived from sources at ingest time
+            anidb_id TEXT,
+            anilist_id TEXT,
+            source_priority INTEGER  -- 3=MAL, 2=AniDB, 1=AniList, 0=other
         )
     """)
 
-    # Create indexes on frequently queried fields
+    conn.commit()
+    ensure_source_id_columns(conn, "anime")
+
+
+def create_indexes(conn):
+    """Create indexes on frequently queried fields.
+
+    Called after the bulk load so SQLite builds each index once instead of
+    updating it on every insert.
+    """
+    cursor = conn.cursor()
+
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_title ON anime(title)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_type ON anime(type)")
     cursor.execute(
@@ -47,11 +103,37 @@ def create_table(conn):
     )
 
     conn.commit()
+    create_source_id_indexes(conn, "anime")
+
+
+def load_entry(line) -> dict:
+    """
+    Decode one JSONL line into an entry dict, checking the fields both insert
+    paths rely on: an object with a string title, list fields that are lists
+    of strings, and object fields that are objects (or null). Raises
+    ValueError otherwise.
+    """
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+    if not isinstance(data.get("title"), str):
+        raise ValueError("'title' is missing or not a string")
+    for field in LIST_FIELDS:
+        value = data.get(field, [])
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise ValueError(f"'{field}' is not a list of strings")
+    for field in OBJECT_FIELDS:
+        value = data.get(field)
+        if value is not None and not isinstance(value, dict):
+            raise ValueError(f"'{field}' is not an object")
+    return data
 
 
 def parse_anime_entry(line):
     """Parse a single anime entry from JSON."""
-    data = json.loads(line)
+    data = load_entry(line)
+    sources = data.get("sources", [])
+    mal_id, anidb_id, anilist_id = extract_source_ids(sources)
 
     return {
         "title": data.get("title", ""),
@@ -69,96 +151,146 @@ def parse_anime_entry(line):
         "producers": json.dumps(data.get("producers", [])),
         "related_anime": json.dumps(data.get("relatedAnime", [])),
         "tags": json.dumps(data.get("tags", [])),
+        "mal_id": mal_id,
+        "anidb_id": anidb_id,
+        "anilist_id": anilist_id,
+        "source_priority": source_priority(sources),
     }
 
 
-def import_jsonl_to_sqlite():
-    """Main function to import JSONL to SQLite."""
+def iter_jsonl_entries(f, stats: dict, progress=None, parse=parse_anime_entry):
+    """
+    Yield parsed entries from an open (binary) JSONL file, one line at a time.
+
+    The first line (metadata) must already have been consumed. Blank lines
+    and lines `parse` rejects with ValueError (invalid JSON, or an entry
+    load_entry() refuses) are counted in stats["skipped"], so a bad row never
+    reaches the insert chunk. If a progress bar is
+    given it is advanced by the number of bytes read, so no separate
+    line-counting pass over the file is needed. `parse` turns one line into
+    whatever the insert step expects.
+    """
+    for line in f:
+        if progress is not None:
+            progress.update(len(line))
+
+        line = line.strip()
+        if not line:
+            stats["skipped"] += 1
+            continue
+
+        try:
+            entry = parse(line)
+        except ValueError as e:
+            print(f"\nSkipping malformed entry: {e}")
+            stats["skipped"] += 1
+            continue
+        yield entry
+
+
+def iter_chunks(iterable, size: int):
+    """Group an iterable into lists of at most `size` items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def apply_bulk_pragmas(conn):
+    """Trade durability for speed while the database is being (re)built."""
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -65536")  # 64 MiB
+
+
+def restore_pragmas(conn):
+    """Return to the default rollback journal once the load is done."""
+    conn.execute("PRAGMA synchronous = FULL")
+    conn.execute("PRAGMA journal_mode = DELETE")
+
+
+def import_jsonl_to_sqlite(chunk_size: int = CHUNK_SIZE, normalized: bool = False):
+    """
+    Main function to import JSONL to SQLite.
+
+    Streams the file once and inserts rows through executemany() in chunks of
+    `chunk_size`, all inside a single transaction.
+    """
     print(f"Importing from: {JSONL_PATH}")
     print(f"Creating database: {DB_PATH}")
 
-    # Count total lines (excluding first metadata line)
-    print("Counting entries...")
-    with open(JSONL_PATH, "r", encoding="utf-8") as f:
-        total_lines = sum(1 for _ in f)
-    total_entries = total_lines - 1  # Subtract metadata line
-    print(f"Found {total_entries} anime entries to import")
+    total_bytes = JSONL_PATH.stat().st_size
 
     # Create database and table
     conn = sqlite3.connect(DB_PATH)
-    create_table(conn)
+    apply_bulk_pragmas(conn)
+    if normalized:
+        create_normalized_tables(conn)
+        next_id = next_entry_id(conn)
+    else:
+        create_table(conn)
     cursor = conn.cursor()
 
     # Import data
     imported_count = 0
-    skipped_count = 0
+    stats = {"skipped": 0}
 
-    with open(JSONL_PATH, "r", encoding="utf-8") as f:
+    with (
+        open(JSONL_PATH, "rb") as f,
+        tqdm(
+            total=total_bytes, unit="B", unit_scale=True, desc="Importing anime"
+        ) as progress,
+    ):
         # Skip first line (metadata)
-        next(f)
-
-        # Process remaining lines with progress bar
-        for line in tqdm(f, total=total_entries, desc="Importing anime"):
-            line = line.strip()
-            if not line:
-                skipped_count += 1
-                continue
-
-            try:
-                entry = parse_anime_entry(line)
-                cursor.execute(
-                    """
-                    INSERT INTO anime 
-                    (title, type, episodes, status, anime_season, picture, thumbnail, 
-                     duration, score, sources, synonyms, studios, producers, related_anime, tags)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        entry["title"],
-                        entry["type"],
-                        entry["episodes"],
-                        entry["status"],
-                        entry["anime_season"],
-                        entry["picture"],
-                        entry["thumbnail"],
-                        entry["duration"],
-                        entry["score"],
-                        entry["sources"],
-                        entry["synonyms"],
-                        entry["studios"],
-                        entry["producers"],
-                        entry["related_anime"],
-                        entry["tags"],
-                    ),
-                )
-                imported_count += 1
-
-                # Commit every 1000 entries for performance
-                if imported_count % 1000 == 0:
-                    conn.commit()
-
-            except json.JSONDecodeError as e:
-                print(f"\nError parsing JSON: {e}")
-                skipped_count += 1
-            except Exception as e:
-                print(f"\nError importing entry: {e}")
-                skipped_count += 1
-
-    # Final commit
-    conn.commit()
+        progress.update(len(next(f)))
+
+        entries = iter_jsonl_entries(
+            f, stats, progress, parse=load_entry if normalized else parse_anime_entry
+        )
+
+        cursor.execute("BEGIN")
+        try:
+            for chunk in iter_chunks(entries, chunk_size):
+                if normalized:
+                    next_id = insert_normalized(conn, chunk, next_id)
+                else:
+                    cursor.executemany(INSERT_SQL, chunk)
+                imported_count += len(chunk)
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    print("Building indexes...")
+    if normalized:
+        create_normalized_indexes(conn)
+    else:
+        create_indexes(conn)
+    restore_pragmas(conn)
 
     # Verify import
-    cursor.execute("SELECT COUNT(*) FROM anime")
+    table = "anime_entry" if normalized else "anime"
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
     db_count = cursor.fetchone()[0]
 
     print(f"\n✅ Import complete!")
     print(f"   Imported: {imported_count} entries")
-    print(f"   Skipped: {skipped_count} entries")
+    print(f"   Skipped: {stats['skipped']} entries")
     print(f"   Total in database: {db_count} entries")
 
     # Sample query to verify data
     print("\n📊 Sample entries:")
-    cursor.execute("SELECT title, type, anime_season FROM anime LIMIT 3")
+    if normalized:
+        cursor.execute(
+            "SELECT title, type, season || ' ' || year FROM anime_entry LIMIT 3"
+        )
+    else:
+        cursor.execute("SELECT title, type, anime_season FROM anime LIMIT 3")
     for row in cursor.fetchall():
         print(f"   - {row[0]} ({row[1]}) - {row[2]}")
 
@@ -166,4 +298,18 @@ def import_jsonl_to_sqlite():
 
 
 if __name__ == "__main__":
-    import_jsonl_to_sqlite()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help=f"rows per executemany() call (default: {CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--normalized",
+        action="store_true",
+        help="write the normalized relational layout instead of JSON-text columns",
+    )
+    args = parser.parse_args()
+
+    import_jsonl_to_sqlite(chunk_size=args.chunk_size, normalized=args.normalized)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Process-pool merge stage for the dedupe scripts.
+
+Clusters are independent, so merging them is spread over worker processes
+with a chunked map: each task carries a few hundred clusters instead of one,
+which keeps pickling and IPC overhead small next to the merge work.
+Single-entry clusters never leave the parent process. Results come back in
+cluster order, so the output is identical to a serial merge.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable
+from tqdm import tqdm
+
+DEFAULT_PROCESSES = os.cpu_count() or 1
+CHUNKS_PER_PROCESS = 4
+MAX_CHUNK_SIZE = 1000
+
+
+def merge_clusters(
+    merge: Callable[..., dict[str, Any]],
+    clusters: list[list[dict[str, Any]]],
+    *extra_args: Iterable,
+    processes: int = 1,
+) -> list[dict[str, Any]]:
+    """
+    Return merge(cluster, *extra) for every cluster with more than one
+    entry and the entry itself for singletons, in cluster order.
+
+    `merge` must be a module-level function so it can be pickled. Each of
+    `extra_args` is an iterable aligned with `clusters` whose items are
+    passed as further positional arguments. With processes=1 everything
+    runs in this process.
+    """
+    extra_columns = [list(column) for column in extra_args]
+    results: list[dict[str, Any] | None] = [None] * len(clusters)
+    multi = []
+    for idx, cluster in enumerate(clusters):
+        if len(cluster) > 1:
+            multi.append(idx)
+        else:
+            results[idx] = cluster[0]
+
+    arg_columns = [[clusters[idx] for idx in multi]]
+    arg_columns.extend([column[idx] for idx in multi] for column in extra_columns)
+
+    if processes <= 1 or len(multi) < 2:
+        merged = map(merge, *arg_columns)
+        for idx, entry in zip(multi, tqdm(merged, total=len(multi), desc="Merging")):
+            results[idx] = entry
+        return results
+
+    chunksize = max(
+        1, min(MAX_CHUNK_SIZE, len(multi) // (processes * CHUNKS_PER_PROCESS))
+    )
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        merged = pool.map(merge, *arg_columns, chunksize=chunksize)
+        for idx, entry in zip(multi, tqdm(merged, total=len(multi), desc="Merging")):
+            results[idx] = entry
+
+    return results
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Source URL helpers shared by the ingest and dedupe scripts.
+
+Priority hierarchy (higher is better):
+1. MyAnimeList (priority 3)
+2. AniDB (priority 2)
+3. AniList (priority 1)
+4. Other sources (priority 0)
+"""
+
+import re
+
+MAL_ID_RE = re.compile(r"myanimelist\.net/anime/(\d+)")
+ANIDB_ID_RE = re.compile(r"anidb\.net/anime/(\d+)")
+ANILIST_ID_RE = re.compile(r"anilist\.co/anime/(\d+)")
+
+
+def _first_match(pattern: re.Pattern, sources: list[str]) -> str | None:
+    for source in sources:
+        match = pattern.search(source)
+        if match:
+            return match[1]
+    return None
+
+
+def extract_source_ids(sources: list[str]) -> tuple[str | None, str | None, str | None]:
+    """Return (mal_id, anidb_id, anilist_id) from a sources list."""
+    return (
+        _first_match(MAL_ID_RE, sources),
+        _first_match(ANIDB_ID_RE, sources),
+        _first_match(ANILIST_ID_RE, sources),
+    )
+
+
+def source_priority(sources: list[str]) -> int:
+    """Get priority score based on sources (higher is better)."""
+    priority = 0
+    for source in sources:
+        if "myanimelist.net" in source:
+            return 3
+        elif "anidb.net" in source:
+            priority = max(priority, 2)
+        elif "anilist.co" in source:
+            priority = max(priority, 1)
+    return priority
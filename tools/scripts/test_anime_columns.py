@@ -0,0 +1,82 @@
+"""
+Column files read back every value with its type, so a .acol snapshot and
+the JSONL spill of the same catalogue give the same sync content hashes.
+
+Run from this directory: python -m pytest
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from anime_columns import ColumnFile, iter_snapshot, write_columns
+from anime_record import AnimeRecord
+from anime_spill import iter_spill
+from anime_sync import content_hash, sync_payload
+
+CATALOGUE = Path(__file__).parent / "fixtures" / "dedupe_golden.jsonl"
+
+ENTRIES = [
+    {
+        "title": "Ints",
+        "type": "TV",
+        "status": "FINISHED",
+        "episodes": 12,
+        "duration": {"value": 1440, "unit": "SECONDS"},
+        "score": {"arithmeticGeometricMean": 7, "arithmeticMean": 7, "median": 7},
+        "sources": ["https://myanimelist.net/anime/1"],
+    },
+    {
+        "title": "Floats",
+        "type": "MOVIE",
+        "status": "FINISHED",
+        "episodes": 1,
+        "duration": {"value": 5400, "unit": "SECONDS"},
+        "score": {"arithmeticGeometricMean": 7.25, "arithmeticMean": 7.5},
+        "sources": ["https://myanimelist.net/anime/2"],
+    },
+    {
+        "title": "Missing",
+        "type": "OVA",
+        "status": "UPCOMING",
+        "sources": [],
+    },
+]
+
+
+def hashes(entries) -> list[str]:
+    return [content_hash(sync_payload(entry)) for entry in entries]
+
+
+def test_mixed_int_float_columns_keep_types(tmp_path):
+    path = tmp_path / "mixed.acol"
+    write_columns(path, ENTRIES)
+
+    with ColumnFile(path) as columns:
+        scores = columns.column("score.arithmeticGeometricMean")
+        records = columns.records()
+
+    assert scores == [7, 7.25, None]
+    assert [type(value) for value in scores] == [int, float, type(None)]
+    assert [record.to_convex() for record in records] == [
+        AnimeRecord(entry).to_convex() for entry in ENTRIES
+    ]
+
+
+@pytest.fixture(params=["golden", "mixed"])
+def jsonl_snapshot(request, tmp_path) -> Path:
+    if request.param == "golden":
+        return CATALOGUE
+    path = tmp_path / "mixed.jsonl"
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in ENTRIES))
+    return path
+
+
+def test_column_snapshot_hashes_match_jsonl(jsonl_snapshot, tmp_path):
+    path = tmp_path / "catalogue.acol"
+    write_columns(path, iter_spill(jsonl_snapshot))
+
+    from_jsonl = [AnimeRecord(entry) for entry in iter_spill(jsonl_snapshot)]
+
+    assert hashes(iter_snapshot(path)) == hashes(from_jsonl)
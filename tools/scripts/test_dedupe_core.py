@@ -0,0 +1,97 @@
+"""
+Golden-output test for the two dedupe paths.
+
+deduplicate_anime.py reads the Convex export as a JSONL spill in table
+order; dedupe_and_upload.py reads SQLite grouped by MAL id and priority
+(load_anime_grouped). Both go through dedupe_core.deduplicate() and must
+produce the same clusters and the same merged entries, which are pinned in
+fixtures/dedupe_golden.expected.json.
+
+Run from this directory: python -m pytest
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+import dedupe_and_upload
+import deduplicate_anime
+from anime_db import (
+    create_normalized_indexes,
+    create_normalized_tables,
+    insert_normalized,
+    load_anime_grouped,
+)
+from anime_record import AnimeRecord
+from anime_spill import iter_spill
+from entity_resolution import resolve_clusters
+from jsonl_to_sqlite import INSERT_SQL, create_indexes, create_table, parse_anime_entry
+
+FIXTURES = Path(__file__).parent / "fixtures"
+CATALOGUE = FIXTURES / "dedupe_golden.jsonl"
+EXPECTED = FIXTURES / "dedupe_golden.expected.json"
+
+
+def build_sqlite(layout: str) -> sqlite3.Connection:
+    """The fixture catalogue ingested the way jsonl_to_sqlite.py does it."""
+    conn = sqlite3.connect(":memory:")
+    lines = CATALOGUE.read_text(encoding="utf-8").splitlines()
+    if layout == "normalized":
+        create_normalized_tables(conn)
+        insert_normalized(conn, [json.loads(line) for line in lines], 1)
+        create_normalized_indexes(conn)
+    else:
+        create_table(conn)
+        conn.executemany(INSERT_SQL, [parse_anime_entry(line) for line in lines])
+        create_indexes(conn)
+    conn.commit()
+    return conn
+
+
+def cluster_keys(clusters) -> set[frozenset]:
+    """Clusters as sets of entries, identified by their source URLs."""
+    return {frozenset(tuple(entry["sources"]) for entry in c) for c in clusters}
+
+
+def canonical(merged: list[AnimeRecord]) -> list[dict]:
+    """Merged entries as JSON, in a fixed order independent of input order."""
+    entries = [record.to_convex() for record in merged]
+    return sorted(entries, key=lambda entry: json.dumps(entry, sort_keys=True))
+
+
+@pytest.fixture(scope="module")
+def spill_entries() -> list[AnimeRecord]:
+    return [AnimeRecord(entry) for entry in iter_spill(CATALOGUE)]
+
+
+@pytest.fixture(scope="module", params=["legacy", "normalized"])
+def sqlite_groups(request):
+    conn = build_sqlite(request.param)
+    by_mal_id, without_mal_id = load_anime_grouped(conn, records=True)
+    conn.close()
+    return by_mal_id, without_mal_id
+
+
+def test_paths_produce_identical_clusters(spill_entries, sqlite_groups):
+    by_mal_id, without_mal_id = sqlite_groups
+    grouped = [entry for group in by_mal_id.values() for entry in group]
+    grouped.extend(without_mal_id)
+
+    assert cluster_keys(resolve_clusters(grouped)) == cluster_keys(
+        resolve_clusters(spill_entries)
+    )
+
+
+def test_paths_produce_identical_merged_output(spill_entries, sqlite_groups):
+    from_spill = deduplicate_anime.deduplicate_anime(spill_entries)
+    from_sqlite = dedupe_and_upload.deduplicate_anime(*sqlite_groups)
+
+    assert canonical(from_sqlite) == canonical(from_spill)
+
+
+def test_merged_output_matches_golden(spill_entries):
+    expected = json.loads(EXPECTED.read_text(encoding="utf-8"))
+
+    assert canonical(deduplicate_anime.deduplicate_anime(spill_entries)) == expected
@@ -0,0 +1,53 @@
+"""
+iter_array_items() yields the same items whatever the read chunk size, so
+values split across chunk boundaries (numbers above all) decode intact.
+
+Run from this directory: python -m pytest
+"""
+
+import json
+from io import StringIO
+
+import pytest
+
+from json_stream import iter_array_items
+
+DOCUMENT = json.dumps(
+    {
+        "version": 12.5,
+        "count": -1200,
+        "flags": [True, False, None],
+        "data": [
+            {"a": 1, "score": 6.25, "year": 2011, "tags": ["x", "y"]},
+            -0.5,
+            1e-07,
+            12345678901234567890,
+            3.0e10,
+            0,
+            "text with , ] } chars",
+            True,
+            None,
+            [1.5, 22, -333],
+            {"nested": {"value": 7.125}},
+        ],
+        "after": 99.75,
+    }
+)
+EXPECTED = json.loads(DOCUMENT)["data"]
+
+
+@pytest.mark.parametrize("chunk_size", [*range(1, 40), 64, 1 << 20])
+def test_items_do_not_depend_on_chunk_size(chunk_size):
+    items = list(iter_array_items(StringIO(DOCUMENT), "data", chunk_size=chunk_size))
+
+    assert items == EXPECTED
+    assert [type(item) for item in items] == [type(item) for item in EXPECTED]
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 12))
+def test_bare_number_array(chunk_size):
+    document = '{"data": [12.5, 7, -3e2, 0.001]}'
+
+    items = list(iter_array_items(StringIO(document), "data", chunk_size=chunk_size))
+
+    assert items == [12.5, 7, -300.0, 0.001]
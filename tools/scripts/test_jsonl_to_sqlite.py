@@ -0,0 +1,79 @@
+"""
+Malformed rows in the JSONL ingest are skipped and counted, never inserted.
+
+Run from this directory: python -m pytest
+"""
+
+import io
+import json
+import sqlite3
+
+import pytest
+
+from anime_db import create_normalized_tables, insert_normalized, next_entry_id
+from jsonl_to_sqlite import (
+    INSERT_SQL,
+    create_table,
+    iter_chunks,
+    iter_jsonl_entries,
+    load_entry,
+    parse_anime_entry,
+)
+
+GOOD = {
+    "title": "Cowboy Bebop",
+    "type": "TV",
+    "episodes": 26,
+    "status": "FINISHED",
+    "animeSeason": {"season": "SPRING", "year": 1998},
+    "sources": ["https://myanimelist.net/anime/1"],
+    "synonyms": ["COWBOY BEBOP"],
+    "tags": ["space"],
+}
+
+MALFORMED = [
+    "{not json",
+    "null",
+    "[1, 2]",
+    '"a string"',
+    json.dumps({**GOOD, "title": None}),
+    json.dumps({**GOOD, "sources": None}),
+    json.dumps({**GOOD, "synonyms": "COWBOY BEBOP"}),
+    json.dumps({**GOOD, "tags": [1, 2]}),
+    json.dumps({**GOOD, "animeSeason": [1998]}),
+]
+
+
+def jsonl(lines: list[str]) -> io.BytesIO:
+    return io.BytesIO("".join(line + "\n" for line in lines).encode("utf-8"))
+
+
+@pytest.mark.parametrize("line", MALFORMED)
+def test_load_entry_rejects_malformed_rows(line):
+    with pytest.raises(ValueError):
+        load_entry(line)
+
+
+@pytest.mark.parametrize("normalized", [False, True])
+def test_malformed_rows_are_skipped_not_fatal(normalized):
+    good = json.dumps(GOOD)
+    f = jsonl([good, *MALFORMED, "", good])
+    stats = {"skipped": 0}
+    conn = sqlite3.connect(":memory:")
+
+    parse = load_entry if normalized else parse_anime_entry
+    entries = iter_jsonl_entries(f, stats, parse=parse)
+    if normalized:
+        create_normalized_tables(conn)
+        next_id = next_entry_id(conn)
+        for chunk in iter_chunks(entries, 3):
+            next_id = insert_normalized(conn, chunk, next_id)
+        table = "anime_entry"
+    else:
+        create_table(conn)
+        for chunk in iter_chunks(entries, 3):
+            conn.executemany(INSERT_SQL, chunk)
+        table = "anime"
+
+    assert stats["skipped"] == len(MALFORMED) + 1
+    assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 2
@@ -5,18 +5,30 @@ Upload anime data from newanimedb.json to Convex.
 Filter rules:
 - Skip entries with only 1 source AND no picture (orphans)
 - Extract MAL ID from sources for easy lookup
+
+The file is streamed (json_stream.py): entries are parsed, filtered and
+batched one at a time instead of loading the whole document first. With
+--columns the entries come from a column file instead, which is decoded
+into memory whole.
 """
 
-import json
+import argparse
 import re
-import urllib.request
-import urllib.error
 from pathlib import Path
-from tqdm import tqdm
+from typing import Iterable, Iterator
+
+from anime_columns import ColumnFile
+from convex_client import CONVEX_URL, set_base_url
+from json_stream import iter_json_array
+from upload_engine import (
+    DEFAULT_WORKERS,
+    AdaptiveBatcher,
+    measure_compression,
+    upload_batches,
+)
 
 JSON_PATH = Path("/home/koushikk/Documents/newanimedb.json")
-CONVEX_URL = "https://pastel-condor-398.convex.site"
-BATCH_SIZE = 100
+MAX_BATCH_SIZE = 1000  # batches are sized by bytes, this only caps row count
 
 
 def extract_mal_id(sources: list[str]) -> str | None:
@@ -78,81 +90,107 @@ def transform_entry(entry: dict) -> dict:
     return result
 
 
-def insert_batch(batch: list[dict]) -> dict:
-    """Insert a batch of anime entries."""
-    url = f"{CONVEX_URL}/anime/bulk-insert"
-    data = json.dumps({"animes": batch}).encode("utf-8")
-
-    try:
-        req = urllib.request.Request(
-            url, data=data, headers={"Content-Type": "application/json"}, method="POST"
-        )
-        with urllib.request.urlopen(req, timeout=120) as response:
-            return json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8")
-        return {"success": False, "error": f"HTTP {e.code}: {error_body}"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+def filter_entries(entries: Iterable[dict], stats: dict[str, int]) -> Iterator[dict]:
+    """
+    Lazily drop orphans and transform the remaining entries to the Convex
+    format, counting entries seen ("total") and dropped ("skipped").
+    """
+    for entry in entries:
+        stats["total"] += 1
+        if is_orphan(entry):
+            stats["skipped"] += 1
+            continue
+        yield transform_entry(entry)
 
 
-def main():
+def main(
+    workers: int = DEFAULT_WORKERS,
+    compress: bool = False,
+    measure_compression_only: bool = False,
+    columns: Path | None = None,
+):
     print("=" * 60)
     print("ANIME UPLOAD TO CONVEX")
     print("=" * 60)
 
-    print(f"\nLoading: {JSON_PATH}")
-    with open(JSON_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    all_entries = data.get("data", [])
-    total_count = len(all_entries)
-    print(f"Total entries in JSON: {total_count}")
-
-    print("\nFiltering entries...")
-    filtered = []
-    skipped = 0
-
-    for entry in tqdm(all_entries, desc="Filtering"):
-        if is_orphan(entry):
-            skipped += 1
-            continue
-        filtered.append(transform_entry(entry))
-
-    print(f"\n  Kept: {len(filtered)}")
-    print(f"  Skipped (orphans): {skipped}")
-
-    print(f"\nUploading {len(filtered)} entries in batches of {BATCH_SIZE}...")
-
-    batches = [
-        filtered[i : i + BATCH_SIZE] for i in range(0, len(filtered), BATCH_SIZE)
-    ]
-    total_imported = 0
-    total_failed = 0
-
-    for batch in tqdm(batches, desc="Uploading"):
-        result = insert_batch(batch)
-
-        if result.get("success"):
-            total_imported += result.get("imported", 0)
-            total_failed += result.get("failed", 0)
-
-            if result.get("errors"):
-                for error in result["errors"][:3]:
-                    print(f"\n  Error: {error}")
-        else:
-            total_failed += len(batch)
-            print(f"\n  Batch failed: {result.get('error')}")
+    if columns is not None:
+        # Column files decode whole columns, so every record is built up
+        # front and memory grows with the catalogue
+        print(f"\nLoading: {columns}")
+        with ColumnFile(columns) as column_file:
+            all_entries = column_file.records()
+    else:
+        # Entries are read, filtered and batched one at a time, so memory
+        # stays flat however large the file is
+        print(f"\nStreaming: {JSON_PATH}")
+        all_entries = iter_json_array(JSON_PATH, "data")
+
+    stats = {"total": 0, "skipped": 0}
+    filtered = filter_entries(all_entries, stats)
+
+    if measure_compression_only:
+        measure_compression(filtered, MAX_BATCH_SIZE)
+        print(f"\n  Kept: {stats['total'] - stats['skipped']}")
+        print(f"  Skipped (orphans): {stats['skipped']}")
+        return
+
+    print("\nFiltering and uploading entries in adaptively sized batches...")
+
+    batcher = AdaptiveBatcher(max_entries=MAX_BATCH_SIZE)
+    total_imported, total_failed = upload_batches(
+        "/anime/bulk-insert",
+        batcher.batches(filtered),
+        workers=workers,
+        desc="Uploading",
+        batcher=batcher,
+        compress=compress,
+    )
 
     print("\n" + "=" * 60)
     print("UPLOAD COMPLETE")
     print("=" * 60)
-    print(f"  Total in JSON: {total_count}")
-    print(f"  Skipped (orphans): {skipped}")
-    print(f"  Attempted upload: {len(filtered)}")
+    print(f"  Total in JSON: {stats['total']}")
+    print(f"  Skipped (orphans): {stats['skipped']}")
+    print(f"  Attempted upload: {stats['total'] - stats['skipped']}")
     print(f"  Successfully imported: {total_imported}")
     print(f"  Failed: {total_failed}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"bulk-insert requests in flight (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="send gzip-compressed request bodies",
+    )
+    parser.add_argument(
+        "--measure-compression",
+        action="store_true",
+        help="report gzip ratio and throughput on this dataset instead of uploading",
+    )
+    parser.add_argument(
+        "--columns",
+        type=Path,
+        default=None,
+        help=f"read entries from this column file (anime_columns.py) instead of {JSON_PATH}",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=CONVEX_URL,
+        help=f"Convex HTTP actions URL (default: $CONVEX_SITE_URL or {CONVEX_URL})",
+    )
+    args = parser.parse_args()
+    set_base_url(args.base_url)
+
+    main(
+        workers=args.workers,
+        compress=args.gzip,
+        measure_compression_only=args.measure_compression,
+        columns=args.columns,
+    )
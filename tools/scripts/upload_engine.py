@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Concurrent batch uploader shared by the Convex upload scripts.
+
+Batches are posted from a bounded thread pool so several requests are in
+flight at once. Instead of sleeping a fixed amount between batches, a shared
+rate limiter spaces requests out only after the server pushes back (429 or
+5xx, honouring Retry-After) and relaxes again after successes.
+
+AdaptiveBatcher builds batches by serialized size rather than row count and
+tunes its byte target from the latency and failures the engine observes.
+
+Request bodies can optionally be gzip-compressed; measure_compression()
+reports what that buys on a given dataset.
+"""
+
+import gzip
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator
+from tqdm import tqdm
+
+from anime_record import json_default
+from convex_client import (
+    GZIP_LEVEL,
+    ConvexClient,
+    ConvexHTTPError,
+    ResponseLostError,
+    get_client,
+)
+
+DEFAULT_WORKERS = 4
+MAX_RETRIES = 5
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Statuses that mean the request was refused before it ran, so even a
+# non-idempotent request can be sent again
+NOT_APPLIED_STATUS = {429, 503}
+# Actions that insert a new row for every entry: sending a batch twice
+# duplicates it
+NON_IDEMPOTENT_PATHS = {"/import", "/anime/bulk-insert"}
+
+# Adaptive batch sizing (serialized JSON bytes per request)
+MIN_BATCH_BYTES = 32 * 1024
+START_BATCH_BYTES = 256 * 1024
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+TARGET_LATENCY = 5.0  # seconds per bulk request
+
+
+class RetryableError(Exception):
+    """A request failed in a way that is worth retrying after a back-off."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdaptiveRateLimiter:
+    """
+    Shared request spacing that grows on throttling and decays on success.
+
+    All workers call wait() before sending. While the server is healthy the
+    delay is zero and requests go out as fast as the pool allows.
+    """
+
+    def __init__(self, min_delay: float = 0.25, max_delay: float = 30.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_success(self):
+        with self._lock:
+            self.delay /= 2
+            if self.delay < self.min_delay:
+                self.delay = 0.0
+
+    def on_throttle(self, retry_after: float | None = None):
+        with self._lock:
+            self.delay = min(self.max_delay, max(self.delay * 2, self.min_delay))
+            pause = retry_after if retry_after is not None else self.delay
+            self._next_slot = max(self._next_slot, time.monotonic() + pause)
+
+
+def json_size(entry: Any) -> int:
+    """Serialized size of an entry (json.dumps output is ASCII by default)."""
+    return len(json.dumps(entry, default=json_default))
+
+
+class AdaptiveBatcher:
+    """
+    Split entries into batches of at most `target_bytes` serialized bytes.
+
+    The target grows after fast successful requests and shrinks when a
+    request is slow, times out or is throttled, so batches settle near the
+    size the server handles comfortably. `max_entries` caps the row count
+    per batch regardless of size.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        target_bytes: int = START_BATCH_BYTES,
+        min_bytes: int = MIN_BATCH_BYTES,
+        max_bytes: int = MAX_BATCH_BYTES,
+        target_latency: float = TARGET_LATENCY,
+    ):
+        self.max_entries = max_entries
+        self.target_bytes = target_bytes
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self._lock = threading.Lock()
+
+    def observe(self, latency: float, ok: bool):
+        """Feed back the outcome of one request."""
+        with self._lock:
+            if not ok:
+                factor = 0.5
+            elif latency > self.target_latency:
+                factor = 0.75
+            elif latency < self.target_latency / 2:
+                factor = 1.25
+            else:
+                return
+            self.target_bytes = int(
+                min(self.max_bytes, max(self.min_bytes, self.target_bytes * factor))
+            )
+
+    def batches(
+        self, items: Iterable[Any], size_of: Callable[[Any], int] = json_size
+    ) -> Iterator[list]:
+        """Lazily yield batches, reading the current target for each one."""
+        batch = []
+        batch_bytes = 0
+        for item in items:
+            size = size_of(item)
+            if batch and (
+                batch_bytes + size > self.target_bytes or len(batch) >= self.max_entries
+            ):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(item)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+
+def _retry_after(headers) -> float | None:
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def post_json(
+    client: ConvexClient,
+    path: str,
+    payload: Any,
+    compress: bool = False,
+    idempotent: bool = True,
+    headers: dict[str, str] | None = None,
+) -> dict:
+    """
+    POST a JSON payload through the pooled client and return the response.
+
+    Raises RetryableError for throttling, server errors and network failures,
+    and ConvexHTTPError for other HTTP errors. With idempotent=False only
+    failures that prove the request was not applied (429, 503, or an error
+    before the body was sent) are retryable; a lost response or another 5xx
+    is raised as is, since retrying could apply the request twice.
+    """
+    retryable = RETRYABLE_STATUS if idempotent else NOT_APPLIED_STATUS
+    try:
+        return client.post(
+            path, payload, compress=compress, headers=headers, idempotent=idempotent
+        )
+    except ConvexHTTPError as e:
+        if e.status in retryable:
+            raise RetryableError(str(e), _retry_after(e.headers))
+        raise
+    except ResponseLostError as e:
+        if not idempotent:
+            raise ResponseLostError(
+                f"{e}; the batch may have been applied, not retrying"
+            ) from e
+        raise RetryableError(str(e))
+    except (OSError, http.client.HTTPException) as e:
+        raise RetryableError(str(e) or type(e).__name__)
+
+
+def upload_batches(
+    path: str,
+    batches: Iterable[list[dict]],
+    workers: int = DEFAULT_WORKERS,
+    total: int | None = None,
+    desc: str = "Uploading batches",
+    max_retries: int = MAX_RETRIES,
+    client: ConvexClient | None = None,
+    on_result: Callable[[int, list[dict], dict], None] | None = None,
+    batcher: AdaptiveBatcher | None = None,
+    compress: bool = False,
+    payload: Callable[[list[dict]], dict] | None = None,
+    idempotent: bool | None = None,
+    headers: dict[str, str] | None = None,
+) -> tuple[int, int]:
+    """
+    Post each batch as {"animes": batch} (or payload(batch), if given) to the
+    Convex HTTP action at `path` with up to `workers` requests in flight.
+
+    `batches` may be a lazy iterable; at most 2 * workers batches are pulled
+    ahead of the ones being uploaded. Returns (imported, failed) totals,
+    counting every entry of a batch that could not be delivered as failed.
+
+    If given, on_result(batch_num, batch, result) is called from the calling
+    thread as each batch completes (batch_num counts from 1). If a batcher is
+    given, the latency and outcome of every request are reported to it; pass
+    batches from batcher.batches() so later batches pick up the new target.
+    With compress=True request bodies are sent gzip-encoded; `headers` are
+    added to every request.
+
+    Batches for NON_IDEMPOTENT_PATHS (or with idempotent=False) are only
+    retried when the server certainly did not apply them; a batch whose
+    response was lost is reported as failed instead of being sent again.
+    """
+    client = client or get_client()
+    limiter = AdaptiveRateLimiter()
+    payload = payload or (lambda batch: {"animes": batch})
+    if idempotent is None:
+        idempotent = path not in NON_IDEMPOTENT_PATHS
+
+    def send(batch: list[dict]) -> dict:
+        body = payload(batch)
+        for attempt in range(max_retries + 1):
+            limiter.wait()
+            started = time.monotonic()
+            try:
+                result = post_json(
+                    client,
+                    path,
+                    body,
+                    compress=compress,
+                    idempotent=idempotent,
+                    headers=headers,
+                )
+            except RetryableError as e:
+                if batcher is not None:
+                    batcher.observe(time.monotonic() - started, ok=False)
+                limiter.on_throttle(e.retry_after)
+                if attempt == max_retries:
+                    return {"success": False, "error": str(e)}
+                continue
+            except Exception as e:
+                return {"success": False, "error": str(e)}
+            if batcher is not None:
+                batcher.observe(time.monotonic() - started, ok=True)
+            limiter.on_success()
+            return result
+        return {"success": False, "error": "retries exhausted"}
+
+    total_imported = 0
+    total_failed = 0
+    batch_iter = iter(enumerate(batches, 1))
+    in_flight = {}
+
+    with (
+        ThreadPoolExecutor(max_workers=workers) as pool,
+        tqdm(total=total, desc=desc) as progress,
+    ):
+
+        def fill():
+            while len(in_flight) < workers * 2:
+                item = next(batch_iter, None)
+                if item is None:
+                    return
+                batch_num, batch = item
+                in_flight[pool.submit(send, batch)] = (batch_num, batch)
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch_num, batch = in_flight.pop(future)
+                result = future.result()
+
+                if result.get("success"):
+                    total_imported += result.get("imported", 0)
+                    total_failed += result.get("failed", 0)
+
+                    if result.get("errors"):
+                        for error in result["errors"]:
+                            print(f"\n  Error: {error}")
+                    elif result.get("failed", 0) > 0:
+                        print(
+                            f"\n  Batch {batch_num}: {result['failed']} failed imports"
+                        )
+                else:
+                    total_failed += len(batch)
+                    print(f"\n  Batch {batch_num} failed: {result.get('error')}")
+
+                if on_result is not None:
+                    on_result(batch_num, batch, result)
+                progress.update(1)
+            fill()
+
+    return total_imported, total_failed
+
+
+def measure_compression(
+    entries: Iterable[dict], max_entries: int, uplinks_mbps=(5, 20, 100)
+):
+    """
+    Print the gzip ratio and throughput for this dataset's upload batches,
+    and the estimated transfer time with and without compression.
+    """
+    batcher = AdaptiveBatcher(max_entries=max_entries)
+    batch_count = 0
+    raw_bytes = 0
+    packed_bytes = 0
+    compress_seconds = 0.0
+
+    for batch in tqdm(batcher.batches(entries), desc="Compressing batches"):
+        body = json.dumps({"animes": batch}, default=json_default).encode("utf-8")
+        started = time.perf_counter()
+        packed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        compress_seconds += time.perf_counter() - started
+        batch_count += 1
+        raw_bytes += len(body)
+        packed_bytes += len(packed)
+
+    if not raw_bytes:
+        print("\nNothing to measure.")
+        return
+
+    mib = 1024 * 1024
+    print(f"\n📦 Compression (gzip level {GZIP_LEVEL}):")
+    print(f"   Batches: {batch_count}")
+    print(f"   Raw: {raw_bytes / mib:.1f} MiB")
+    print(f"   Gzip: {packed_bytes / mib:.1f} MiB")
+    print(f"   Ratio: {raw_bytes / packed_bytes:.1f}x")
+    print(f"   Compression throughput: {raw_bytes / mib / compress_seconds:.0f} MiB/s")
+    for mbps in uplinks_mbps:
+        bytes_per_second = mbps * 1_000_000 / 8
+        raw_time = raw_bytes / bytes_per_second
+        packed_time = packed_bytes / bytes_per_second + compress_seconds
+        print(
+            f"   At {mbps} Mbit/s: raw {raw_time:.1f}s, gzip {packed_time:.1f}s "
+            f"({raw_time / packed_time:.1f}x faster)"
+        )
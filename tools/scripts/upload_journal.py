@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Local progress journal for resumable uploads.
+
+Before uploading, the full payload is written to a small SQLite file along
+with a per-entry acknowledged flag. Each batch the server accepts is marked
+as soon as its response arrives, so after a crash --resume re-sends only the
+entries that were never acknowledged, without re-fetching or
+re-deduplicating. Rows the server reports as failed stay unacknowledged.
+
+A run that replaces the remote table first records when the clear finished;
+until then nothing has been inserted, and --resume has to clear again.
+"""
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Mapping
+
+from anime_record import json_default
+from upload_engine import DEFAULT_WORKERS, AdaptiveBatcher, json_size, upload_batches
+
+JOURNAL_PATH = Path("upload_journal.db")
+
+
+class UploadJournal:
+    """Journal of one upload job (e.g. "deduplicate_anime")."""
+
+    def __init__(self, job: str, path: Path = JOURNAL_PATH):
+        self.job = job
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS upload_run (
+                job TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                started_at REAL NOT NULL,
+                cleared_at REAL,
+                completed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS upload_entry (
+                job TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                acked INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job, idx)
+            ) WITHOUT ROWID;
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(upload_run)")}
+        if "cleared_at" not in columns:
+            # Journals written before the clear phase was recorded: a run that
+            # already has acknowledged rows got past its clear
+            with self.conn:
+                self.conn.execute("ALTER TABLE upload_run ADD COLUMN cleared_at REAL")
+                self.conn.execute(
+                    "UPDATE upload_run SET cleared_at = started_at WHERE EXISTS "
+                    "(SELECT 1 FROM upload_entry e "
+                    "WHERE e.job = upload_run.job AND e.acked = 1)"
+                )
+
+    def begin(
+        self,
+        endpoint: str,
+        entries: list[Mapping[str, Any]],
+        requires_clear: bool = False,
+    ):
+        """
+        Start a new run, replacing any previous journal for this job.
+        AnimeRecords are serialized to their Convex JSON here. With
+        requires_clear=True the run is not uploadable until mark_cleared().
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute("DELETE FROM upload_entry WHERE job = ?", (self.job,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO upload_run "
+                "(job, endpoint, total, started_at, cleared_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    self.job,
+                    endpoint,
+                    len(entries),
+                    now,
+                    None if requires_clear else now,
+                ),
+            )
+            self.conn.executemany(
+                "INSERT INTO upload_entry (job, idx, payload) VALUES (?, ?, ?)",
+                (
+                    (self.job, idx, json.dumps(entry, default=json_default))
+                    for idx, entry in enumerate(entries)
+                ),
+            )
+
+    def has_unfinished_run(self) -> bool:
+        row = self.conn.execute(
+            "SELECT completed_at FROM upload_run WHERE job = ?", (self.job,)
+        ).fetchone()
+        return row is not None and row[0] is None
+
+    def is_cleared(self) -> bool:
+        """Whether the remote clear this run depends on has finished."""
+        row = self.conn.execute(
+            "SELECT cleared_at FROM upload_run WHERE job = ?", (self.job,)
+        ).fetchone()
+        return row is not None and row[0] is not None
+
+    def mark_cleared(self):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE upload_run SET cleared_at = ? WHERE job = ?",
+                (time.time(), self.job),
+            )
+
+    def endpoint(self) -> str | None:
+        row = self.conn.execute(
+            "SELECT endpoint FROM upload_run WHERE job = ?", (self.job,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> tuple[int, int]:
+        """Return (total entries, acknowledged entries)."""
+        row = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(acked), 0) FROM upload_entry WHERE job = ?",
+            (self.job,),
+        ).fetchone()
+        return row[0], row[1]
+
+    def pending(self) -> list[tuple[int, dict[str, Any]]]:
+        """Return (index, entry) pairs not yet acknowledged, in upload order."""
+        rows = self.conn.execute(
+            "SELECT idx, payload FROM upload_entry WHERE job = ? AND acked = 0 ORDER BY idx",
+            (self.job,),
+        )
+        return [(idx, json.loads(payload)) for idx, payload in rows]
+
+    def ack(self, indices: list[int]):
+        """Mark entries as acknowledged by the server."""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE upload_entry SET acked = 1 WHERE job = ? AND idx = ?",
+                ((self.job, idx) for idx in indices),
+            )
+
+    def finish(self):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE upload_run SET completed_at = ? WHERE job = ?",
+                (time.time(), self.job),
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def upload_pending(
+    journal: UploadJournal,
+    max_batch_size: int,
+    workers: int = DEFAULT_WORKERS,
+    desc: str = "Uploading batches",
+    compress: bool = False,
+) -> tuple[int, int]:
+    """
+    Upload every unacknowledged journal entry and record acknowledgements.
+
+    Batches are sized adaptively by payload bytes, with at most
+    `max_batch_size` entries each. Only rows the server inserted are
+    acknowledged: the ones listed in `failedIndices` are left for the next
+    --resume, and a batch reporting failures without indices is left whole.
+    Returns the (imported, failed) totals for this attempt. The run is marked
+    complete once every entry has been acknowledged.
+    """
+    if not journal.is_cleared():
+        raise RuntimeError("The remote table was never cleared for this run")
+
+    batcher = AdaptiveBatcher(max_entries=max_batch_size)
+    batch_indices = []
+
+    def batches():
+        for chunk in batcher.batches(
+            journal.pending(), lambda item: json_size(item[1])
+        ):
+            batch_indices.append([idx for idx, _ in chunk])
+            yield [entry for _, entry in chunk]
+
+    def on_result(batch_num: int, batch: list[dict], result: dict):
+        if not result.get("success"):
+            return
+        indices = batch_indices[batch_num - 1]
+        failed_positions = result.get("failedIndices")
+        if failed_positions is None:
+            if result.get("failed", 0) > 0:
+                return
+            failed_positions = []
+        rejected = set(failed_positions)
+        journal.ack([idx for i, idx in enumerate(indices) if i not in rejected])
+
+    imported, failed = upload_batches(
+        journal.endpoint(),
+        batches(),
+        workers=workers,
+        desc=desc,
+        on_result=on_result,
+        batcher=batcher,
+        compress=compress,
+    )
+
+    total, acked = journal.counts()
+    if acked == total:
+        journal.finish()
+
+    return imported, failed
@@ -3,115 +3,56 @@
 Upload anime data from SQLite to Convex in batches.
 """
 
-import json
+import argparse
 import sqlite3
-import time
 from pathlib import Path
-from tqdm import tqdm
-import urllib.request
-import urllib.error
+
+from anime_db import load_anime
+from convex_client import CONVEX_URL, set_base_url
+from upload_engine import (
+    DEFAULT_WORKERS,
+    AdaptiveBatcher,
+    measure_compression,
+    upload_batches,
+)
 
 # Paths
 DB_PATH = Path("anime.db")
-CONVEX_URL = "https://pastel-condor-398.convex.site/import"
-BATCH_SIZE = 500
+MAX_BATCH_SIZE = 500  # /import inserts row by row, keep requests short
 
 
 def load_anime_from_sqlite():
-    """Load all anime entries from SQLite."""
+    """Load all anime entries from SQLite (legacy or normalized layout)."""
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT title, type, episodes, status, anime_season, picture, thumbnail,
-               duration, score, sources, synonyms, studios, producers, related_anime, tags
-        FROM anime
-    """)
-
-    animes = []
-    for row in cursor.fetchall():
-        anime = {
-            "title": row["title"],
-            "type": row["type"],
-            "episodes": row["episodes"],
-            "status": row["status"],
-            "animeSeason": json.loads(row["anime_season"] or "{}"),
-            "picture": row["picture"],
-            "thumbnail": row["thumbnail"],
-            "duration": json.loads(row["duration"] or "{}"),
-            "score": json.loads(row["score"] or "{}"),
-            "sources": json.loads(row["sources"] or "[]"),
-            "synonyms": json.loads(row["synonyms"] or "[]"),
-            "studios": json.loads(row["studios"] or "[]"),
-            "producers": json.loads(row["producers"] or "[]"),
-            "relatedAnime": json.loads(row["related_anime"] or "[]"),
-            "tags": json.loads(row["tags"] or "[]"),
-        }
-        animes.append(anime)
-
+    animes = load_anime(conn)
     conn.close()
     return animes
 
 
-def upload_batch(batch, batch_num, total_batches):
-    """Upload a batch of anime to Convex."""
-    data = json.dumps({"animes": batch}).encode("utf-8")
-
-    req = urllib.request.Request(
-        CONVEX_URL,
-        data=data,
-        headers={
-            "Content-Type": "application/json",
-        },
-        method="POST",
-    )
-
-    try:
-        with urllib.request.urlopen(req, timeout=120) as response:
-            result = json.loads(response.read().decode("utf-8"))
-            return result
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8")
-        print(f"\n❌ Batch {batch_num}/{total_batches} failed: HTTP {e.code}")
-        print(f"   Error: {error_body}")
-        return {"success": False, "error": error_body}
-    except Exception as e:
-        print(f"\n❌ Batch {batch_num}/{total_batches} failed: {e}")
-        return {"success": False, "error": str(e)}
-
-
-def upload_to_convex():
+def upload_to_convex(
+    workers: int = DEFAULT_WORKERS,
+    compress: bool = False,
+    measure_compression_only: bool = False,
+):
     """Main function to upload all anime to Convex."""
     print(f"Loading anime from: {DB_PATH}")
     animes = load_anime_from_sqlite()
     total = len(animes)
     print(f"Loaded {total} anime entries")
 
-    # Split into batches
-    batches = [animes[i : i + BATCH_SIZE] for i in range(0, total, BATCH_SIZE)]
-    total_batches = len(batches)
-    print(f"Split into {total_batches} batches of {BATCH_SIZE}")
-
-    success_count = 0
-    failed_count = 0
-
-    for i, batch in enumerate(tqdm(batches, desc="Uploading batches"), 1):
-        result = upload_batch(batch, i, total_batches)
-
-        if result.get("success"):
-            success_count += result.get("imported", 0)
-            failed_count += result.get("failed", 0)
-
-            if result.get("failed", 0) > 0:
-                print(f"\n⚠️  Batch {i}: {result.get('failed')} failed imports")
-        else:
-            failed_count += len(batch)
-            print(f"\n❌ Batch {i} completely failed")
-
-        # Small delay to avoid rate limiting
-        if i < total_batches:
-            time.sleep(0.5)
+    if measure_compression_only:
+        measure_compression(animes, MAX_BATCH_SIZE)
+        return
+
+    # Batches are sized by payload bytes; throttling is handled by the engine
+    batcher = AdaptiveBatcher(max_entries=MAX_BATCH_SIZE)
+    success_count, failed_count = upload_batches(
+        "/import",
+        batcher.batches(animes),
+        workers=workers,
+        batcher=batcher,
+        compress=compress,
+    )
 
     print(f"\n✅ Upload complete!")
     print(f"   Successfully imported: {success_count}")
@@ -120,4 +61,33 @@ def upload_to_convex():
 
 
 if __name__ == "__main__":
-    upload_to_convex()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"import requests in flight (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="send gzip-compressed request bodies",
+    )
+    parser.add_argument(
+        "--measure-compression",
+        action="store_true",
+        help="report gzip ratio and throughput on this dataset instead of uploading",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=CONVEX_URL,
+        help=f"Convex HTTP actions URL (default: $CONVEX_SITE_URL or {CONVEX_URL})",
+    )
+    args = parser.parse_args()
+    set_base_url(args.base_url)
+
+    upload_to_convex(
+        workers=args.workers,
+        compress=args.gzip,
+        measure_compression_only=args.measure_compression,
+    )